@@ -4,11 +4,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.models.user import User
 from app.api.schemas import UserCreate, UserLogin, Token
-from app.api.auth_utils import get_password_hash, verify_password, create_access_token, create_refresh_token
+from app.api.auth_utils import ahash_password, averify_password, create_access_token, create_refresh_token
 from app.db.redis_client import get_redis
+from app.utils.executors import ExecutorQueueFull
 
 router = APIRouter()
 
+def _hashing_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Too many sign-ins right now, please retry shortly.",
+                         headers={"Retry-After": "1"})
+
 @router.post("/signup", response_model=Token)
 async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
@@ -18,10 +23,14 @@ async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
 
-        # Create User
+        # Create User (hashing runs in the bounded password executor, off the event loop)
+        try:
+            password_hash = await ahash_password(user.password)
+        except ExecutorQueueFull:
+            raise _hashing_busy()
         new_user = User(
             email=user.email,
-            password_hash=get_password_hash(user.password),
+            password_hash=password_hash,
             full_name=user.full_name
         )
         db.add(new_user)
@@ -51,8 +60,18 @@ async def login(user_in: UserLogin, db: AsyncSession = Depends(get_db), redis=De
     result = await db.execute(select(User).where(User.email == user_in.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(user_in.password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    try:
+        valid, new_hash = await averify_password(user_in.password, user.password_hash)
+    except ExecutorQueueFull:
+        raise _hashing_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if new_hash:
+        # Argon2 cost parameters changed since this hash was made: upgrade it transparently
+        user.password_hash = new_hash
+        await db.commit()
 
     access_token = create_access_token(data={"sub": str(user.id)})
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
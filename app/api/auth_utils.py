@@ -1,11 +1,24 @@
+import re
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from app.config.settings import settings
+from app.utils.executors import BoundedExecutor
 
 # Switched to argon2 due to bcrypt issues on Windows
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+ARGON2_PARAMS_PATTERN = re.compile(r"\$m=(\d+),t=(\d+),p=(\d+)\$")
+
+# Each hash takes tens of milliseconds of CPU (and ARGON2_MEMORY_COST KiB of RAM): they run here,
+# a few at a time, never on the event loop
+password_executor = BoundedExecutor("password", settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -13,6 +26,30 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with other argon2 cost parameters than the configured ones."""
+    match = ARGON2_PARAMS_PATTERN.search(hashed_password)
+    if match is None:
+        return pwd_context.needs_update(hashed_password)
+    return tuple(int(v) for v in match.groups()) != (
+        settings.ARGON2_MEMORY_COST, settings.ARGON2_TIME_COST, settings.ARGON2_PARALLELISM)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    return True, get_password_hash(plain_password) if needs_rehash(hashed_password) else None
+
+async def ahash_password(password: str) -> str:
+    """get_password_hash in the password executor (raises ExecutorQueueFull when saturated)."""
+    return await password_executor.run(get_password_hash, password)
+
+async def averify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies in the password executor. Returns (valid, new hash): the new hash is set when the
+    stored one uses outdated cost parameters, so the caller can store it (rehash on login).
+    """
+    return await password_executor.run(_verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -1,32 +1,77 @@
 from functools import lru_cache
+from typing import List
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.documents import Document
 from app.db.session import get_db
 from app.models.user import User
+from app.api.user_cache import user_cache
 from app.config.settings import settings
 
 from app.vectorstore.faiss_store import FaissVectorStore
+from app.vectorstore.metadata_store import MetadataStore
+from app.vectorstore.summary_store import SummaryStore
 from app.retrieval.dense_retriever import DenseRetriever
 from app.retrieval.sparse_retriever import SparseRetriever
 from app.retrieval.reranker import Reranker
 from app.retrieval.hybrid_retriever import HybridRetriever
+from app.retrieval.sharded_retriever import ShardedRetriever
+from app.retrieval.retrieval_cache import CorpusVersion, RetrievalCache
+from app.db.redis_client import redis_client
 from app.reasoning.query_rewriter import QueryRewriter
 from app.reasoning.context_compressor import ContextCompressor
+from app.reasoning.summarizer import HierarchicalSummarizer
 from app.llm.answer_generator import AnswerGenerator
+from app.llm.semantic_cache import SemanticAnswerCache
+from app.llm.llm_registry import LLMRegistry
+from app.utils.executors import BoundedExecutor
 
 class PipelineComponents:
     def __init__(self):
         self.vector_store = FaissVectorStore()
-        self.sparse_retriever = SparseRetriever()
+        self.metadata_store = MetadataStore()
+        self.sparse_retriever = SparseRetriever(self.metadata_store)
         self.reranker = Reranker()
         self.dense_retriever = DenseRetriever(self.vector_store)
-        self.hybrid_retriever = HybridRetriever(self.dense_retriever, self.sparse_retriever, self.reranker)
+        # An existing unsharded corpus is split into the shards on their first start
+        self.shards = ShardedRetriever(source_store=self.metadata_store) if settings.RETRIEVAL_SHARDS > 0 else None
+        self.summary_store = SummaryStore()
+        self.corpus_version = CorpusVersion(redis_client)
+        # LLM responses cached before an ingest must not outlive it either
+        llm_cache = LLMRegistry.get_instance().response_cache
+        if llm_cache is not None:
+            llm_cache.corpus_version = self.corpus_version
+        self.retrieval_cache = (
+            RetrievalCache(self.metadata_store, redis_client, self.corpus_version)
+            if settings.RETRIEVAL_CACHE_ENABLED else None
+        )
+        self.hybrid_retriever = HybridRetriever(self.dense_retriever, self.sparse_retriever, self.reranker,
+                                                shards=self.shards, summaries=self.summary_store,
+                                                cache=self.retrieval_cache)
         self.query_rewriter = QueryRewriter()
         self.context_compressor = ContextCompressor()
-        self.answer_generator = AnswerGenerator()
+        self.answer_generator = AnswerGenerator(self.vector_store)
+        self.summarizer = HierarchicalSummarizer(self.summary_store)
+        self.answer_cache = SemanticAnswerCache(redis_client) if settings.SEMANTIC_CACHE_ENABLED else None
+        # Blocking model / disk work called from async routes runs here, never on the event loop
+        self.inference = BoundedExecutor("inference", settings.INFERENCE_WORKERS, settings.INFERENCE_QUEUE_SIZE)
+
+    def index_chunks(self, chunks: List[dict]):
+        """
+        Indexes chunker output into the dense and sparse stores (or their shards).
+        Callers bump `corpus_version` afterwards so cached results are not served stale.
+        """
+        docs = [Document(page_content=c['text'], metadata={k:v for k,v in c.items() if k!='text'}) for c in chunks]
+        if self.shards is not None:
+            self.shards.add_documents(chunks)
+            # The main metadata store stays the shared chunk lookup (e.g. for cache rehydration)
+            self.metadata_store.add_documents(docs)
+            return
+        self.vector_store.add_documents(chunks)
+        self.sparse_retriever.add_documents(docs)
 
 @lru_cache()
 def get_pipeline():
@@ -49,14 +94,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
         
-    # Check DB
+    # Check cache, then DB
     try:
         # User ID in token is UUID string
         import uuid
         uuid_obj = uuid.UUID(user_id)
-        result = await db.execute(select(User).where(User.id == uuid_obj))
-        user = result.scalar_one_or_none()
-        if user is None:
+
+        async def load_user(uid):
+            result = await db.execute(select(User).where(User.id == uid))
+            return result.scalar_one_or_none()
+
+        user = await user_cache.get(uuid_obj, load_user) if settings.USER_CACHE_ENABLED else await load_user(uuid_obj)
+        if user is None or user.is_active is False:
             raise credentials_exception
         return user
     except Exception:
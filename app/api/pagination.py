@@ -0,0 +1,37 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: Optional[datetime], row_id: uuid.UUID) -> str:
+    """Opaque keyset cursor: the (created_at, id) of the last row of a page (created_at may be NULL)."""
+    payload = json.dumps([created_at.isoformat() if created_at is not None else None, str(row_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], uuid.UUID]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return (datetime.fromisoformat(created_at) if created_at is not None else None), uuid.UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_order(created_at_column, id_column) -> list:
+    """Newest first. Rows without a created_at come first, as Postgres sorts NULLs for DESC."""
+    return [created_at_column.desc().nulls_first(), id_column.desc()]
+
+def keyset_after(created_at_column, id_column, after: Tuple[Optional[datetime], uuid.UUID]):
+    """Rows strictly after the cursor in `keyset_order`."""
+    created_at, row_id = after
+    if created_at is None:
+        # Still in the leading NULL block: the rest of it, then every dated row
+        return or_(and_(created_at_column.is_(None), id_column < row_id), created_at_column.isnot(None))
+    # A row-value comparison with NULL is never true, so the NULL block (already seen) is skipped
+    return tuple_(created_at_column, id_column) < (created_at, row_id)
@@ -1,23 +1,40 @@
 import shutil
 import os
+import json
 import uuid
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
 from fastapi.responses import StreamingResponse
 from app.api.schemas import ProcessVideoRequest, ChatRequest
 from app.api.deps import get_pipeline, PipelineComponents, get_current_user
+from app.api.user_cache import user_cache
+from app.api.auth_utils import password_executor
+from app.db.chat_history import chat_history as chat_history_store
 from app.ingestion.youtube_loader import YoutubeTranscriptLoader
 from app.ingestion.text_cleaner import TextCleaner
 from app.ingestion.chunker import TimeAwareChunker
 from app.ingestion.pdf_loader import PDFProcessor
+from app.llm.answer_generator import AnswerGenerator
+from app.llm.llm_registry import LLMRegistry, UnknownModelError, count_llm_calls
 from app.evaluation.confidence_scorer import ConfidenceScorer
-from langchain_core.documents import Document
+from app.utils.executors import ExecutorQueueFull
+from app.utils.logger import setup_logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 
+logger = setup_logger(__name__)
+
 router = APIRouter()
 
+async def _run_blocking(pipeline: PipelineComponents, fn, *args):
+    """Runs blocking work in the pipeline's bounded executor; a full queue becomes a 503."""
+    try:
+        return await pipeline.inference.run(fn, *args)
+    except ExecutorQueueFull:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly.")
+
 @router.post("/ingest/youtube")
-async def ingest_youtube(request: ProcessVideoRequest, pipeline: PipelineComponents = Depends(get_pipeline)):
+async def ingest_youtube(request: ProcessVideoRequest, background_tasks: BackgroundTasks,
+                         pipeline: PipelineComponents = Depends(get_pipeline)):
     loader = YoutubeTranscriptLoader()
     video_id = loader.extract_video_id(request.youtube_url)
     
@@ -25,7 +42,7 @@ async def ingest_youtube(request: ProcessVideoRequest, pipeline: PipelineCompone
     # Ideally checking the vector store would be better, but for now we loosely check memory
     # or just allow re-processing (update).
     
-    transcript = loader.load_transcript(request.youtube_url)
+    transcript = await _run_blocking(pipeline, loader.load_transcript, request.youtube_url)
     if not transcript:
         raise HTTPException(status_code=400, detail="Failed to fetch transcript.")
         
@@ -36,17 +53,12 @@ async def ingest_youtube(request: ProcessVideoRequest, pipeline: PipelineCompone
     chunker = TimeAwareChunker()
     chunks = chunker.create_chunks(transcript, video_id=video_id)
     
-    # Vector Indexing
-    pipeline.vector_store.create_index(chunks) # Note: FAISS create_index overwrites or adds? 
-    # Current implementation of create_index calls FAISS.from_documents which creates a NEW index
-    # We should use add_documents if possible, or check if faiss_store.py supports updating.
-    # faiss_store.py has add_documents.
-    
-    pipeline.vector_store.add_documents(chunks)
-    
-    # Sparse Indexing
-    docs = [Document(page_content=c['text'], metadata={k:v for k,v in c.items() if k!='text'}) for c in chunks]
-    pipeline.sparse_retriever.add_documents(docs)
+    # Dense + Sparse Indexing (routed to shards in sharded mode)
+    await _run_blocking(pipeline, pipeline.index_chunks, chunks)
+    await pipeline.corpus_version.bump()
+
+    # Precompute window + video summaries for overview queries (cached per content hash)
+    background_tasks.add_task(pipeline.summarizer.summarize_source, video_id, chunks)
     
     return {"status": "success", "video_id": video_id, "chunks": len(chunks)}
 
@@ -63,104 +75,209 @@ async def ingest_pdf(file: UploadFile = File(...), pipeline: PipelineComponents
         shutil.copyfileobj(file.file, buffer)
         
     try:
-        chunks = processor.process_pdf(file_path, file.filename)
+        chunks = await _run_blocking(pipeline, processor.process_pdf, file_path, file.filename)
         
         # Add to stores
-        pipeline.vector_store.add_documents(chunks)
-        
-        docs = [Document(page_content=c['text'], metadata={k:v for k,v in c.items() if k!='text'}) for c in chunks]
-        # Append logic
-        pipeline.sparse_retriever.add_documents(docs) 
+        await _run_blocking(pipeline, pipeline.index_chunks, chunks)
+        await pipeline.corpus_version.bump()
         
         return {"status": "success", "filename": file.filename, "chunks": len(chunks)}
     finally:
         if os.path.exists(file_path):
             os.remove(file_path)
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _source_payload(doc) -> dict:
+    """Client-facing view of a retrieved document: where it comes from and when."""
+    metadata = doc.metadata
+    start = metadata.get('start', metadata.get('window_start_time', metadata.get('start_time')))
+    payload = {
+        "chunk_id": metadata.get("chunk_id"),
+        "video_id": metadata.get("video_id"),
+        "source": metadata.get("source"),
+        "page": metadata.get("page"),
+        "score": metadata.get("relevance_score"),
+        "snippet": doc.page_content[:200],
+        "start": None,
+        "timestamp": None,
+        "url": None,
+    }
+    try:
+        seconds = float(start) if start is not None else None
+    except (TypeError, ValueError):
+        seconds = None
+    if seconds is not None:
+        payload["start"] = seconds
+        payload["timestamp"] = f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+        if payload["video_id"]:
+            payload["url"] = f"https://www.youtube.com/watch?v={payload['video_id']}&t={int(seconds)}s"
+    return payload
+
+def _answer_model(model_name: str = None) -> str:
+    """Resolved "provider:model" a request is answered by; cached answers are only reused for the same one."""
+    return ":".join(LLMRegistry.get_instance().resolve(model_name))
+
+async def _retrieve(pipeline: PipelineComponents, rewritten_query: str, user_id: str, model: str):
+    """
+    Search, compression and the semantic answer cache lookup shared by both /chat formats.
+    Returns (raw docs, compressed docs, query embedding, chunk IDs, cached answer or None).
+    """
+    # 3. Search
+    raw_docs = await pipeline.hybrid_retriever.asearch(rewritten_query)
+    
+    # 4. Compress (extractive, scored against the query embedding; shared with the answer cache)
+    query_embedding = None
+    if pipeline.answer_cache is not None or pipeline.context_compressor.enabled:
+        query_embedding = await _run_blocking(pipeline, pipeline.vector_store.embeddings.embed_query, rewritten_query)
+    compressed_docs = await _run_blocking(pipeline, pipeline.context_compressor.compress,
+                                          raw_docs, rewritten_query, query_embedding)
+
+    # 4b. Semantic answer cache: same tenant, paraphrased query, same supporting chunks -> skip the LLM
+    cached_answer = None
+    chunk_ids = [d.metadata.get("chunk_id") for d in compressed_docs if d.metadata.get("chunk_id")]
+    if pipeline.answer_cache is not None and chunk_ids:
+        cached_answer = await pipeline.answer_cache.lookup(user_id, model, query_embedding, chunk_ids)
+    return raw_docs, compressed_docs, query_embedding, chunk_ids, cached_answer
+
 @router.post("/chat")
 async def chat(request: ChatRequest, 
                pipeline: PipelineComponents = Depends(get_pipeline), 
-               db: AsyncSession = Depends(get_db),
                current_user = Depends(get_current_user)): # Secure Endpoint
     
-    # 1. Fetch History from DB (Conversational Memory)
+    # Only configured models can be requested (checked before any work is done)
+    try:
+        model = _answer_model(request.model_name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 1. Conversational Memory (Redis-backed; Postgres is written behind)
     chat_history = []
     
     # We assume request.session_id is a valid UUID (Thread ID)
-    valid_uuid = False
-    uuid_obj = None
+    thread_id = None
     try:
-        uuid_obj = uuid.UUID(request.session_id)
-        valid_uuid = True
-    except:
+        thread_id = uuid.UUID(request.session_id)
+    except (TypeError, ValueError):
         pass
 
-    if valid_uuid:
-        from app.models.chat import Message, Thread
-        from sqlalchemy.future import select
-        
-        # SECURITY CHECK: Ensure Thread belongs to Current User
-        thread_result = await db.execute(select(Thread).where(Thread.id == uuid_obj))
-        thread = thread_result.scalar_one_or_none()
-        
-        if not thread:
-             # If thread doesn't exist but ID is valid UUID, maybe create it?
-             # OR reject. For strict isolation, we reject or auto-create LINKED TO USER.
-             # Let's auto-create if missing for robustness, but ownership is key.
-             # Actually, if frontend generated it randomly, we MUST claim it for this user.
-             new_thread = Thread(id=uuid_obj, user_id=current_user.id, title="New Chat")
-             db.add(new_thread)
-             await db.commit()
-        elif thread.user_id != current_user.id:
-             # CRITICAL: Attempt to access another user's thread
-             raise HTTPException(status_code=403, detail="Access denied to this chat session")
-        
-        # Fetch last 6 messages for context
-        stmt = select(Message).where(Message.thread_id == uuid_obj).order_by(Message.created_at.desc()).limit(6)
-        result = await db.execute(stmt)
-        msgs = result.scalars().all()[::-1] 
-        
-        for i in range(0, len(msgs) - 1, 2):
-            if msgs[i].role == 'user' and msgs[i+1].role == 'assistant':
-                chat_history.append((msgs[i].content, msgs[i+1].content))
+    if thread_id is not None:
+        # SECURITY CHECK: Ensure Thread belongs to Current User (unknown IDs are claimed for this user)
+        if not await chat_history_store.claim_thread(thread_id, current_user.id):
+            raise HTTPException(status_code=403, detail="Access denied to this chat session")
+        chat_history = await chat_history_store.get_turns(thread_id)
+
+    user_id = str(current_user.id)
+
+    async def finish(rewritten_query, query_embedding, chunk_ids, full_answer, user_message_id, cached, llm_calls=0):
+        if not cached and pipeline.answer_cache is not None and chunk_ids and AnswerGenerator.is_cacheable(full_answer):
+            await pipeline.answer_cache.store(user_id, model, rewritten_query, query_embedding, chunk_ids, full_answer,
+                                              llm_calls=llm_calls)
+        # Save Assistant Message (paired with the question it answers)
+        if thread_id is not None:
+            await chat_history_store.append(thread_id, "assistant", full_answer, reply_to=user_message_id)
+
+    if request.stream_format == "sse":
+        return StreamingResponse(_sse_chat(request, pipeline, chat_history, thread_id, user_id, model, finish),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
         
     
     # 2. Rewrite Query
-    rewritten_query = pipeline.query_rewriter.rewrite(request.message, chat_history=chat_history)
-    
-    # 3. Search
-    raw_docs = pipeline.hybrid_retriever.search(rewritten_query)
+    rewritten_query = await pipeline.query_rewriter.arewrite(request.message, chat_history=chat_history)
     
-    # 4. Compress
-    compressed_docs = pipeline.context_compressor.compress(raw_docs)
+    # 3-4. Search, compress, answer cache
+    _, compressed_docs, query_embedding, chunk_ids, cached_answer = await _retrieve(pipeline, rewritten_query, user_id,
+                                                                                    model)
     
-    # Save User Message to DB
-    if valid_uuid:
-        from app.models.chat import Message
-        user_msg = Message(thread_id=uuid_obj, role='user', content=request.message)
-        db.add(user_msg)
-        await db.commit()
+    # Save User Message
+    user_message_id = None
+    if thread_id is not None:
+        user_message_id = await chat_history_store.append(thread_id, "user", request.message)
     
     # 5. Generate & Stream
     async def event_generator():
         full_answer = ""
-        generator = pipeline.answer_generator.generate_answer(request.message, compressed_docs)
-        
-        for chunk in generator:
-            full_answer += chunk
-            yield chunk
+        # Generation + validation calls: what a later semantic cache hit on this answer saves
+        llm_calls = count_llm_calls()
+        if cached_answer is not None:
+            full_answer = cached_answer
+            yield cached_answer
+        else:
+            generator = pipeline.answer_generator.agenerate_answer(request.message, compressed_docs,
+                                                                   model_name=request.model_name)
             
-        # Save Assistant Message
-        if valid_uuid:
-            try:
-                ai_msg = Message(thread_id=uuid_obj, role='assistant', content=full_answer)
-                db.add(ai_msg)
-                await db.commit() 
-            except Exception as e:
-                pass
+            async for chunk in generator:
+                full_answer += chunk
+                yield chunk
+
+        await finish(rewritten_query, query_embedding, chunk_ids, full_answer, user_message_id, cached_answer is not None,
+                     llm_calls=llm_calls.calls)
 
     return StreamingResponse(event_generator(), media_type="text/plain")
 
+async def _sse_chat(request: ChatRequest, pipeline: PipelineComponents, chat_history: list,
+                    thread_id, user_id: str, model: str, finish):
+    """
+    /chat as Server-Sent Events, each stage sent as soon as it is done:
+    rewrite -> sources (with timestamps and confidence) -> token* -> validation -> done.
+    A failure after the stream started is sent as an `error` event (the status is already 200).
+    """
+    try:
+        rewritten_query = await pipeline.query_rewriter.arewrite(request.message, chat_history=chat_history)
+        yield _sse("rewrite", {"query": request.message, "rewritten": rewritten_query})
+
+        raw_docs, compressed_docs, query_embedding, chunk_ids, cached_answer = \
+            await _retrieve(pipeline, rewritten_query, user_id, model)
+        yield _sse("sources", {
+            "confidence": ConfidenceScorer.calculate_confidence(raw_docs),
+            "sources": [_source_payload(doc) for doc in compressed_docs],
+        })
+    except HTTPException as e:
+        yield _sse("error", {"status": e.status_code, "message": e.detail})
+        return
+    except Exception as e:
+        logger.exception(f"SSE chat failed before generation: {e}")
+        yield _sse("error", {"status": 500, "message": AnswerGenerator.ERROR_MESSAGE})
+        return
+
+    try:
+        user_message_id = None
+        if thread_id is not None:
+            user_message_id = await chat_history_store.append(thread_id, "user", request.message)
+
+        full_answer, passed = "", True
+        llm_calls = count_llm_calls()
+        if cached_answer is not None:
+            full_answer = cached_answer
+            yield _sse("token", {"text": cached_answer})
+            yield _sse("validation", {"passed": True, "cached": True})
+        else:
+            async for event, data in pipeline.answer_generator.astream_answer(request.message, compressed_docs,
+                                                                              model_name=request.model_name):
+                if event == "token":
+                    full_answer += data
+                    yield _sse("token", {"text": data})
+                elif event == "validation":
+                    passed = data
+                    yield _sse("validation", {"passed": data, "cached": False})
+                elif event == "error":
+                    full_answer += "\n\n" + data
+                    yield _sse("error", {"status": 500, "message": data})
+            if not passed:
+                # Stored like the plain-text stream shows it (and therefore never cached)
+                full_answer += AnswerGenerator.VALIDATION_WARNING_MESSAGE
+
+        await finish(rewritten_query, query_embedding, chunk_ids, full_answer, user_message_id, cached_answer is not None,
+                     llm_calls=llm_calls.calls)
+    except Exception as e:
+        # The status is already 200: the client only learns about the failure from this event
+        logger.exception(f"SSE chat failed during generation: {e}")
+        yield _sse("error", {"status": 500, "message": AnswerGenerator.ERROR_MESSAGE})
+        return
+    yield _sse("done", {"user_message_id": user_message_id})
+
 # --- session / thread management ---
 from typing import Dict
 from app.models.chat import Thread
@@ -186,18 +303,93 @@ async def create_thread(
     
     return {"thread_id": str(new_id), "title": title}
 
-from typing import List
+from typing import List, Optional
+from fastapi import Query, Response
+from app.models.chat import Message
+from app.api.schemas import MessageOut
+from app.api.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, keyset_after, keyset_order
+
 @router.get("/threads", response_model=List[Dict[str, str]])
 async def get_threads(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """
-    Fetches all threads for the current user.
+    Fetches the current user's threads, newest first, one page at a time.
+    Pass the X-Next-Cursor response header back as `cursor` for the next page (absent on the last one).
     """
     from sqlalchemy.future import select
-    result = await db.execute(select(Thread).where(Thread.user_id == current_user.id).order_by(Thread.created_at.desc()))
+    stmt = select(Thread).where(Thread.user_id == current_user.id)
+    after = decode_cursor(cursor)
+    if after is not None:
+        # Keyset: resume strictly after the last row seen (served by ix_threads_user_id_created_at)
+        stmt = stmt.where(keyset_after(Thread.created_at, Thread.id, after))
+    result = await db.execute(stmt.order_by(*keyset_order(Thread.created_at, Thread.id)).limit(limit + 1))
     threads = result.scalars().all()
-    
+
+    if len(threads) > limit:
+        threads = threads[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(threads[-1].created_at, threads[-1].id)
     return [{"id": str(t.id), "title": t.title or "New Chat"} for t in threads]
 
+@router.get("/threads/{thread_id}/messages", response_model=List[MessageOut])
+async def get_thread_messages(
+    thread_id: uuid.UUID,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Message history of a thread, newest first, paginated like /threads.
+    Messages reach Postgres through the chat history write-behind, so the newest ones can
+    appear here up to CHAT_PERSIST_INTERVAL_MS later.
+    """
+    from sqlalchemy.future import select
+    thread = (await db.execute(select(Thread).where(Thread.id == thread_id))).scalar_one_or_none()
+    if thread is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    if thread.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied to this chat session")
+
+    stmt = select(Message).where(Message.thread_id == thread_id)
+    after = decode_cursor(cursor)
+    if after is not None:
+        stmt = stmt.where(keyset_after(Message.created_at, Message.id, after))
+    result = await db.execute(stmt.order_by(*keyset_order(Message.created_at, Message.id)).limit(limit + 1))
+    messages = result.scalars().all()
+
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(messages[-1].created_at, messages[-1].id)
+    return [MessageOut(id=str(m.id), role=m.role, content=m.content,
+                       created_at=m.created_at.isoformat() if m.created_at else None) for m in messages]
+
+@router.get("/stats")
+async def get_stats(
+    pipeline: PipelineComponents = Depends(get_pipeline),
+    current_user = Depends(get_current_user)
+):
+    """
+    Pipeline performance counters: cache hit rates and retrieval leg latencies.
+    """
+    return {
+        "corpus_version": pipeline.corpus_version.current,
+        "retrieval_cache": pipeline.retrieval_cache.stats() if pipeline.retrieval_cache else None,
+        "retrieval_legs": pipeline.hybrid_retriever.leg_latency_stats(),
+        "reranker": pipeline.reranker.stats(),
+        "answer_cache": pipeline.answer_cache.stats() if pipeline.answer_cache else None,
+        "inference_executor": pipeline.inference.stats(),
+        "password_executor": password_executor.stats(),
+        "query_rewriter": pipeline.query_rewriter.stats(),
+        "context_compressor": pipeline.context_compressor.stats(),
+        "answer_generator": pipeline.answer_generator.stats(),
+        "validator": pipeline.answer_generator.validator.stats(),
+        "llm": LLMRegistry.get_instance().stats(),
+        "user_cache": user_cache.stats(),
+        "chat_history": chat_history_store.stats(),
+    }
@@ -7,7 +7,15 @@ class ProcessVideoRequest(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_id: str
-    model_name: Optional[str] = "groq-llama3"  # Default model
+    model_name: Optional[str] = None  # "provider:model" or a provider; None = LLM_PROVIDER
+    # "text": plain answer stream (default); "sse": Server-Sent Events with rewrite/sources/token/validation events
+    stream_format: Optional[str] = "text"
+
+class MessageOut(BaseModel):
+    id: str
+    role: str
+    content: str
+    created_at: Optional[str] = None
 
 class Source(BaseModel):
     content: str
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import uuid
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.models.user import User
+from app.db.redis_client import RedisClient, redis_client
+from app.utils.cache import TTLCache
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class UserCache:
+    """
+    Authenticated-user lookups for `get_current_user`: an in-process LRU (short TTL) in front of
+    an optional Redis tier, in front of the users table. Only the non-secret fields are cached
+    (never the password hash); hits return a detached `User` carrying those fields.
+
+    ORM updates and deletes of a user (deactivation, profile changes) invalidate both tiers once
+    their transaction commits (SQLAlchemy mapper events collect the IDs, the session's after_commit
+    event invalidates; a rollback discards them). An invalidation leaves a tombstone in both tiers
+    for USER_CACHE_TOMBSTONE_TTL, and misses only fill the cache where there is none (Redis SET NX),
+    so a request that loaded the row before the commit cannot write the old row back after the
+    invalidation, whenever the Redis write lands. Other workers' in-process entries expire after
+    USER_CACHE_LOCAL_TTL, and bulk `update()` statements bypass the events, so they rely on the
+    TTLs as well.
+    """
+    PREFIX = "user:"
+    TOMBSTONE = "invalidated"
+
+    def __init__(self, redis: Optional[RedisClient] = None):
+        self.redis = redis
+        self.local = TTLCache(max_entries=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_LOCAL_TTL)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Invalidation sequence number per user ID, for fills that started before it
+        self.tombstones = TTLCache(max_entries=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TOMBSTONE_TTL)
+        self._tasks = set()
+
+    @staticmethod
+    def snapshot(user: User) -> dict:
+        return {"id": str(user.id), "email": user.email, "full_name": user.full_name, "is_active": user.is_active}
+
+    @staticmethod
+    def to_user(data: dict) -> User:
+        return User(id=uuid.UUID(data["id"]), email=data["email"], full_name=data["full_name"],
+                    is_active=data["is_active"])
+
+    async def get(self, user_id: uuid.UUID, loader: Callable[[uuid.UUID], Awaitable[Optional[User]]]) -> Optional[User]:
+        """Returns the user from the cache, or from `loader` (the DB query) on a miss."""
+        key = str(user_id)
+        data = self.local.get(key)
+        if data is not None:
+            self.local_hits += 1
+            return self.to_user(data)
+        generation = self.invalidations
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get_value(self.PREFIX + key)
+            except Exception as e:
+                logger.warning(f"User cache Redis lookup failed: {e}")
+                raw = None
+            if raw is not None and raw != self.TOMBSTONE:
+                self.redis_hits += 1
+                data = json.loads(raw)
+                if not self._invalidated_since(key, generation):
+                    self.local.set(key, data)
+                return self.to_user(data)
+
+        self.misses += 1
+        user = await loader(user_id)
+        if user is not None:
+            await self.set(user, generation)
+        return user
+
+    def _invalidated_since(self, key: str, generation: int) -> bool:
+        return self.tombstones.get(key, 0) > generation
+
+    async def set(self, user: User, generation: Optional[int] = None):
+        """
+        Fills both tiers with a user loaded while `self.invalidations` was `generation`: skipped
+        if the user was invalidated since, and never overwrites a Redis entry or tombstone.
+        """
+        data = self.snapshot(user)
+        if generation is not None and self._invalidated_since(data["id"], generation):
+            return
+        self.local.set(data["id"], data)
+        if self.redis is not None:
+            try:
+                await self.redis.set_value(self.PREFIX + data["id"], json.dumps(data),
+                                           expire=settings.USER_CACHE_TTL, nx=True)
+            except Exception as e:
+                logger.warning(f"User cache Redis write failed: {e}")
+
+    def invalidate(self, user_id):
+        """Sync so it can run inside SQLAlchemy session events; the Redis tombstone is written on the loop."""
+        key = str(user_id)
+        self.local.delete(key)
+        self.invalidations += 1
+        self.tombstones.set(key, self.invalidations)
+        if self.redis is None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._redis_tombstone(key))
+        except RuntimeError:
+            return  # no event loop (scripts): the Redis entry expires with its TTL
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _redis_tombstone(self, key: str):
+        try:
+            # Replaces the entry, or a stale fill that landed first; refuses fills until it expires
+            await self.redis.set_value(self.PREFIX + key, self.TOMBSTONE, expire=settings.USER_CACHE_TOMBSTONE_TTL)
+        except Exception as e:
+            logger.warning(f"User cache Redis invalidation failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "db_queries": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "local_entries": len(self.local),
+        }
+
+
+user_cache = UserCache(redis_client if settings.REDIS_URL and settings.USER_CACHE_REDIS else None)
+
+
+_PENDING_INVALIDATIONS = "user_cache_invalidations"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_user(mapper, connection, target):
+    # Flush time: the change is not visible to other transactions yet, and may still roll back
+    session = object_session(target)
+    if session is None:
+        user_cache.invalidate(target.id)
+        return
+    session.info.setdefault(_PENDING_INVALIDATIONS, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_users(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
@@ -59,3 +59,21 @@ If NO, list the unsupported parts.
 """
 
 
+WINDOW_SUMMARY_PROMPT = """
+You are summarizing one section of a video transcript (starting at {start}).
+Write 3-5 concise bullet points covering the key points, names and claims made in this section.
+Do not add information that is not in the transcript.
+Transcript section:
+{context}
+Summary:
+"""
+
+VIDEO_SUMMARY_PROMPT = """
+Below are section summaries of a video, in order, each with its start time.
+Write a cohesive overview of the whole video in one or two short paragraphs, followed by a bulleted
+outline of its main sections with their start times in the format **[MM:SS]**.
+Use only the information in the section summaries.
+Section summaries:
+{context}
+Overview:
+"""
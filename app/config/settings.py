@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 
@@ -17,6 +18,7 @@ class Settings:
     TRANSCRIPTS_DIR = os.path.join(DATA_DIR, "transcripts")
     CHUNKS_DIR = os.path.join(DATA_DIR, "processed_chunks")
     VECTORSTORE_DIR = os.path.join(DATA_DIR, "faiss_index")
+    SHARDS_DIR = os.path.join(DATA_DIR, "shards")
 
     # API Keys
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -32,6 +34,34 @@ class Settings:
     GEMINI_MODEL = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash")
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
 
+    # Shared LLM registry: providers backing up the requested one (skipped if not configured),
+    # hedged duplicate after the primary's p95 latency, circuit breaker per provider/model
+    LLM_FALLBACK_PROVIDERS = [p.strip() for p in os.getenv("LLM_FALLBACK_PROVIDERS", "gemini").split(",") if p.strip()]
+    LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "true").lower() == "true"
+    LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 3.0))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30.0))
+    LLM_WORKERS = int(os.getenv("LLM_WORKERS", 16))
+    # Extra "provider:model" routes clients may request besides the configured providers' default models
+    LLM_ALLOWED_MODELS = [m.strip() for m in os.getenv("LLM_ALLOWED_MODELS", "").split(",") if m.strip()]
+    # Exact-match response cache for deterministic calls ("redis" when REDIS_URL is set, else "disk"),
+    # TTL in seconds per call type (rewrite, generate, validate, summarize)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "redis" if os.getenv("REDIS_URL") else "disk")
+    LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.1))
+    LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", 3600))
+    LLM_CACHE_TTLS = json.loads(os.getenv(
+        "LLM_CACHE_TTLS", '{"rewrite": 86400, "generate": 3600, "validate": 86400, "summarize": 604800}'))
+    # Offline "fake" provider (LLM_PROVIDER=fake) for load tests: latency, output length, failures,
+    # and an optional JSON script of {"match": regex, "response": text} rules
+    FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", 300))
+    FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 100))
+    FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", 120))
+    FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", 0.0))
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 0))
+    FAKE_LLM_SCRIPT = os.getenv("FAKE_LLM_SCRIPT")
+
     # RAG Parameters
     CHUNK_SIZE = 1000  # characters
     CHUNK_OVERLAP = 200 # characters, approx 20-30%
@@ -39,9 +69,112 @@ class Settings:
     
     RETRIEVAL_TOP_K = 25
     RERANK_TOP_K = 8
+
+    # Fusion of the dense and sparse legs: "rrf" or "weighted" (min-max normalized scores)
+    FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")
+    RRF_K = int(os.getenv("RRF_K", 60))
+    FUSION_DENSE_WEIGHT = float(os.getenv("FUSION_DENSE_WEIGHT", 0.5))
+    # Fused candidates sent to the CrossEncoder (0 = all)
+    RERANK_CANDIDATE_BUDGET = int(os.getenv("RERANK_CANDIDATE_BUDGET", 20))
+    # Reranker engine: "torch" (fp32) or "onnx" (int8-quantized export, fast mode)
+    RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+    RERANKER_ONNX_FILE = os.getenv("RERANKER_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+    # On load, a non-torch engine is compared with fp32 torch on a probe set; below this Spearman
+    # rank correlation a warning is logged (0 disables the check and the extra model load)
+    RERANKER_MIN_AGREEMENT = float(os.getenv("RERANKER_MIN_AGREEMENT", 0.9))
+    RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 512))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+    # LRU of CrossEncoder scores keyed by (query hash, chunk ID)
+    RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", 50000))
+    # Cascade reranking: the CrossEncoder gets whatever is left of this per-search budget (0 = score all candidates)
+    SEARCH_LATENCY_BUDGET_MS = float(os.getenv("SEARCH_LATENCY_BUDGET_MS", 400))
+    RERANK_CASCADE_BATCH = int(os.getenv("RERANK_CASCADE_BATCH", 8))
+    # Floor for the reranker's share, so slow retrieval never leaves it a zero or negative budget
+    RERANK_MIN_BUDGET_MS = float(os.getenv("RERANK_MIN_BUDGET_MS", 50))
+    # Skip the CrossEncoder when the dense and sparse top-k agree at least this much (1.1 = never skip)
+    RERANK_SKIP_CONFIDENCE = float(os.getenv("RERANK_SKIP_CONFIDENCE", 0.75))
+
+    # Retrieval result cache (in-process LRU + Redis), keyed by normalized query and corpus version
+    RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+    RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", 3600))
+    RETRIEVAL_CACHE_LOCAL_TTL = int(os.getenv("RETRIEVAL_CACHE_LOCAL_TTL", 300))
+    RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", 1024))
+
+    # Semantic answer cache: reuse a tenant's answer for a paraphrased query over the same chunks
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+    SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", 86400))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+
+    # Query rewriting policy: only follow-ups referring to the conversation are rewritten (LLM call
+    # bounded by REWRITE_TIMEOUT seconds, then the raw query is used); rewrites cached per (query, history)
+    REWRITE_TIMEOUT = float(os.getenv("REWRITE_TIMEOUT", 2.0))
+    REWRITE_CACHE_TTL = int(os.getenv("REWRITE_CACHE_TTL", 3600))
+    REWRITE_CACHE_MAX_ENTRIES = int(os.getenv("REWRITE_CACHE_MAX_ENTRIES", 2048))
+
+    # Answer streaming: "live" forwards LLM tokens as they arrive (late warning if validation fails),
+    # "buffered" generates and validates the whole answer before typing it out
+    STREAMING_MODE = os.getenv("STREAMING_MODE", "live")
+
+    # Answer validation: "local" = claim-level grounding check (lexical overlap, embedding similarity,
+    # citation timestamps) with LLM escalation for borderline answers; "llm" = always the LLM validator
+    VALIDATOR_MODE = os.getenv("VALIDATOR_MODE", "local")
+    GROUNDING_MIN_CLAIM_TOKENS = int(os.getenv("GROUNDING_MIN_CLAIM_TOKENS", 3))
+    GROUNDING_LEXICAL_SUPPORT = float(os.getenv("GROUNDING_LEXICAL_SUPPORT", 0.6))
+    GROUNDING_SEMANTIC_SUPPORT = float(os.getenv("GROUNDING_SEMANTIC_SUPPORT", 0.65))
+    GROUNDING_LEXICAL_REJECT = float(os.getenv("GROUNDING_LEXICAL_REJECT", 0.2))
+    GROUNDING_SEMANTIC_REJECT = float(os.getenv("GROUNDING_SEMANTIC_REJECT", 0.35))
+    # Share of unsupported claims at which the answer is rejected without asking the LLM
+    GROUNDING_FAIL_RATIO = float(os.getenv("GROUNDING_FAIL_RATIO", 0.5))
+
+    # Precomputed map-reduce summaries served for summarization intent
+    SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 4))
+    # Minimum query/summary cosine similarity to serve a summary; below it the query is retrieved normally
+    SUMMARY_MIN_SIMILARITY = float(os.getenv("SUMMARY_MIN_SIMILARITY", 0.3))
     
     SIMILARITY_THRESHOLD = 0.3
 
+    # Extractive context compression: share of context characters kept (1.0 = off)
+    CONTEXT_COMPRESSION_RATIO = float(os.getenv("CONTEXT_COMPRESSION_RATIO", 1.0))
+    COMPRESSION_MIN_SENTENCE_CHARS = int(os.getenv("COMPRESSION_MIN_SENTENCE_CHARS", 25))
+
+    # Token-budgeted context packing in PromptBuilder (tokens counted locally)
+    CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+    PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", EMBEDDING_MODEL)
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+    # Per-model overrides, e.g. {"gemini-1.5-flash": 8000}
+    CONTEXT_TOKEN_BUDGETS = json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS", "{}"))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.8))
+    CONTEXT_MIN_TRIM_TOKENS = int(os.getenv("CONTEXT_MIN_TRIM_TOKENS", 64))
+
+    # Sharded retrieval: N worker processes, each owning a dense + sparse shard (0 = single process)
+    RETRIEVAL_SHARDS = int(os.getenv("RETRIEVAL_SHARDS", 0))
+    # Seconds to wait for a shard: per query, per indexing batch, and for its indexes to load
+    SHARD_SEARCH_TIMEOUT = float(os.getenv("SHARD_SEARCH_TIMEOUT", 5.0))
+    SHARD_INDEX_TIMEOUT = float(os.getenv("SHARD_INDEX_TIMEOUT", 600.0))
+    SHARD_STARTUP_TIMEOUT = float(os.getenv("SHARD_STARTUP_TIMEOUT", 300.0))
+    # Async hybrid search: threads for the dense/sparse legs and the per-leg timeout (seconds)
+    RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", 4))
+    RETRIEVAL_LEG_TIMEOUT = float(os.getenv("RETRIEVAL_LEG_TIMEOUT", 2.0))
+    # Blocking work off the event loop (embedding, indexing, transcript/PDF loading):
+    # pool size and how many more jobs may wait before requests get a 503
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 4))
+    INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", 64))
+
+    # Conversation memory: recent messages per thread in Redis, persisted to Postgres by a batched
+    # write-behind flusher (Redis stream + consumer group); without Redis, writes go straight to Postgres
+    CHAT_HISTORY_CACHE_ENABLED = os.getenv("CHAT_HISTORY_CACHE_ENABLED", "true").lower() == "true"
+    CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 3))
+    CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 20))
+    CHAT_HISTORY_TTL = int(os.getenv("CHAT_HISTORY_TTL", 86400))
+    CHAT_PERSIST_BATCH = int(os.getenv("CHAT_PERSIST_BATCH", 100))
+    CHAT_PERSIST_INTERVAL_MS = int(os.getenv("CHAT_PERSIST_INTERVAL_MS", 500))
+    # Entries a worker read but did not acknowledge for this long are re-persisted by another one
+    CHAT_PERSIST_CLAIM_IDLE_MS = int(os.getenv("CHAT_PERSIST_CLAIM_IDLE_MS", 30000))
+    # Deliveries after which a record that cannot be persisted goes to the dead-letter stream (kept up to the max length)
+    CHAT_PERSIST_MAX_DELIVERIES = int(os.getenv("CHAT_PERSIST_MAX_DELIVERIES", 5))
+    CHAT_PERSIST_DEAD_MAX_LEN = int(os.getenv("CHAT_PERSIST_DEAD_MAX_LEN", 10000))
+
     # Infrastructure
     DATABASE_URL = os.getenv("DATABASE_URL")
     REDIS_URL = os.getenv("REDIS_URL")
@@ -52,5 +185,20 @@ class Settings:
     SECRET_KEY = os.getenv("SECRET_KEY")
     ALGORITHM = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+    # Password hashing (argon2id): cost parameters (OWASP baseline: 19 MiB, t=2, p=1) and the bounded
+    # executor it runs in. Hashes made with other parameters are upgraded on the next login.
+    ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+    ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 19456))  # KiB
+    ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 1))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32))
+    # Authenticated-user cache in get_current_user: in-process LRU + optional Redis tier (seconds)
+    USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+    USER_CACHE_REDIS = os.getenv("USER_CACHE_REDIS", "true").lower() == "true"
+    USER_CACHE_LOCAL_TTL = int(os.getenv("USER_CACHE_LOCAL_TTL", 30))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+    # How long an invalidated user refuses cache fills: must outlast a miss's DB load
+    USER_CACHE_TOMBSTONE_TTL = int(os.getenv("USER_CACHE_TOMBSTONE_TTL", 10))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
 
 settings = Settings()
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.db.session import AsyncSessionLocal
+from app.db.redis_client import RedisClient, redis_client
+from app.models.chat import Message, Thread
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class ChatHistoryStore:
+    """
+    Conversation memory for /chat without Postgres on the hot path.
+
+    - Recent messages of a thread live in a Redis list (`chat:history:<thread>`), warmed from
+      Postgres on a miss; thread ownership is cached in `chat:thread:<thread>`.
+    - New threads and messages are appended to a Redis stream and persisted by a background
+      flusher in batches (consumer group: entries are acknowledged only after the commit, and
+      entries left unacknowledged by a crashed worker are re-claimed), i.e. at-least-once.
+      Message IDs are generated here, and inserts are ON CONFLICT DO NOTHING, so a redelivered
+      batch is harmless.
+    - A batch that fails to commit is retried one record at a time, so one bad record does not
+      hold back the others. A record that has failed CHAT_PERSIST_MAX_DELIVERIES deliveries is
+      moved to the `chat:persist:dead` stream (with the error) and acknowledged.
+
+    Without Redis (or if a Redis call fails) every operation goes straight to Postgres.
+    """
+    STREAM = "chat:persist"
+    DEAD_STREAM = "chat:persist:dead"
+    GROUP = "chat-persisters"
+    HISTORY_PREFIX = "chat:history:"
+    OWNER_PREFIX = "chat:thread:"
+
+    def __init__(self, redis: Optional[RedisClient] = None):
+        self.redis = redis
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self.redis_reads = 0
+        self.db_reads = 0
+        self.enqueued = 0
+        self.persisted = 0
+        self.batches = 0
+        self.redeliveries = 0
+        self.record_failures = 0
+        self.dead_lettered = 0
+        self.direct_writes = 0
+
+    # --- threads ---
+
+    async def claim_thread(self, thread_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+        """
+        True if the thread belongs to the user. An unknown (client-generated) thread ID is created
+        for the first user that uses it.
+        """
+        if self.redis is not None:
+            try:
+                return await self._claim_cached(thread_id, user_id)
+            except Exception as e:
+                logger.warning(f"Thread ownership lookup in Redis failed, using Postgres: {e}")
+        async with AsyncSessionLocal() as session:
+            thread = (await session.execute(select(Thread).where(Thread.id == thread_id))).scalar_one_or_none()
+            if thread is None:
+                await self._write([self._thread_record(thread_id, user_id)], [])
+                self.direct_writes += 1
+                return True
+            return thread.user_id == user_id
+
+    async def _claim_cached(self, thread_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+        r = self.redis.redis
+        key = self.OWNER_PREFIX + str(thread_id)
+        owner = await r.get(key)
+        if owner is None:
+            async with AsyncSessionLocal() as session:
+                thread = (await session.execute(select(Thread).where(Thread.id == thread_id))).scalar_one_or_none()
+            if thread is not None:
+                owner = str(thread.user_id)
+                await r.set(key, owner, ex=settings.CHAT_HISTORY_TTL)
+            elif await r.set(key, str(user_id), nx=True, ex=settings.CHAT_HISTORY_TTL):
+                # First claim wins; the row is written behind like the messages
+                await self._enqueue("thread", self._thread_record(thread_id, user_id))
+                return True
+            else:
+                owner = await r.get(key)
+        return owner == str(user_id)
+
+    @staticmethod
+    def _thread_record(thread_id: uuid.UUID, user_id: uuid.UUID) -> dict:
+        now = datetime.utcnow().isoformat()
+        return {"id": str(thread_id), "user_id": str(user_id), "title": "New Chat", "created_at": now}
+
+    # --- messages ---
+
+    async def append(self, thread_id: uuid.UUID, role: str, content: str, reply_to: str = None) -> str:
+        """Records a message and returns its ID (pass a user message's ID as the answer's reply_to)."""
+        record = {
+            "id": str(uuid.uuid4()), "thread_id": str(thread_id), "role": role, "content": content,
+            "metadata": {"reply_to": reply_to} if reply_to else {},
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if self.redis is not None:
+            try:
+                key = self.HISTORY_PREFIX + str(thread_id)
+                async with self.redis.redis.pipeline(transaction=True) as pipe:
+                    pipe.rpush(key, json.dumps(record))
+                    pipe.ltrim(key, -settings.CHAT_HISTORY_MAX_MESSAGES, -1)
+                    pipe.expire(key, settings.CHAT_HISTORY_TTL)
+                    pipe.xadd(self.STREAM, {"kind": "message", "data": json.dumps(record)})
+                    await pipe.execute()
+                self.enqueued += 1
+                return record["id"]
+            except Exception as e:
+                logger.warning(f"Chat history write to Redis failed, writing to Postgres: {e}")
+        await self._write([], [record])
+        self.direct_writes += 1
+        return record["id"]
+
+    async def get_turns(self, thread_id: uuid.UUID, max_turns: int = None) -> List[Tuple[str, str]]:
+        """Last (user message, assistant answer) pairs, oldest first."""
+        return self.pair_turns(await self.recent_messages(thread_id))[-(max_turns or settings.CHAT_HISTORY_TURNS):]
+
+    async def recent_messages(self, thread_id: uuid.UUID) -> List[dict]:
+        key = self.HISTORY_PREFIX + str(thread_id)
+        if self.redis is not None:
+            try:
+                raw = await self.redis.redis.lrange(key, 0, -1)
+                if raw:
+                    self.redis_reads += 1
+                    return self._ordered([json.loads(item) for item in raw])
+            except Exception as e:
+                logger.warning(f"Chat history read from Redis failed, using Postgres: {e}")
+
+        self.db_reads += 1
+        async with AsyncSessionLocal() as session:
+            stmt = (select(Message).where(Message.thread_id == thread_id)
+                    .order_by(Message.created_at.desc()).limit(settings.CHAT_HISTORY_MAX_MESSAGES))
+            rows = (await session.execute(stmt)).scalars().all()
+        messages = self._ordered([{
+            "id": str(m.id), "thread_id": str(m.thread_id), "role": m.role, "content": m.content,
+            "metadata": m.metadata_ or {}, "created_at": m.created_at.isoformat() if m.created_at else "",
+        } for m in rows])
+        if self.redis is not None and messages:
+            try:
+                # Warm the list; an append racing with this only adds duplicates, dropped on read
+                async with self.redis.redis.pipeline(transaction=True) as pipe:
+                    pipe.rpush(key, *[json.dumps(m) for m in messages])
+                    pipe.ltrim(key, -settings.CHAT_HISTORY_MAX_MESSAGES, -1)
+                    pipe.expire(key, settings.CHAT_HISTORY_TTL)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Chat history warm-up in Redis failed: {e}")
+        return messages
+
+    @staticmethod
+    def _ordered(messages: List[dict]) -> List[dict]:
+        unique = {m["id"]: m for m in messages}
+        return sorted(unique.values(), key=lambda m: m["created_at"])
+
+    @staticmethod
+    def pair_turns(messages: List[dict]) -> List[Tuple[str, str]]:
+        """
+        Pairs each answer with the question it replied to (metadata reply_to), falling back to the
+        closest unanswered user message before it for older rows. Unanswered questions are dropped.
+        """
+        questions: Dict[str, str] = {}
+        turns = []
+        pending = None
+        for message in messages:
+            if message["role"] == "user":
+                questions[message["id"]] = message["content"]
+                pending = message["id"]
+            elif message["role"] == "assistant":
+                question_id = (message.get("metadata") or {}).get("reply_to") or pending
+                if question_id in questions:
+                    turns.append((questions.pop(question_id), message["content"]))
+                if question_id == pending:
+                    pending = None
+        return turns
+
+    # --- write-behind ---
+
+    async def _enqueue(self, kind: str, record: dict):
+        await self.redis.redis.xadd(self.STREAM, {"kind": kind, "data": json.dumps(record)})
+        self.enqueued += 1
+
+    async def _write(self, threads: List[dict], messages: List[dict]):
+        """Idempotent batch insert (threads first: messages reference them)."""
+        async with AsyncSessionLocal() as session:
+            if threads:
+                await session.execute(pg_insert(Thread).values([{
+                    "id": uuid.UUID(t["id"]), "user_id": uuid.UUID(t["user_id"]), "title": t["title"],
+                    "created_at": datetime.fromisoformat(t["created_at"]),
+                    "updated_at": datetime.fromisoformat(t["created_at"]),
+                } for t in threads]).on_conflict_do_nothing(index_elements=["id"]))
+            if messages:
+                await session.execute(pg_insert(Message).values([{
+                    "id": uuid.UUID(m["id"]), "thread_id": uuid.UUID(m["thread_id"]), "role": m["role"],
+                    "content": m["content"], "metadata_": m["metadata"],
+                    "created_at": datetime.fromisoformat(m["created_at"]),
+                } for m in messages]).on_conflict_do_nothing(index_elements=["id"]))
+            await session.commit()
+
+    async def _write_records(self, records: List[Tuple[str, dict]]):
+        threads, messages = {}, {}
+        for kind, record in records:
+            (threads if kind == "thread" else messages)[record["id"]] = record
+        await self._write(list(threads.values()), list(messages.values()))
+
+    async def _dead_letter(self, entry_id: str, fields: dict, error: Exception) -> bool:
+        """Moves a record that keeps failing to DEAD_STREAM; False while it has deliveries left."""
+        r = self.redis.redis
+        pending = await r.xpending_range(self.STREAM, self.GROUP, min=entry_id, max=entry_id, count=1)
+        deliveries = pending[0]["times_delivered"] if pending else settings.CHAT_PERSIST_MAX_DELIVERIES
+        if deliveries < settings.CHAT_PERSIST_MAX_DELIVERIES:
+            return False
+        await r.xadd(self.DEAD_STREAM, dict(fields, entry_id=entry_id, deliveries=deliveries, error=str(error)[:1000]),
+                     maxlen=settings.CHAT_PERSIST_DEAD_MAX_LEN, approximate=True)
+        logger.error(f"Chat history entry {entry_id} failed {deliveries} times, moved to {self.DEAD_STREAM}: {error}")
+        self.dead_lettered += 1
+        return True
+
+    async def _persist(self, entries: list):
+        if not entries:
+            return
+        # Entries deleted from the stream while pending come back without fields: just acknowledge them
+        done = [entry_id for entry_id, fields in entries if not fields]
+        fields_by_id = dict(entries)
+        records, bad = {}, []
+        for entry_id, fields in entries:
+            if fields:
+                try:
+                    records[entry_id] = (fields["kind"], json.loads(fields["data"]))
+                except (KeyError, ValueError) as e:
+                    bad.append((entry_id, fields, e))
+        try:
+            if records:
+                await self._write_records(list(records.values()))
+            done += list(records)
+            self.batches += 1
+        except Exception as e:
+            logger.warning(f"Chat history batch of {len(records)} failed, persisting one by one: {e}")
+            # Threads first: their messages reference them
+            for entry_id, (kind, record) in sorted(records.items(), key=lambda item: item[1][0] != "thread"):
+                try:
+                    await self._write_records([(kind, record)])
+                    done.append(entry_id)
+                except Exception as e:
+                    bad.append((entry_id, fields_by_id[entry_id], e))
+        for entry_id, fields, e in bad:
+            self.record_failures += 1
+            if await self._dead_letter(entry_id, fields, e):
+                done.append(entry_id)
+        if not done:
+            return
+        # Acknowledge only after the commit: a crash before this point means redelivery, not loss.
+        # Failed records stay pending and come back through _reclaim.
+        await self.redis.redis.xack(self.STREAM, self.GROUP, *done)
+        await self.redis.redis.xdel(self.STREAM, *done)
+        self.persisted += len(done)
+
+    async def _reclaim(self):
+        """Takes over entries another (crashed) worker read but never acknowledged."""
+        start_id = "0-0"
+        while True:
+            result = await self.redis.redis.xautoclaim(self.STREAM, self.GROUP, self.consumer,
+                                                       min_idle_time=settings.CHAT_PERSIST_CLAIM_IDLE_MS,
+                                                       start_id=start_id, count=settings.CHAT_PERSIST_BATCH)
+            start_id, entries = result[0], result[1]
+            if entries:
+                self.redeliveries += len(entries)
+                logger.info(f"Re-persisting {len(entries)} unacknowledged chat history entries")
+                await self._persist(entries)
+            if start_id in ("0-0", b"0-0") or not entries:
+                return
+
+    async def _run(self):
+        last_reclaim = 0.0
+        while True:
+            if time.monotonic() - last_reclaim >= settings.CHAT_PERSIST_CLAIM_IDLE_MS / 1000:
+                # A failed reclaim is retried on the next interval; it must not stop new entries
+                last_reclaim = time.monotonic()
+                try:
+                    await self._reclaim()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Chat history reclaim failed: {e}")
+            try:
+                response = await self.redis.redis.xreadgroup(self.GROUP, self.consumer, {self.STREAM: ">"},
+                                                             count=settings.CHAT_PERSIST_BATCH,
+                                                             block=settings.CHAT_PERSIST_INTERVAL_MS)
+                for _, entries in response or []:
+                    await self._persist(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Entries stay pending and are re-claimed on a later pass
+                logger.error(f"Chat history flush failed: {e}")
+                await asyncio.sleep(settings.CHAT_PERSIST_INTERVAL_MS / 1000)
+
+    async def start(self):
+        """Starts the background flusher (app startup); a no-op without Redis."""
+        if self.redis is None or self._task is not None:
+            return
+        try:
+            await self.redis.redis.xgroup_create(self.STREAM, self.GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                logger.error(f"Chat history flusher not started: {e}")
+                return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Chat history flusher started ({self.consumer})")
+
+    async def stop(self):
+        """Stops the flusher after persisting what this worker already read (app shutdown)."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            pending = await self.redis.redis.xreadgroup(self.GROUP, self.consumer, {self.STREAM: "0"},
+                                                        count=settings.CHAT_PERSIST_BATCH * 10)
+            for _, entries in pending or []:
+                await self._persist(entries)
+        except Exception as e:
+            logger.warning(f"Final chat history flush failed (entries will be re-claimed): {e}")
+
+    def stats(self) -> dict:
+        return {
+            "flusher_running": self._task is not None and not self._task.done(),
+            "redis_reads": self.redis_reads,
+            "db_reads": self.db_reads,
+            "enqueued": self.enqueued,
+            "persisted": self.persisted,
+            "batches": self.batches,
+            "redeliveries": self.redeliveries,
+            "record_failures": self.record_failures,
+            "dead_lettered": self.dead_lettered,
+            "direct_writes": self.direct_writes,
+        }
+
+
+chat_history = ChatHistoryStore(redis_client if settings.REDIS_URL and settings.CHAT_HISTORY_CACHE_ENABLED else None)
@@ -4,11 +4,14 @@ from app.db.base import Base
 # Import models so they are registered with Base
 from app.models.user import User
 from app.models.chat import Thread, Message
+from app.db.migrations import run_migrations
 
 async def init_models():
     async with engine.begin() as conn:
         # await conn.run_sync(Base.metadata.drop_all) # WARNING: DELETES DATA. Uncomment only for fresh start.
         await conn.run_sync(Base.metadata.create_all)
+    # Indexes added after the first release (no-ops on a fresh database)
+    await run_migrations(engine)
     print("Database tables created successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,28 @@
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.db.session import engine
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# (name, statement) in order. Every statement must be idempotent: they run on each startup.
+# CONCURRENTLY keeps the tables writable while an index builds on a large existing database.
+MIGRATIONS = [
+    ("threads_user_created_index",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_threads_user_id_created_at ON threads (user_id, created_at, id)"),
+    ("messages_thread_created_index",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_thread_id_created_at ON messages (thread_id, created_at, id)"),
+]
+
+async def run_migrations(db_engine: AsyncEngine = engine):
+    """Applies MIGRATIONS to an existing database (tables themselves come from create_all)."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    async with db_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name, statement in MIGRATIONS:
+            await conn.execute(text(statement))
+            logger.info(f"Migration applied: {name}")
+
+if __name__ == "__main__":
+    asyncio.run(run_migrations())
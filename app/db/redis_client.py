@@ -21,7 +21,10 @@ class RedisClient:
         await self.redis.close()
         
     # Helper methods for Session/Cache
-    async def set_value(self, key: str, value: str, expire: int = None):
+    async def set_value(self, key: str, value: str, expire: int = None, nx: bool = False):
+        if nx:
+            # Only if the key does not exist; returns whether it was written
+            return bool(await self.redis.set(key, value, ex=expire, nx=True))
         if expire:
             await self.redis.setex(key, expire, value)
         else:
@@ -33,6 +36,9 @@ class RedisClient:
     async def delete_value(self, key: str):
         await self.redis.delete(key)
 
+    async def incr(self, key: str) -> int:
+        return int(await self.redis.incr(key))
+
 # Singleton dependency
 redis_client = RedisClient()
 
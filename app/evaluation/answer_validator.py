@@ -1,7 +1,14 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+import numpy as np
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from app.llm.llm_client import LLMClient
+from app.llm.llm_registry import LLMRegistry
 from app.config.prompts import ANSWER_VALIDATOR_PROMPT
+from app.config.settings import settings
+from app.evaluation.grounding_checker import GroundingChecker, BORDERLINE, SUPPORTED
 from app.utils.logger import setup_logger
 
 from langsmith import traceable
@@ -9,20 +16,56 @@ from langsmith import traceable
 logger = setup_logger(__name__)
 
 class AnswerValidator:
-    def __init__(self):
-        self.llm = LLMClient().get_model()
+    def __init__(self, vector_store=None):
+        self.llm = LLMRegistry.get_instance().get_model(call_type="validate")
         self.prompt = PromptTemplate.from_template(ANSWER_VALIDATOR_PROMPT)
+        # "local": claim-level grounding check, LLM only for borderline answers; "llm": always the LLM
+        self.mode = settings.VALIDATOR_MODE
+        self.grounding = GroundingChecker(vector_store) if self.mode == "local" else None
+        self.local_decisions = 0
+        self.escalations = 0
+        self.local_ms: deque = deque(maxlen=1000)
+        self.llm_ms: deque = deque(maxlen=1000)
+
+    @staticmethod
+    def _parse_result(question: str, answer: str, result: str) -> bool:
+        logger.info(f"Validation result: {result}")
+        logger.debug(f"Validation detail. Question: {question} | Answer: {answer} | Result: {result}")
+        if "YES" in result.upper():
+            return True
+        return False
+
+    def _local_check(self, answer: str, documents: list) -> Optional[bool]:
+        """Local verdict, or None when the answer is borderline and needs the LLM."""
+        start = time.perf_counter()
+        result = self.grounding.check(answer, documents)
+        self.local_ms.append((time.perf_counter() - start) * 1000)
+        logger.info(f"Grounding check: {result['verdict']} ({len(result['claims'])} claims, "
+                    f"{result['unsupported_ratio']:.0%} unsupported)")
+        if result["verdict"] == BORDERLINE:
+            self.escalations += 1
+            return None
+        self.local_decisions += 1
+        return result["verdict"] == SUPPORTED
 
     @traceable(name="answer_validation", run_type="chain")
-    def validate(self, question: str, answer: str, context: str) -> bool:
+    def validate(self, question: str, answer: str, context: str, documents: list = None) -> bool:
         """
         Checks if the answer is supported by the context.
         Returns True if YES, False otherwise.
+        With VALIDATOR_MODE=local and the retrieved documents given, the LLM is only asked
+        when the local grounding check is inconclusive.
         """
         if "This information is not clearly present" in answer:
             return True # It correctly identified missing info
 
+        if self.grounding is not None and documents:
+            verdict = self._local_check(answer, documents)
+            if verdict is not None:
+                return verdict
+
         logger.info("Validating answer...")
+        start = time.perf_counter()
         try:
             chain = self.prompt | self.llm | StrOutputParser()
             result = chain.invoke({
@@ -30,14 +73,9 @@ class AnswerValidator:
                 "answer": answer,
                 "context": context
             })
+            self.llm_ms.append((time.perf_counter() - start) * 1000)
             
-            logger.info(f"Validation result: {result}")
-            # print(f"DEBUG VALIDATOR RESULT: {result}")
-            with open("validator_debug.txt", "a", encoding="utf-8") as f:
-                f.write(f"Question: {question}\nAnswer: {answer}\nResult: {result}\n\n")
-            if "YES" in result.upper():
-                return True
-            return False
+            return self._parse_result(question, answer, result)
             # logger.warning(f"Validation failed (result: {result}), but allowing for debug.")
             # return True
         except Exception as e:
@@ -47,3 +85,50 @@ class AnswerValidator:
             # But if LLM fails, we often assume it's okay or fallback.
             # Let's be strict as requested.
             return False
+
+    @traceable(name="answer_validation_async", run_type="chain")
+    async def avalidate(self, question: str, answer: str, context: str, documents: list = None) -> bool:
+        """
+        Async variant of `validate` (same verdict rules; the local check runs in a worker
+        thread, the LLM call via ainvoke).
+        """
+        if "This information is not clearly present" in answer:
+            return True
+
+        if self.grounding is not None and documents:
+            verdict = await asyncio.to_thread(self._local_check, answer, documents)
+            if verdict is not None:
+                return verdict
+
+        logger.info("Validating answer...")
+        start = time.perf_counter()
+        try:
+            chain = self.prompt | self.llm | StrOutputParser()
+            result = await chain.ainvoke({
+                "question": question,
+                "answer": answer,
+                "context": context
+            })
+            self.llm_ms.append((time.perf_counter() - start) * 1000)
+            return self._parse_result(question, answer, result)
+        except Exception as e:
+            logger.error(f"Error validating answer: {e}")
+            return True # Same fail-open behaviour as validate()
+
+    def stats(self) -> dict:
+        checks = self.local_decisions + self.escalations
+        local_avg = float(np.mean(self.local_ms)) if self.local_ms else 0.0
+        llm_avg = float(np.mean(self.llm_ms)) if self.llm_ms else None
+        return {
+            "mode": self.mode,
+            "local_checks": checks,
+            "local_decisions": self.local_decisions,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / checks, 4) if checks else 0.0,
+            "local_check_avg_ms": round(local_avg, 2),
+            "llm_validation_avg_ms": round(llm_avg, 2) if llm_avg is not None else None,
+            # Every local decision skipped one LLM validation call
+            "estimated_latency_saved_ms": (
+                round(self.local_decisions * llm_avg - checks * local_avg, 1) if llm_avg is not None else None
+            ),
+        }
@@ -0,0 +1,819 @@
+"""
+Latency benchmarks for the RAG pipeline stages.
+
+Usage:
+    python -m app.evaluation.benchmarks sparse --sizes 100000 1000000
+    python -m app.evaluation.benchmarks shards --docs 20000 --shards 1 2 4 8
+    python -m app.evaluation.benchmarks fusion --queries-file queries.txt --budgets 10 20 30
+    python -m app.evaluation.benchmarks reranker --queries-file queries.txt --backend onnx
+    python -m app.evaluation.benchmarks cascade --queries-file queries.txt --budgets 50 100 200
+    python -m app.evaluation.benchmarks ttft --queries-file queries.txt
+    python -m app.evaluation.benchmarks grounding --queries-file queries.txt
+    python -m app.evaluation.benchmarks packing --queries-file queries.txt
+    python -m app.evaluation.benchmarks compression --queries-file queries.txt --ratios 1.0 0.7 0.5 0.3
+    LLM_PROVIDER=fake python -m app.evaluation.benchmarks llm --concurrency 1 8 32
+    LLM_PROVIDER=fake python -m app.evaluation.benchmarks chat --concurrency 1 8 32
+    python -m app.evaluation.benchmarks users --requests 1000 --users 50 --db-ms 2
+    python -m app.evaluation.benchmarks pagination --threads 5000 --messages 20000
+    python -m app.evaluation.benchmarks concurrency --base-url http://localhost:8000 --email a@b.c --password ... --chat-concurrency 8
+    python -m app.evaluation.benchmarks auth --base-url http://localhost:8000 --email a@b.c --password ... --login-concurrency 16
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+
+def _percentiles(samples_ms: List[float]) -> str:
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return f"p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms"
+
+
+def _synthetic_corpus(n_docs: int, vocab_size: int = 50000, doc_len: int = 150, seed: int = 0) -> List[List[str]]:
+    """
+    Zipf-distributed token lists, roughly the shape of transcript chunks (~1000 chars).
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"t{i}" for i in range(vocab_size)])
+    ranks = np.minimum(rng.zipf(1.2, size=n_docs * doc_len), vocab_size) - 1
+    tokens = vocab[ranks].reshape(n_docs, doc_len)
+    return [row.tolist() for row in tokens]
+
+
+def bench_sparse(sizes: List[int], n_queries: int = 200, top_k: int = 25):
+    """
+    Query latency of BM25Index.top_k (CSR + argpartition) and cold load time of the mmap layout.
+    """
+    from app.retrieval.bm25_index import BM25Index
+
+    for n_docs in sizes:
+        corpus = _synthetic_corpus(n_docs)
+        start = time.perf_counter()
+        index = BM25Index()
+        index.add_documents(corpus, [f"{i:016x}" for i in range(n_docs)])
+        build_s = time.perf_counter() - start
+
+        index_dir = tempfile.mkdtemp()
+        try:
+            index.save(f"{index_dir}/bm25_index")
+            start = time.perf_counter()
+            index = BM25Index.load(f"{index_dir}/bm25_index")
+            load_ms = (time.perf_counter() - start) * 1000
+
+            rng = random.Random(1)
+            queries = [rng.sample(corpus[rng.randrange(n_docs)], 5) for _ in range(n_queries)]
+
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                index.top_k(query, top_k)
+                samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            del index
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+        print(f"[sparse] docs={n_docs} build={build_s:.1f}s load={load_ms:.1f}ms {_percentiles(samples)}")
+
+
+def bench_shards(n_docs: int, shard_counts: List[int], n_queries: int = 100, top_k: int = 25):
+    """
+    Hybrid-leg latency (dense + sparse) versus number of retrieval shard processes.
+    Chunks are grouped 50 per synthetic video so partitioning by source is exercised.
+    """
+    from app.retrieval.sharded_retriever import ShardedRetriever
+
+    corpus = _synthetic_corpus(n_docs, doc_len=120)
+    chunks = [
+        {"text": " ".join(tokens), "video_id": f"video{i // 50}", "window_start_time": 0.0,
+         "chunk_index": i % 50, "chunk_id": f"{i:016x}"}
+        for i, tokens in enumerate(corpus)
+    ]
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(corpus[rng.randrange(n_docs)], 5)) for _ in range(n_queries)]
+
+    for num_shards in shard_counts:
+        shards_dir = tempfile.mkdtemp()
+        shards = ShardedRetriever(num_shards=num_shards, shards_dir=shards_dir)
+        try:
+            start = time.perf_counter()
+            for i in range(0, len(chunks), 5000):
+                shards.add_documents(chunks[i:i + 5000])
+            build_s = time.perf_counter() - start
+
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                shards.retrieve(query, dense_k=top_k, sparse_k=top_k)
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"[shards] docs={n_docs} shards={num_shards} build={build_s:.1f}s {_percentiles(samples)}")
+        finally:
+            shards.close()
+            shutil.rmtree(shards_dir, ignore_errors=True)
+
+
+def _load_queries(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _local_retrieval():
+    """Hybrid retriever over the local indexes in data/, without the LLM components."""
+    from app.vectorstore.faiss_store import FaissVectorStore
+    from app.vectorstore.metadata_store import MetadataStore
+    from app.retrieval.dense_retriever import DenseRetriever
+    from app.retrieval.sparse_retriever import SparseRetriever
+    from app.retrieval.reranker import Reranker
+    from app.retrieval.hybrid_retriever import HybridRetriever
+
+    return HybridRetriever(DenseRetriever(FaissVectorStore()), SparseRetriever(MetadataStore()), Reranker())
+
+
+def bench_fusion(queries: List[str], budgets: List[int]):
+    """
+    Quality versus reranker work for fused candidate budgets, on the local corpus.
+    Baseline: every unique candidate of both legs is reranked (previous behaviour).
+    Quality: overlap of the final top-k with the baseline top-k (recall@k against the full rerank).
+    """
+    from app.config.settings import settings
+    from app.vectorstore.metadata_store import MetadataStore
+
+    hybrid = _local_retrieval()
+    top_k = settings.RERANK_TOP_K
+    baseline_pairs, baseline_ms = [], []
+    rows = {budget: {"recall": [], "pairs": [], "ms": []} for budget in budgets}
+
+    for query in queries:
+        dense_results, sparse_results = hybrid._retrieve(query, top_k=hybrid._candidate_k(query))
+        fused = [doc for doc, _ in hybrid.fuse(dense_results, sparse_results)]
+
+        start = time.perf_counter()
+        reference = hybrid.reranker.rerank(query, list(fused), top_k=top_k)
+        baseline_ms.append((time.perf_counter() - start) * 1000)
+        baseline_pairs.append(len(fused))
+        reference_ids = {MetadataStore.ensure_chunk_id(doc) for doc in reference}
+
+        for budget in budgets:
+            start = time.perf_counter()
+            final = hybrid.reranker.rerank(query, fused[:budget], top_k=top_k)
+            rows[budget]["ms"].append((time.perf_counter() - start) * 1000)
+            rows[budget]["pairs"].append(min(budget, len(fused)))
+            hits = len(reference_ids & {MetadataStore.ensure_chunk_id(doc) for doc in final})
+            rows[budget]["recall"].append(hits / max(len(reference_ids), 1))
+
+    print(f"[fusion] method={settings.FUSION_METHOD} queries={len(queries)} "
+          f"baseline pairs/query={np.mean(baseline_pairs):.1f} rerank={np.mean(baseline_ms):.1f}ms")
+    for budget, row in rows.items():
+        saved = 1 - np.sum(row["pairs"]) / max(np.sum(baseline_pairs), 1)
+        print(f"[fusion] budget={budget} recall@{top_k}={np.mean(row['recall']):.3f} "
+              f"pairs/query={np.mean(row['pairs']):.1f} rerank={np.mean(row['ms']):.1f}ms "
+              f"reranker work saved={saved:.0%}")
+
+
+def bench_reranker(queries: List[str], backend: str, sizes: List[int]):
+    """
+    Per-query latency of a reranker engine versus the fp32 PyTorch baseline (unbucketed,
+    as before), and Spearman rank correlation of their scores on the same candidates.
+    """
+    from app.config.settings import settings
+    from app.retrieval.reranker import Reranker, spearman
+
+    hybrid = _local_retrieval()
+    reference = hybrid.reranker
+    candidate = Reranker(backend=backend)
+    max_k = max(sizes)
+
+    rows = {n: {"ref_ms": [], "ms": [], "rho": []} for n in sizes}
+    for query in queries:
+        dense_results, sparse_results = hybrid._retrieve(query, top_k=max_k)
+        docs = [doc for doc, _ in hybrid.fuse(dense_results, sparse_results)]
+        for n in sizes:
+            pairs = [[query, doc.page_content] for doc in docs[:n]]
+            if len(pairs) < n:
+                continue
+            start = time.perf_counter()
+            ref_scores = reference.model.predict(pairs, show_progress_bar=False)
+            rows[n]["ref_ms"].append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            scores = candidate.predict(pairs)
+            rows[n]["ms"].append((time.perf_counter() - start) * 1000)
+            rows[n]["rho"].append(spearman(ref_scores, scores))
+
+    for n, row in rows.items():
+        if not row["ms"]:
+            print(f"[reranker] candidates={n}: corpus too small")
+            continue
+        min_rho = min(row["rho"])
+        print(f"[reranker] backend={backend} candidates={n} queries={len(row['ms'])} "
+              f"torch={np.mean(row['ref_ms']):.1f}ms {backend}={np.mean(row['ms']):.1f}ms "
+              f"spearman mean={np.mean(row['rho']):.3f} min={min_rho:.3f} "
+              f"{'PASS' if min_rho >= settings.RERANKER_MIN_AGREEMENT else 'FAIL'}")
+
+
+def bench_cascade(queries: List[str], budgets: List[float]):
+    """
+    Cascade reranking per latency budget: rerank latency, how often the CrossEncoder is
+    skipped or stopped early, and top-k overlap with a full rerank of the same candidates.
+    """
+    from app.config.settings import settings
+
+    hybrid = _local_retrieval()
+    reranker = hybrid.reranker
+    top_k = settings.RERANK_TOP_K
+    prepared = []
+    for query in queries:
+        dense_results, sparse_results = hybrid._retrieve(query, top_k=settings.RETRIEVAL_TOP_K)
+        fused = hybrid.fuse(dense_results, sparse_results)[:settings.RERANK_CANDIDATE_BUDGET or None]
+        confidence = hybrid.first_stage_confidence(dense_results, sparse_results, top_k)
+        prepared.append((query, [doc for doc, _ in fused], confidence))
+
+    def run(budget_ms):
+        latencies, top_ids = [], []
+        for query, docs, confidence in prepared:
+            # Cold score cache so every configuration pays for its own CrossEncoder calls
+            reranker.score_cache.clear()
+            start = time.perf_counter()
+            ranked = reranker.rerank(query, list(docs), top_k=top_k, budget_ms=budget_ms,
+                                     first_stage_confidence=confidence if budget_ms is not None else 0.0)
+            latencies.append((time.perf_counter() - start) * 1000)
+            top_ids.append({doc.metadata["chunk_id"] for doc in ranked})
+        return latencies, top_ids
+
+    full_ms, full_ids = run(None)
+    print(f"[cascade] full rerank: {_percentiles(full_ms)}")
+    for budget_ms in budgets:
+        skips, stops = reranker.cascade_skips, reranker.cascade_early_stops
+        latencies, top_ids = run(budget_ms)
+        overlap = np.mean([len(a & b) / max(len(b), 1) for a, b in zip(top_ids, full_ids)])
+        print(f"[cascade] budget={budget_ms:.0f}ms {_percentiles(latencies)} "
+              f"skipped={reranker.cascade_skips - skips} early_stops={reranker.cascade_early_stops - stops} "
+              f"top{top_k} overlap={overlap:.3f}")
+
+
+async def bench_ttft(queries: List[str]):
+    """
+    Time to first token and total answer time for the "buffered" and "live" streaming modes
+    over the same retrieved context (needs the configured LLM provider).
+    """
+    from app.llm.answer_generator import AnswerGenerator
+
+    hybrid = _local_retrieval()
+    generator = AnswerGenerator()
+    contexts = [(query, hybrid.search(query)) for query in queries]
+    for mode in ("buffered", "live"):
+        ttft, total = [], []
+        for query, docs in contexts:
+            start = time.perf_counter()
+            first = None
+            async for _ in generator.agenerate_answer(query, docs, mode=mode):
+                if first is None:
+                    first = (time.perf_counter() - start) * 1000
+            ttft.append(first)
+            total.append((time.perf_counter() - start) * 1000)
+        print(f"[ttft] mode={mode} queries={len(queries)} ttft {_percentiles(ttft)}")
+        print(f"[ttft] mode={mode} total {_percentiles(total)}")
+
+
+def bench_grounding(queries: List[str]):
+    """
+    Local grounding check versus the LLM validator on generated answers: agreement on the
+    local decisions, escalation rate and validation latency of both (needs the LLM provider).
+    """
+    from app.llm.answer_generator import AnswerGenerator
+    from app.evaluation.grounding_checker import GroundingChecker, BORDERLINE, SUPPORTED
+
+    hybrid = _local_retrieval()
+    generator = AnswerGenerator()
+    checker = GroundingChecker(hybrid.dense.vector_store)
+    llm_ms, local_ms, agree, escalated = [], [], [], 0
+    for query in queries:
+        docs = hybrid.search(query)
+        context_str, messages, docs = generator._build_messages(query, docs)
+        answer = generator._format_response(generator.llm.invoke(messages).content)
+
+        start = time.perf_counter()
+        llm_verdict = generator.validator._parse_result(query, answer, (generator.validator.prompt | generator.llm).invoke(
+            {"question": query, "answer": answer, "context": context_str}).content)
+        llm_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        result = checker.check(answer, docs)
+        local_ms.append((time.perf_counter() - start) * 1000)
+        if result["verdict"] == BORDERLINE:
+            escalated += 1
+        else:
+            agree.append((result["verdict"] == SUPPORTED) == llm_verdict)
+
+    print(f"[grounding] answers={len(queries)} escalated={escalated} ({escalated / len(queries):.1%})")
+    print(f"[grounding] agreement with LLM on local decisions: {np.mean(agree) if agree else float('nan'):.3f} ({len(agree)} answers)")
+    print(f"[grounding] llm validation {_percentiles(llm_ms)}")
+    print(f"[grounding] local check {_percentiles(local_ms)}")
+    saved = np.mean(llm_ms) * (len(queries) - escalated) - np.sum(local_ms)
+    print(f"[grounding] validation latency saved per answer: {saved / len(queries):.1f}ms")
+
+
+def bench_packing(queries: List[str]):
+    """
+    Prompt tokens and generation latency with and without token-budgeted context packing,
+    over the same reranked documents (needs the LLM provider).
+    """
+    from app.config.settings import settings
+    from app.llm.answer_generator import AnswerGenerator
+    from app.reasoning.prompt_builder import TokenCounter
+
+    hybrid = _local_retrieval()
+    generator = AnswerGenerator()
+    contexts = [(query, hybrid.search(query)) for query in queries]
+    results = {}
+    for packing in (False, True):
+        settings.CONTEXT_PACKING_ENABLED = packing
+        tokens, latencies = [], []
+        for query, docs in contexts:
+            _, messages, _ = generator._build_messages(query, docs)
+            tokens.append(sum(TokenCounter.count(m.content) for m in messages))
+            start = time.perf_counter()
+            generator.llm.invoke(messages)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[packing] = (tokens, latencies)
+        print(f"[packing] packing={'on' if packing else 'off'} prompt tokens mean={np.mean(tokens):.0f} "
+              f"generation {_percentiles(latencies)}")
+    (off_tokens, off_ms), (on_tokens, on_ms) = results[False], results[True]
+    print(f"[packing] prompt tokens saved per answer: {np.mean(off_tokens) - np.mean(on_tokens):.0f} "
+          f"({1 - np.mean(on_tokens) / np.mean(off_tokens):.1%}), "
+          f"generation latency saved: {np.mean(off_ms) - np.mean(on_ms):.0f}ms mean")
+
+
+async def _login(client, email: str, password: str) -> dict:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _probe_threads(client, headers: dict, probes: int) -> List[float]:
+    latencies = []
+    for _ in range(probes):
+        start = time.perf_counter()
+        response = await client.get("/threads", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.05)
+    return latencies
+
+
+async def _chat_load(client, headers: dict, message: str, stop: asyncio.Event, counts: dict):
+    # Streams /chat responses back to back until stopped (session IDs are not UUIDs: no DB history)
+    while not stop.is_set():
+        async with client.stream("POST", "/chat", headers=headers,
+                                 json={"message": message, "session_id": "benchmark"}) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            counts[response.status_code] = counts.get(response.status_code, 0) + 1
+
+
+async def bench_concurrency(base_url: str, email: str, password: str, chat_concurrency: int,
+                            probes: int, message: str):
+    """
+    Event-loop health under load, against a running server: /threads latency idle versus
+    while `chat_concurrency` clients stream /chat back to back. With inference and LLM calls
+    off the event loop, the loaded p95 should stay close to the idle p95.
+    """
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        headers = await _login(client, email, password)
+        idle = await _probe_threads(client, headers, probes)
+        print(f"[concurrency] /threads idle: {_percentiles(idle)}")
+
+        stop, counts = asyncio.Event(), {}
+        load = [asyncio.create_task(_chat_load(client, headers, message, stop, counts)) for _ in range(chat_concurrency)]
+        await asyncio.sleep(1.0)  # let the chat requests reach retrieval / generation
+        loaded = await _probe_threads(client, headers, probes)
+        stop.set()
+        await asyncio.gather(*load, return_exceptions=True)
+
+        print(f"[concurrency] /threads with {chat_concurrency} concurrent /chat: {_percentiles(loaded)}")
+        print(f"[concurrency] /chat responses by status: {counts}")
+        print(f"[concurrency] p95 ratio loaded/idle: {np.percentile(loaded, 95) / np.percentile(idle, 95):.2f}x")
+
+
+async def _timed_chats(client, headers: dict, message: str, n: int) -> List[float]:
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        async with client.stream("POST", "/chat", headers=headers,
+                                 json={"message": message, "session_id": "benchmark"}) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def bench_auth(base_url: str, email: str, password: str, login_concurrency: int, probes: int, message: str):
+    """
+    Against a running server: login throughput under `login_concurrency` clients logging in back
+    to back, and /chat latency (p99) idle versus during that login burst. With hashing in the
+    bounded password executor the loaded chat p99 should stay close to idle; excess logins get 503.
+    """
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        headers = await _login(client, email, password)
+        idle = await _timed_chats(client, headers, message, probes)
+        print(f"[auth] /chat idle: {_percentiles(idle)}")
+
+        stop, counts, login_ms = asyncio.Event(), {}, []
+
+        async def login_loop():
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = await client.post("/auth/login", json={"email": email, "password": password})
+                counts[response.status_code] = counts.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    login_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        logins = [asyncio.create_task(login_loop()) for _ in range(login_concurrency)]
+        await asyncio.sleep(0.5)  # let the burst saturate the password executor
+        loaded = await _timed_chats(client, headers, message, probes)
+        stop.set()
+        await asyncio.gather(*logins, return_exceptions=True)
+        elapsed = time.perf_counter() - start
+
+        print(f"[auth] logins: {len(login_ms) / elapsed:.1f}/s successful, by status {counts}, latency {_percentiles(login_ms)}")
+        print(f"[auth] /chat during {login_concurrency} concurrent logins: {_percentiles(loaded)}")
+        print(f"[auth] p99 ratio loaded/idle: {np.percentile(loaded, 99) / np.percentile(idle, 99):.2f}x")
+
+
+def bench_compression(queries: List[str], ratios: List[float]):
+    """
+    Extractive context compression per ratio: compression cost, context size, generation latency
+    and answer quality (needs the LLM provider). Quality is the embedding similarity of each answer
+    to the uncompressed answer, and the local grounding pass rate against the full documents.
+    """
+    from app.config.settings import settings
+    from app.llm.answer_generator import AnswerGenerator
+    from app.reasoning.context_compressor import ContextCompressor
+    from app.evaluation.grounding_checker import GroundingChecker, UNSUPPORTED
+
+    hybrid = _local_retrieval()
+    generator = AnswerGenerator()
+    compressor = ContextCompressor()
+    checker = GroundingChecker(hybrid.dense.vector_store)
+    contexts = [(query, hybrid.search(query)) for query in queries]
+    baseline = None
+    for ratio in sorted(ratios, reverse=True):
+        settings.CONTEXT_COMPRESSION_RATIO = ratio
+        compress_ms, generate_ms, chars, answers, grounded = [], [], [], [], []
+        for query, docs in contexts:
+            start = time.perf_counter()
+            compressed = compressor.compress(docs, query)
+            compress_ms.append((time.perf_counter() - start) * 1000)
+            chars.append(sum(len(doc.page_content) for doc in compressed))
+            _, messages, _ = generator._build_messages(query, compressed)
+            start = time.perf_counter()
+            answer = generator._format_response(generator.llm.invoke(messages).content)
+            generate_ms.append((time.perf_counter() - start) * 1000)
+            answers.append(answer)
+            grounded.append(checker.check(answer, docs)["verdict"] != UNSUPPORTED)
+
+        vectors = np.asarray(compressor.embeddings.embed_documents(answers), dtype=np.float32)
+        if baseline is None:
+            baseline = vectors
+        similarity = np.mean(np.sum(vectors * baseline, axis=1))
+        print(f"[compression] ratio={ratio} context chars mean={np.mean(chars):.0f} "
+              f"compress {_percentiles(compress_ms)}")
+        print(f"[compression] ratio={ratio} generation {_percentiles(generate_ms)} "
+              f"answer similarity to {sorted(ratios)[-1]}={similarity:.3f} grounded={np.mean(grounded):.1%}")
+
+
+async def bench_llm(concurrency_levels: List[int], n_requests: int, model_name: str = None):
+    """
+    Streaming LLM throughput through the registry (hedging, breakers, cache) per concurrency level.
+    Meant for the offline provider (LLM_PROVIDER=fake, FAKE_LLM_* for latency and error rate);
+    the response cache is disabled so every request reaches the model.
+    """
+    from langchain_core.messages import HumanMessage
+    from app.config.settings import settings
+    from app.llm.llm_registry import LLMRegistry
+
+    settings.LLM_CACHE_ENABLED = False
+    registry = LLMRegistry()
+    llm = registry.get_model(model_name, call_type="benchmark")
+    context = " ".join(f"Sentence {i} of the transcript (Start: 00:{i:02d})." for i in range(60))
+
+    async def one(i: int, ttfts: List[float], totals: List[float], failures: List[int]):
+        start = time.perf_counter()
+        first = True
+        try:
+            async for _ in llm.astream([HumanMessage(content=f"Context:\n{context}\n\nQuestion: {i}")]):
+                if first:
+                    ttfts.append((time.perf_counter() - start) * 1000)
+                    first = False
+        except Exception:
+            failures.append(i)
+            return
+        totals.append((time.perf_counter() - start) * 1000)
+
+    for concurrency in concurrency_levels:
+        semaphore = asyncio.Semaphore(concurrency)
+        ttfts, totals, failures = [], [], []
+
+        async def bounded(i):
+            async with semaphore:
+                await one(i, ttfts, totals, failures)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+        print(f"[llm] concurrency={concurrency} requests={n_requests} failures={len(failures)} "
+              f"throughput={n_requests / elapsed:.1f} req/s")
+        if ttfts:
+            print(f"[llm] concurrency={concurrency} ttft {_percentiles(ttfts)}")
+            print(f"[llm] concurrency={concurrency} total {_percentiles(totals)}")
+    print(f"[llm] hedges={registry.hedges} hedge_wins={registry.hedge_wins} failovers={registry.failovers}")
+
+
+async def bench_chat(concurrency_levels: List[int], n_requests: int, model_name: str = None):
+    """
+    /chat answer throughput per concurrency level: the live answer stream (generation, citation
+    formatting, validation) for the ChatRequest default model unless `model_name` is given, over
+    synthetic transcript chunks. Runs fully offline with LLM_PROVIDER=fake; the response cache is
+    disabled so every request reaches the model.
+    """
+    from langchain_core.documents import Document
+    from app.api.schemas import ChatRequest
+    from app.config.settings import settings
+    from app.llm.answer_generator import AnswerGenerator
+    from app.llm.llm_registry import LLMRegistry
+
+    settings.LLM_CACHE_ENABLED = False
+    model_name = model_name or ChatRequest.model_fields["model_name"].default
+    generator = AnswerGenerator()
+    registry = LLMRegistry.get_instance()
+    documents = [Document(page_content=" ".join(f"Point {i}.{j} of the talk." for j in range(12)),
+                          metadata={"chunk_id": f"c{i}", "video_id": "bench", "chunk_index": i, "start": 30.0 * i})
+                 for i in range(5)]
+
+    async def one(i: int, ttfts: List[float], totals: List[float], failures: List[int]):
+        start = time.perf_counter()
+        first, failed = True, False
+        async for event, _ in generator.astream_answer(f"What is point {i % 5}?", documents, model_name):
+            if event == "token" and first:
+                ttfts.append((time.perf_counter() - start) * 1000)
+                first = False
+            failed = failed or event == "error"
+        if failed:
+            failures.append(i)
+        else:
+            totals.append((time.perf_counter() - start) * 1000)
+
+    for concurrency in concurrency_levels:
+        semaphore = asyncio.Semaphore(concurrency)
+        ttfts, totals, failures = [], [], []
+
+        async def bounded(i):
+            async with semaphore:
+                await one(i, ttfts, totals, failures)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+        print(f"[chat] model={registry.resolve(model_name)} concurrency={concurrency} requests={n_requests} "
+              f"failures={len(failures)} throughput={n_requests / elapsed:.1f} answers/s")
+        if ttfts:
+            print(f"[chat] concurrency={concurrency} ttft {_percentiles(ttfts)}")
+        if totals:
+            print(f"[chat] concurrency={concurrency} total {_percentiles(totals)}")
+
+
+async def bench_users(n_requests: int, n_users: int, db_ms: float, update_every: int, seed: int = 0):
+    """
+    DB queries avoided by the user cache in get_current_user. Requests come from a skewed
+    (Zipf-like) user mix; every `update_every` requests one user is updated, which invalidates
+    it like the ORM update event does. The users table is simulated with a `db_ms` round trip.
+    """
+    import uuid
+    from app.api.user_cache import UserCache
+    from app.models.user import User
+
+    rng = random.Random(seed)
+    users = {uuid.uuid4(): f"user{i}@example.com" for i in range(n_users)}
+    ids = list(users)
+    weights = [1 / (rank + 1) for rank in range(n_users)]
+    requests = rng.choices(ids, weights=weights, k=n_requests)
+    queries = {"count": 0}
+
+    async def load_user(uid):
+        queries["count"] += 1
+        await asyncio.sleep(db_ms / 1000)
+        return User(id=uid, email=users[uid], full_name=None, is_active=True)
+
+    for cached in (False, True):
+        cache = UserCache()
+        queries["count"] = 0
+        latencies = []
+        for i, uid in enumerate(requests):
+            if update_every and i and i % update_every == 0:
+                cache.invalidate(rng.choice(ids))
+            start = time.perf_counter()
+            if cached:
+                await cache.get(uid, load_user)
+            else:
+                await load_user(uid)
+            latencies.append((time.perf_counter() - start) * 1000)
+        per_1000 = queries["count"] * 1000 / n_requests
+        print(f"[users] cache={'on' if cached else 'off'} db queries per 1000 requests={per_1000:.0f} "
+              f"auth lookup {_percentiles(latencies)}")
+    print(f"[users] db queries avoided per 1000 requests: {1000 - per_1000:.0f} ({cache.stats()})")
+
+
+async def bench_pagination(n_threads: int, n_messages: int, page_size: int, pages: int):
+    """
+    Thread and message listing on a seeded database (DATABASE_URL): the unbounded thread list,
+    OFFSET pages and keyset pages at increasing depth, plus the query plan of a keyset page.
+    The seeded user, threads and messages are deleted afterwards.
+    """
+    import uuid
+    from datetime import datetime, timedelta
+    from sqlalchemy import delete, insert, select, text, tuple_
+    from app.db.init_db import init_models
+    from app.db.session import AsyncSessionLocal
+    from app.models.user import User
+    from app.models.chat import Message, Thread
+
+    await init_models()
+    user_id = uuid.uuid4()
+    base = datetime.utcnow() - timedelta(days=365)
+    thread_rows = [{"id": uuid.uuid4(), "user_id": user_id, "title": f"Thread {i}",
+                    "created_at": base + timedelta(seconds=i), "updated_at": base} for i in range(n_threads)]
+    big_thread = thread_rows[-1]["id"]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User).values(id=user_id, email=f"bench-{user_id}@example.com", password_hash="-"))
+        for i in range(0, n_threads, 1000):
+            await db.execute(insert(Thread).values(thread_rows[i:i + 1000]))
+        for i in range(0, n_messages, 1000):
+            await db.execute(insert(Message).values([
+                {"id": uuid.uuid4(), "thread_id": big_thread, "role": "user" if j % 2 == 0 else "assistant",
+                 "content": f"Message {j}", "metadata_": {}, "created_at": base + timedelta(seconds=j)}
+                for j in range(i, min(i + 1000, n_messages))]))
+        await db.commit()
+
+    async def timed(db, stmt) -> Tuple[float, list]:
+        start = time.perf_counter()
+        rows = (await db.execute(stmt)).scalars().all()
+        return (time.perf_counter() - start) * 1000, rows
+
+    try:
+        async with AsyncSessionLocal() as db:
+            ms, rows = await timed(db, select(Thread).where(Thread.user_id == user_id).order_by(Thread.created_at.desc()))
+            print(f"[pagination] all threads (previous /threads): {len(rows)} rows in {ms:.1f}ms")
+
+            for model, column, owner in ((Thread, Thread.user_id, user_id), (Message, Message.thread_id, big_thread)):
+                base_stmt = select(model).where(column == owner).order_by(model.created_at.desc(), model.id.desc())
+                after, offset_ms, keyset_ms = None, [], []
+                for page in range(pages):
+                    ms, _ = await timed(db, base_stmt.offset(page * page_size).limit(page_size))
+                    offset_ms.append(ms)
+                    stmt = base_stmt if after is None else base_stmt.where(tuple_(model.created_at, model.id) < after)
+                    ms, rows = await timed(db, stmt.limit(page_size))
+                    keyset_ms.append(ms)
+                    if not rows:
+                        break
+                    after = (rows[-1].created_at, rows[-1].id)
+                name = model.__tablename__
+                print(f"[pagination] {name} offset pages: first={offset_ms[0]:.2f}ms last={offset_ms[-1]:.2f}ms "
+                      f"({_percentiles(offset_ms)})")
+                print(f"[pagination] {name} keyset pages: first={keyset_ms[0]:.2f}ms last={keyset_ms[-1]:.2f}ms "
+                      f"({_percentiles(keyset_ms)})")
+
+            plan = (await db.execute(text(
+                "EXPLAIN SELECT * FROM messages WHERE thread_id = :t AND (created_at, id) < (:c, :i) "
+                "ORDER BY created_at DESC, id DESC LIMIT :n"),
+                {"t": big_thread, "c": datetime.utcnow(), "i": uuid.uuid4(), "n": page_size})).scalars().all()
+            print("[pagination] keyset message page plan:\n  " + "\n  ".join(plan))
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Message).where(Message.thread_id.in_([t["id"] for t in thread_rows])))
+            await db.execute(delete(Thread).where(Thread.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    sparse = sub.add_parser("sparse", help="BM25 top-k query latency")
+    sparse.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    sparse.add_argument("--queries", type=int, default=200)
+
+    shards = sub.add_parser("shards", help="Hybrid retrieval latency versus shard count")
+    shards.add_argument("--docs", type=int, default=20_000)
+    shards.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    shards.add_argument("--queries", type=int, default=100)
+
+    fusion = sub.add_parser("fusion", help="Rerank quality versus candidate budget")
+    fusion.add_argument("--queries-file", required=True, help="One query per line")
+    fusion.add_argument("--budgets", type=int, nargs="+", default=[10, 20, 30])
+
+    reranker = sub.add_parser("reranker", help="Reranker engine latency and rank agreement with fp32 torch")
+    reranker.add_argument("--queries-file", required=True, help="One query per line")
+    reranker.add_argument("--backend", default="onnx")
+    reranker.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100])
+
+    cascade = sub.add_parser("cascade", help="Cascade reranking latency and quality per budget")
+    cascade.add_argument("--queries-file", required=True, help="One query per line")
+    cascade.add_argument("--budgets", type=float, nargs="+", default=[50, 100, 200])
+
+    ttft = sub.add_parser("ttft", help="Time to first token: buffered versus live streaming")
+    ttft.add_argument("--queries-file", required=True, help="One query per line")
+
+    grounding = sub.add_parser("grounding", help="Local grounding check versus LLM validation")
+    grounding.add_argument("--queries-file", required=True, help="One query per line")
+
+    packing = sub.add_parser("packing", help="Prompt tokens and generation latency with/without context packing")
+    packing.add_argument("--queries-file", required=True, help="One query per line")
+
+    compression = sub.add_parser("compression", help="Context size, latency and answer quality per compression ratio")
+    compression.add_argument("--queries-file", required=True, help="One query per line")
+    compression.add_argument("--ratios", type=float, nargs="+", default=[1.0, 0.7, 0.5, 0.3])
+
+    llm = sub.add_parser("llm", help="Streaming LLM throughput per concurrency level (use LLM_PROVIDER=fake offline)")
+    llm.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    llm.add_argument("--requests", type=int, default=64)
+    llm.add_argument("--model", default=None, help="Registry model name, e.g. fake (or a model in LLM_ALLOWED_MODELS)")
+
+    chat = sub.add_parser("chat", help="/chat answer throughput per concurrency level (use LLM_PROVIDER=fake offline)")
+    chat.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    chat.add_argument("--requests", type=int, default=64)
+    chat.add_argument("--model", default=None, help="Registry model name (default: the ChatRequest default)")
+
+    users = sub.add_parser("users", help="DB queries avoided by the authenticated-user cache")
+    users.add_argument("--requests", type=int, default=1000)
+    users.add_argument("--users", type=int, default=50)
+    users.add_argument("--db-ms", type=float, default=2.0, help="Simulated users-table round trip")
+    users.add_argument("--update-every", type=int, default=200, help="Invalidate one user every N requests (0 = never)")
+
+    auth = sub.add_parser("auth", help="Login throughput and /chat p99 during a login burst (running server)")
+    auth.add_argument("--base-url", default="http://localhost:8000")
+    auth.add_argument("--email", required=True)
+    auth.add_argument("--password", required=True)
+    auth.add_argument("--login-concurrency", type=int, default=16)
+    auth.add_argument("--probes", type=int, default=30)
+    auth.add_argument("--message", default="What are the main topics discussed in the video?")
+
+    pagination = sub.add_parser("pagination", help="Offset versus keyset pagination on a seeded database")
+    pagination.add_argument("--threads", type=int, default=5000)
+    pagination.add_argument("--messages", type=int, default=20000)
+    pagination.add_argument("--page-size", type=int, default=50)
+    pagination.add_argument("--pages", type=int, default=50)
+
+    concurrency = sub.add_parser("concurrency", help="/threads latency while /chat is loaded (running server)")
+    concurrency.add_argument("--base-url", default="http://localhost:8000")
+    concurrency.add_argument("--email", required=True)
+    concurrency.add_argument("--password", required=True)
+    concurrency.add_argument("--chat-concurrency", type=int, default=8)
+    concurrency.add_argument("--probes", type=int, default=50)
+    concurrency.add_argument("--message", default="What are the main topics discussed in the video?")
+
+    args = parser.parse_args()
+    if args.bench == "sparse":
+        bench_sparse(args.sizes, n_queries=args.queries)
+    elif args.bench == "shards":
+        bench_shards(args.docs, args.shards, n_queries=args.queries)
+    elif args.bench == "fusion":
+        bench_fusion(_load_queries(args.queries_file), args.budgets)
+    elif args.bench == "reranker":
+        bench_reranker(_load_queries(args.queries_file), args.backend, args.sizes)
+    elif args.bench == "cascade":
+        bench_cascade(_load_queries(args.queries_file), args.budgets)
+    elif args.bench == "ttft":
+        asyncio.run(bench_ttft(_load_queries(args.queries_file)))
+    elif args.bench == "grounding":
+        bench_grounding(_load_queries(args.queries_file))
+    elif args.bench == "packing":
+        bench_packing(_load_queries(args.queries_file))
+    elif args.bench == "compression":
+        bench_compression(_load_queries(args.queries_file), args.ratios)
+    elif args.bench == "llm":
+        asyncio.run(bench_llm(args.concurrency, args.requests, args.model))
+    elif args.bench == "chat":
+        asyncio.run(bench_chat(args.concurrency, args.requests, args.model))
+    elif args.bench == "users":
+        asyncio.run(bench_users(args.requests, args.users, args.db_ms, args.update_every))
+    elif args.bench == "auth":
+        asyncio.run(bench_auth(args.base_url, args.email, args.password, args.login_concurrency,
+                               args.probes, args.message))
+    elif args.bench == "pagination":
+        asyncio.run(bench_pagination(args.threads, args.messages, args.page_size, args.pages))
+    elif args.bench == "concurrency":
+        asyncio.run(bench_concurrency(args.base_url, args.email, args.password, args.chat_concurrency,
+                                      args.probes, args.message))
+
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,14 @@ class ConfidenceScorer:
         # If we rely on cosine similarity (0-1), 0.3 is very low.
         # We stored 'relevance_score' in metadata.
         
-        top_score = documents[0].metadata.get('relevance_score', 0.0)
+        scores = [doc.metadata.get('relevance_score') for doc in documents]
+        scores = [score for score in scores if score is not None]
+        if not scores:
+            # Reranking was skipped (confident first stage) or ran out of budget: no CrossEncoder
+            # score to judge by, and the first-stage scores are not on the same scale
+            logger.info("No relevance scores (rerank skipped).")
+            return "MEDIUM"
+        top_score = max(scores)
         logger.info(f"Top relevance score: {top_score}")
         
         # Thresholds (Tunable)
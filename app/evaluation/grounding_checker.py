@@ -0,0 +1,157 @@
+import hashlib
+import re
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from app.embeddings.embedding_model import EmbeddingModel
+from app.utils.cache import TTLCache
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+from langsmith import traceable
+
+logger = setup_logger(__name__)
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at", "for", "with", "by", "from",
+    "as", "is", "are", "was", "were", "be", "been", "being", "it", "its", "this", "that", "these", "those",
+    "he", "she", "they", "them", "his", "her", "their", "we", "our", "you", "your", "i", "also", "which",
+    "who", "what", "when", "where", "how", "can", "could", "would", "should", "will", "has", "have", "had",
+    "do", "does", "did", "not", "no", "so", "than", "then", "there", "into", "about", "such", "more", "very",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+TIMESTAMP_PATTERN = re.compile(r"(\d{1,3}):([0-5]\d)")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+MARKDOWN_PATTERN = re.compile(r"[*#>`_]+|^\s*[-•]\s+|^\s*\d+\.\s+", re.MULTILINE)
+
+SUPPORTED, BORDERLINE, UNSUPPORTED = "supported", "borderline", "unsupported"
+
+
+def _content_tokens(text: str) -> set:
+    return {token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1}
+
+
+def _start_time(metadata: dict) -> Optional[float]:
+    # Same keys PromptBuilder uses for the (Start: MM:SS) citations shown to the LLM
+    start = metadata.get('start', metadata.get('window_start_time', metadata.get('start_time')))
+    try:
+        return float(start) if start is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class GroundingChecker:
+    """
+    Local claim-level grounding check for generated answers.
+
+    The answer is split into sentence claims, and each claim is scored against the retrieved chunks:
+    - lexical overlap: share of the claim's content words found in the best chunk,
+    - embedding similarity: cosine between the claim and the chunk vectors stored in FAISS
+      (chunks without a stored vector, or rewritten by packing/compression, are embedded once
+      and cached),
+    - citation consistency: cited [MM:SS] timestamps must fall in a retrieved chunk's time window.
+
+    `check` returns "supported" or "unsupported" when the local evidence is clear, and
+    "borderline" when the answer should be escalated to the LLM validator.
+    """
+    def __init__(self, vector_store=None):
+        self.vector_store = vector_store
+        self.embeddings = vector_store.embeddings if vector_store is not None else EmbeddingModel.get_embedding_model()
+        self.chunk_vectors = TTLCache(max_entries=settings.RERANK_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    def split_claims(answer: str) -> List[str]:
+        claims = []
+        for sentence in SENTENCE_PATTERN.split(answer):
+            sentence = MARKDOWN_PATTERN.sub(" ", sentence).strip()
+            # Headings, filler and bare citations carry no checkable claim
+            if len(_content_tokens(TIMESTAMP_PATTERN.sub(" ", sentence))) >= settings.GROUNDING_MIN_CLAIM_TOKENS:
+                claims.append(sentence)
+        return claims
+
+    @staticmethod
+    def _vector_key(doc: Document) -> Optional[str]:
+        """
+        Stored-vector key of a document: its chunk ID while the text is the chunk as indexed.
+        Merged, compressed or trimmed documents (context packing and compression) no longer
+        match the stored vector, so their own text is embedded, cached under a content hash.
+        """
+        metadata = doc.metadata
+        if metadata.get("merged_chunk_ids") or metadata.get("compressed") or metadata.get("trimmed"):
+            return "text:" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
+        return metadata.get("chunk_id")
+
+    def _chunk_vectors(self, documents: List[Document]) -> np.ndarray:
+        keys = [self._vector_key(doc) for doc in documents]
+        vectors: Dict[int, np.ndarray] = {}
+        stored = (
+            self.vector_store.get_vectors([c for c in keys if c and not c.startswith("text:")])
+            if self.vector_store is not None else {}
+        )
+        missing = []
+        for i, key in enumerate(keys):
+            vector = stored.get(key) if key else None
+            if vector is None and key:
+                vector = self.chunk_vectors.get(key)
+            if vector is None:
+                missing.append(i)
+            else:
+                vectors[i] = vector
+        if missing:
+            for i, vector in zip(missing, self.embeddings.embed_documents([documents[i].page_content for i in missing])):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+                if keys[i]:
+                    self.chunk_vectors.set(keys[i], vectors[i])
+        matrix = np.asarray([vectors[i] for i in range(len(documents))], dtype=np.float32)
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    @traceable(name="grounding_check", run_type="tool")
+    def check(self, answer: str, documents: List[Document]) -> dict:
+        """
+        Returns {"verdict", "claims": [{"claim", "lexical", "semantic", "citation_ok", "label"}], "unsupported_ratio"}.
+        """
+        claims = self.split_claims(answer)
+        if not claims or not documents:
+            return {"verdict": SUPPORTED if not claims else UNSUPPORTED, "claims": [], "unsupported_ratio": 0.0}
+
+        chunk_tokens = [_content_tokens(doc.page_content) for doc in documents]
+        chunk_matrix = self._chunk_vectors(documents)
+        claim_matrix = np.asarray(self.embeddings.embed_documents(claims), dtype=np.float32)
+        claim_matrix /= np.maximum(np.linalg.norm(claim_matrix, axis=1, keepdims=True), 1e-12)
+        similarities = claim_matrix @ chunk_matrix.T
+
+        starts = [_start_time(doc.metadata) for doc in documents]
+        window = settings.TIME_WINDOW_SECONDS
+
+        results = []
+        for i, claim in enumerate(claims):
+            tokens = _content_tokens(TIMESTAMP_PATTERN.sub(" ", claim))
+            overlaps = [len(tokens & chunk) / len(tokens) for chunk in chunk_tokens]
+            lexical = max(overlaps)
+            semantic = float(similarities[i].max())
+
+            # A cited time no retrieved chunk covers is a fabricated citation
+            cited = [int(m) * 60 + int(s) for m, s in TIMESTAMP_PATTERN.findall(claim)]
+            citation_ok = all(
+                any(start is not None and start - 1 <= t < start + window for start in starts) for t in cited
+            ) if cited and any(start is not None for start in starts) else True
+
+            if not citation_ok:
+                label = UNSUPPORTED
+            elif lexical >= settings.GROUNDING_LEXICAL_SUPPORT or semantic >= settings.GROUNDING_SEMANTIC_SUPPORT:
+                label = SUPPORTED
+            elif lexical < settings.GROUNDING_LEXICAL_REJECT and semantic < settings.GROUNDING_SEMANTIC_REJECT:
+                label = UNSUPPORTED
+            else:
+                label = BORDERLINE
+            results.append({"claim": claim, "lexical": round(lexical, 3), "semantic": round(semantic, 3),
+                            "citation_ok": citation_ok, "label": label})
+
+        unsupported_ratio = sum(r["label"] == UNSUPPORTED for r in results) / len(results)
+        if unsupported_ratio >= settings.GROUNDING_FAIL_RATIO:
+            verdict = UNSUPPORTED
+        elif all(r["label"] == SUPPORTED for r in results):
+            verdict = SUPPORTED
+        else:
+            verdict = BORDERLINE
+        return {"verdict": verdict, "claims": results, "unsupported_ratio": round(unsupported_ratio, 3)}
@@ -222,7 +222,7 @@ def main():
                     
                 # 4. Compress
                 compressor = st.session_state.components['context_compressor']
-                compressed_docs = compressor.compress(raw_docs)
+                compressed_docs = compressor.compress(raw_docs, rewritten_query)
                 st.write(f"**Context Used:** {len(compressed_docs)} chunks")
 
             # 5. Generate & Stream
@@ -1,6 +1,8 @@
+from bisect import bisect_right
 from typing import List, Dict, Any
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.config.settings import settings
+from app.vectorstore.metadata_store import MetadataStore
 from app.utils.logger import setup_logger
 
 from langsmith import traceable
@@ -34,17 +36,15 @@ class TimeAwareChunker:
         
         # 1. Group by time windows
         current_window_start = 0.0
-        current_window_text = []
         current_window_items = []
         
         for item in transcript_items:
             start = item['start']
-            text = item['text']
             
             if start >= current_window_start + self.window_size:
                 # Process the completed window
                 window_chunks = self._process_window(
-                    current_window_text, 
+                    current_window_items, 
                     current_window_start, 
                     video_id
                 )
@@ -52,16 +52,14 @@ class TimeAwareChunker:
                 
                 # Start new window
                 current_window_start = start
-                current_window_text = [text]
                 current_window_items = [item]
             else:
-                current_window_text.append(text)
                 current_window_items.append(item)
         
         # Process the final pending window
-        if current_window_text:
+        if current_window_items:
              window_chunks = self._process_window(
-                current_window_text, 
+                current_window_items, 
                 current_window_start, 
                 video_id
             )
@@ -70,28 +68,42 @@ class TimeAwareChunker:
         logger.info(f"Created {len(chunks)} chunks for video {video_id}")
         return chunks
 
-    def _process_window(self, text_list: List[str], window_start_time: float, video_id: str) -> List[Dict]:
+    def _process_window(self, items: List[Dict], window_start_time: float, video_id: str) -> List[Dict]:
         """
         Internal method to split text within a timeframe and assign metadata.
         """
-        full_text = " ".join(text_list)
+        full_text = " ".join(item['text'] for item in items)
+        # Character offset of each transcript item in full_text
+        item_offsets = []
+        offset = 0
+        for item in items:
+            item_offsets.append(offset)
+            offset += len(item['text']) + 1
         
         # Split text (Semantic split)
-        # Note: This is an approximation. 
-        # Ideally we would map the split text back to exact timestamps of the words,
-        # but for a RAG chatbot, a "Window Start Time" is often sufficient 
-        # to jump to the general area.
+        # Each chunk's start/end come from the transcript items its first and last characters
+        # fall in; window_start_time stays the grouping key (chunk IDs, summaries).
         
         split_docs = self.text_splitter.create_documents([full_text])
         
         enriched_chunks = []
+        position = 0
         for i, doc in enumerate(split_docs):
+            chunk_offset = full_text.find(doc.page_content, position)
+            if chunk_offset < 0:
+                chunk_offset = position
+            position = chunk_offset + 1
+            first = items[max(bisect_right(item_offsets, chunk_offset) - 1, 0)]
+            last = items[max(bisect_right(item_offsets, chunk_offset + len(doc.page_content) - 1) - 1, 0)]
             chunk_metadata = {
                 "video_id": video_id,
                 "window_start_time": window_start_time, # approximate start
+                "start": first['start'],
+                "end": last['start'] + last.get('duration', 0.0),
                 "chunk_index": i,
                 "text": doc.page_content
             }
+            chunk_metadata["chunk_id"] = MetadataStore.make_chunk_id(doc.page_content, chunk_metadata)
             enriched_chunks.append(chunk_metadata)
             
         return enriched_chunks
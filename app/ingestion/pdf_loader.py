@@ -3,6 +3,7 @@ from typing import List, Dict, Any
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.config.settings import settings
+from app.vectorstore.metadata_store import MetadataStore
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -30,13 +31,15 @@ class PDFProcessor:
             
             chunks = []
             for i, doc in enumerate(docs):
-                chunks.append({
+                chunk = {
                     "text": doc.page_content,
                     "source": filename,
                     "page": doc.metadata.get("page", 0),
                     "chunk_index": i,
                     "type": "pdf" 
-                })
+                }
+                chunk["chunk_id"] = MetadataStore.make_chunk_id(doc.page_content, chunk)
+                chunks.append(chunk)
                 
             logger.info(f"Generated {len(chunks)} chunks from {filename}")
             return chunks
@@ -1,19 +1,63 @@
-from typing import Generator
+from collections import deque
+from typing import Any, AsyncGenerator, Dict, Generator, Tuple
+import asyncio
+import re
 import time
+import numpy as np
 from langchain_core.messages import SystemMessage, HumanMessage
-from app.llm.llm_client import LLMClient
+from app.llm.llm_registry import LLMRegistry
 from app.reasoning.prompt_builder import PromptBuilder
 from app.evaluation.answer_validator import AnswerValidator
+from app.config.settings import settings
 from app.utils.logger import setup_logger
 
 from langsmith import traceable
 
 logger = setup_logger(__name__)
 
-class AnswerGenerator:
+CITATION_PATTERN = re.compile(r'(\[\d{2}:\d{2}\]|\(.*?\d{2,}:\d{2}.*?\))')
+
+class _CitationFormatter:
+    """
+    Incremental version of AnswerGenerator._format_response for streamed tokens.
+    Holds back an unclosed '[' / '(' (a citation may be split across tokens) until it closes.
+    """
+    MAX_HOLD = 64
+
     def __init__(self):
-        self.llm = LLMClient().get_model()
-        self.validator = AnswerValidator()
+        self.buffer = ""
+
+    def feed(self, text: str) -> str:
+        self.buffer += text
+        cut = max(self.buffer.rfind("["), self.buffer.rfind("("))
+        if cut == -1 or self.buffer.find("]" if self.buffer[cut] == "[" else ")", cut) != -1 \
+                or len(self.buffer) - cut > self.MAX_HOLD:
+            cut = len(self.buffer)
+        ready, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return AnswerGenerator._format_response(ready) if ready else ""
+
+    def flush(self) -> str:
+        ready, self.buffer = self.buffer, ""
+        return AnswerGenerator._format_response(ready) if ready else ""
+
+
+class AnswerGenerator:
+    NO_CONTEXT_MESSAGE = "No relevant context found in this video."
+    VALIDATION_FAILED_MESSAGE = "This information is not clearly present in the video (derived from strict validation)."
+    ERROR_MESSAGE = "An error occurred while generating the answer."
+    FALLBACK_MESSAGES = (NO_CONTEXT_MESSAGE, VALIDATION_FAILED_MESSAGE, ERROR_MESSAGE)
+    # Appended in live streaming mode when the already-streamed answer fails validation
+    VALIDATION_WARNING_MESSAGE = (
+        "\n\n**Warning:** parts of this answer could not be verified against the video "
+        "(strict validation failed). Please double-check the cited timestamps."
+    )
+
+    def __init__(self, vector_store=None):
+        self.llm = LLMRegistry.get_instance().get_model(call_type="generate")
+        self.validator = AnswerValidator(vector_store)
+        self.ttft_ms: Dict[str, deque] = {}
+        self.packing_totals = {"answers": 0, "tokens_before": 0, "tokens_after": 0,
+                               "duplicates_dropped": 0, "merged": 0, "trimmed": 0}
 
     @traceable(name="generate_answer", run_type="chain")
     def generate_answer(self, query: str, documents: list) -> Generator[str, None, None]:
@@ -37,16 +81,10 @@ class AnswerGenerator:
         Given the strict "Reject answer" instruction, Option B is safer.
         """
         if not documents:
-            yield "No relevant context found in this video."
+            yield self.NO_CONTEXT_MESSAGE
             return
 
-        context_str = PromptBuilder.build_context_string(documents)
-        system_msg = PromptBuilder.build_system_message()
-        
-        messages = [
-            SystemMessage(content=system_msg),
-            HumanMessage(content=f"Context:\n{context_str}\n\nQuestion: {query}")
-        ]
+        context_str, messages, documents = self._build_messages(query, documents)
         
         logger.info("Generating answer...")
         full_response = ""
@@ -54,38 +92,18 @@ class AnswerGenerator:
         try:
             # We generate fully first to validate
             response_msg = self.llm.invoke(messages)
-            full_response = response_msg.content
-            
-            # Post-Processing: Formatting
-            # User wants new line from one timestamp to another
-            # Pattern: [MM:SS] or (Start: MM:SS)
-            # We want to ensure there is a \n\n before/after citations if they mark section ends.
-            # Brute force: Replace "] " with "]\n\n" if it's likely a sentence end.
-            # Or better: Just replace all [MM:SS] with [MM:SS]\n\n if followed by text.
-            
-            # Simple fix: Replace any occurrence of timestamp citation with itself + double newline
-            # But only if it's the end of a thought? 
-            # User said "start from new line after content from one time stamp gets end".
-            # Usually the model puts citation at the end of the sentence.
-            # So [MM:SS].\n\n
-            
-            import re
-            # Add double newline after citations.
-            # Matches: [12:34], (Start: 12:34), (Chunk 1, Start: 12:34)
-            # Regex explanation:
-            # (\[\d{2}:\d{2}\]|\(.*?Start: \d{2,}:\d{2}.*?\))
-            # Catch standard [MM:SS] OR (...) containing "Start: MM:SS"
-            
-            full_response = re.sub(r'(\[\d{2}:\d{2}\]|\(.*?\d{2,}:\d{2}.*?\))', r'\1\n\n', full_response)
-            # Remove triple newlines if any created
-            full_response = full_response.replace("\n\n\n", "\n\n")
+            full_response = self._format_response(response_msg.content)
             
-            # Validation
-            is_valid = self.validator.validate(query, full_response, context_str)
+            # Validation (precomputed summaries are already LLM-derived from the whole video,
+            # so overview answers skip the second call)
+            if self._skip_validation(documents):
+                is_valid = True
+            else:
+                is_valid = self.validator.validate(query, full_response, context_str, documents)
             
             if not is_valid:
                 logger.warning("Answer validation failed.")
-                yield "This information is not clearly present in the video (derived from strict validation)."
+                yield self.VALIDATION_FAILED_MESSAGE
             else:
                 # Mock streaming the trusted response
                 # (Since we have the full text, we can yield words)
@@ -95,11 +113,202 @@ class AnswerGenerator:
                 for word in words:
                     yield word + " "
                     # Dynamic delay: punctuations take longer to "type"
-                    if word.endswith(('.', '?', '!')):
-                         time.sleep(0.015)
-                    else:
-                         time.sleep(0.005)
+                    time.sleep(self._typing_delay(word))
                     
         except Exception as e:
             logger.error(f"Error generating answer: {e}")
-            yield "An error occurred while generating the answer."
+            yield self.ERROR_MESSAGE
+
+    @traceable(name="generate_answer_async", run_type="chain")
+    async def agenerate_answer(self, query: str, documents: list, mode: str = None,
+                               model_name: str = None) -> AsyncGenerator[str, None]:
+        """
+        Async answer stream as plain text for the event loop.
+
+        mode (default STREAMING_MODE):
+        - "live": tokens are forwarded as the LLM produces them (`astream_answer`); if validation
+          fails afterwards, a warning is appended instead of the answer being withheld.
+        - "buffered": the previous behaviour: generate, validate, then type out the trusted answer.
+        model_name routes generation through the LLM registry (e.g. ChatRequest.model_name).
+        """
+        mode = mode or settings.STREAMING_MODE
+        if mode == "live":
+            # astream_answer records its own time to first token
+            async for chunk in self._live_text(query, documents, model_name):
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        first = True
+        async for chunk in self._agenerate_buffered(query, documents, model_name):
+            if first:
+                self._record_ttft(mode, start)
+                first = False
+            yield chunk
+
+    def _record_ttft(self, mode: str, start: float):
+        self.ttft_ms.setdefault(mode, deque(maxlen=1000)).append((time.perf_counter() - start) * 1000)
+
+    async def _live_text(self, query: str, documents: list, model_name: str = None) -> AsyncGenerator[str, None]:
+        async for event, data in self.astream_answer(query, documents, model_name):
+            if event == "token":
+                yield data
+            elif event == "error":
+                yield "\n\n" + data
+            elif event == "validation" and not data:
+                yield self.VALIDATION_WARNING_MESSAGE
+
+    async def astream_answer(self, query: str, documents: list, model_name: str = None) -> AsyncGenerator[Tuple[str, Any], None]:
+        """
+        Real token streaming. Yields ("token", text) events as the LLM produces them, then exactly
+        one ("validation", passed) event, or ("error", message) if generation fails mid-stream.
+
+        Validation needs the whole answer, so it starts as a task the moment the LLM stream ends
+        and runs while the held-back tail is sent and the client renders the text; a failed
+        check becomes a late retraction warning. Time to first token is recorded as "live".
+        """
+        start = time.perf_counter()
+        if not documents:
+            self._record_ttft("live", start)
+            yield "token", self.NO_CONTEXT_MESSAGE
+            yield "validation", True
+            return
+
+        context_str, messages, documents = await asyncio.to_thread(self._build_messages, query, documents, model_name)
+
+        logger.info("Streaming answer...")
+        formatter = _CitationFormatter()
+        full_response, first = "", True
+        try:
+            async for message_chunk in self._llm(model_name).astream(messages):
+                text = formatter.feed(message_chunk.content)
+                if text:
+                    if first:
+                        self._record_ttft("live", start)
+                        first = False
+                    full_response += text
+                    yield "token", text
+            tail = formatter.flush()
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            yield "error", self.ERROR_MESSAGE
+            return
+
+        full_response += tail
+        validation = None
+        if not self._skip_validation(documents):
+            validation = asyncio.ensure_future(self.validator.avalidate(query, full_response, context_str, documents))
+        try:
+            if tail:
+                if first:
+                    self._record_ttft("live", start)
+                yield "token", tail
+            is_valid = await validation if validation is not None else True
+        finally:
+            # The client went away before the verdict: nobody is waiting for it
+            if validation is not None and not validation.done():
+                validation.cancel()
+        if not is_valid:
+            logger.warning("Answer validation failed after streaming; sending retraction warning.")
+        yield "validation", is_valid
+
+    async def _agenerate_buffered(self, query: str, documents: list, model_name: str = None) -> AsyncGenerator[str, None]:
+        if not documents:
+            yield self.NO_CONTEXT_MESSAGE
+            return
+
+        context_str, messages, documents = await asyncio.to_thread(self._build_messages, query, documents, model_name)
+
+        logger.info("Generating answer...")
+        try:
+            response_msg = await self._llm(model_name).ainvoke(messages)
+            full_response = self._format_response(response_msg.content)
+
+            if self._skip_validation(documents):
+                is_valid = True
+            else:
+                is_valid = await self.validator.avalidate(query, full_response, context_str, documents)
+
+            if not is_valid:
+                logger.warning("Answer validation failed.")
+                yield self.VALIDATION_FAILED_MESSAGE
+            else:
+                for word in full_response.split(" "):
+                    yield word + " "
+                    await asyncio.sleep(self._typing_delay(word))
+
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}")
+            yield self.ERROR_MESSAGE
+
+    def _llm(self, model_name: str = None):
+        return self.llm.bind(model_name=model_name) if model_name else self.llm
+
+    @classmethod
+    def is_cacheable(cls, answer: str) -> bool:
+        """Fallbacks, answers cut short by an error and answers that failed validation must not be reused."""
+        return not any(message in answer for message in cls.FALLBACK_MESSAGES + (cls.VALIDATION_WARNING_MESSAGE,))
+
+    def stats(self) -> dict:
+        """Time to first token per streaming mode over the most recent answers, and context packing totals."""
+        ttft = {}
+        for mode, samples in self.ttft_ms.items():
+            if samples:
+                p50, p95 = np.percentile(list(samples), [50, 95])
+                ttft[mode] = {"count": len(samples), "ttft_p50_ms": round(float(p50), 2), "ttft_p95_ms": round(float(p95), 2)}
+        packing = dict(self.packing_totals)
+        packing["context_tokens_saved"] = packing["tokens_before"] - packing["tokens_after"]
+        return {"ttft": ttft, "context_packing": packing}
+
+    def _build_messages(self, query: str, documents: list, model_name: str = None) -> Tuple[str, list, list]:
+        """
+        Returns (context string, messages, documents in the prompt). With CONTEXT_PACKING_ENABLED
+        the documents are packed into the model's context token budget first.
+        """
+        if settings.CONTEXT_PACKING_ENABLED:
+            budget = PromptBuilder.token_budget(LLMRegistry.get_instance().resolve(model_name)[1])
+            documents, report = PromptBuilder.pack_documents(documents, budget)
+            self.packing_totals["answers"] += 1
+            for key in ("tokens_before", "tokens_after", "duplicates_dropped", "merged", "trimmed"):
+                self.packing_totals[key] += report[key]
+        context_str = PromptBuilder.build_context_string(documents)
+        system_msg = PromptBuilder.build_system_message()
+        
+        messages = [
+            SystemMessage(content=system_msg),
+            HumanMessage(content=f"Context:\n{context_str}\n\nQuestion: {query}")
+        ]
+        return context_str, messages, documents
+
+    @staticmethod
+    def _skip_validation(documents: list) -> bool:
+        return all(getattr(doc, "metadata", {}).get("type") == "summary" for doc in documents)
+
+    @staticmethod
+    def _typing_delay(word: str) -> float:
+        return 0.015 if word.endswith(('.', '?', '!')) else 0.005
+
+    @staticmethod
+    def _format_response(full_response: str) -> str:
+        # Post-Processing: Formatting
+        # User wants new line from one timestamp to another
+        # Pattern: [MM:SS] or (Start: MM:SS)
+        # We want to ensure there is a \n\n before/after citations if they mark section ends.
+        # Brute force: Replace "] " with "]\n\n" if it's likely a sentence end.
+        # Or better: Just replace all [MM:SS] with [MM:SS]\n\n if followed by text.
+        
+        # Simple fix: Replace any occurrence of timestamp citation with itself + double newline
+        # But only if it's the end of a thought? 
+        # User said "start from new line after content from one time stamp gets end".
+        # Usually the model puts citation at the end of the sentence.
+        # So [MM:SS].\n\n
+        
+        # Add double newline after citations.
+        # Matches: [12:34], (Start: 12:34), (Chunk 1, Start: 12:34)
+        # Regex explanation:
+        # (\[\d{2}:\d{2}\]|\(.*?Start: \d{2,}:\d{2}.*?\))
+        # Catch standard [MM:SS] OR (...) containing "Start: MM:SS"
+        
+        full_response = CITATION_PATTERN.sub(r'\1\n\n', full_response)
+        # Remove triple newlines if any created
+        return full_response.replace("\n\n\n", "\n\n")
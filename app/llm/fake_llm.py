@@ -0,0 +1,119 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.config.settings import settings
+
+TOKEN_PATTERN = re.compile(r"\S+\s*")
+
+
+class FakeLLMError(RuntimeError):
+    """Injected provider failure (FAKE_LLM_ERROR_RATE)."""
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for load tests and benchmarks: no network, no API key.
+
+    - latency: `ttft` seconds before the first token, then `tokens_per_second`,
+    - output: the first `script` rule whose regex matches the prompt; without a match, "YES"
+      for validation prompts and otherwise the opening words of the prompt's context (so
+      answers stay grounded and keep their citations),
+    - errors: each call fails with FakeLLMError with probability `error_rate`, drawn from a
+      seeded generator so runs are reproducible.
+    """
+    model_name: str = "fake"
+    temperature: float = 0.0
+    ttft: float = 0.3
+    tokens_per_second: float = 100.0
+    output_tokens: int = 120
+    error_rate: float = 0.0
+    seed: int = 0
+    script: List[dict] = []
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _random: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, model_name: str = "fake") -> "FakeChatModel":
+        script = []
+        if settings.FAKE_LLM_SCRIPT:
+            with open(settings.FAKE_LLM_SCRIPT, "r", encoding="utf-8") as f:
+                script = json.load(f)
+        return cls(model_name=model_name, ttft=settings.FAKE_LLM_TTFT_MS / 1000,
+                   tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+                   output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS, error_rate=settings.FAKE_LLM_ERROR_RATE,
+                   seed=settings.FAKE_LLM_SEED, script=script)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _response(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        for rule in self.script:
+            if re.search(rule.get("match", ""), prompt):
+                return rule["response"]
+        if "Respond with YES or NO" in prompt:
+            return "YES"
+        context = prompt.split("Context:", 1)[-1]
+        return "".join(TOKEN_PATTERN.findall(context)[:self.output_tokens]).strip()
+
+    def _fails(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        if self._fails():
+            raise FakeLLMError(f"Injected failure from {self.model_name}")
+        return TOKEN_PATTERN.findall(self._response(messages)) or [""]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.ttft)
+        tokens = self._tokens(messages)
+        time.sleep(max(len(tokens) - 1, 0) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.ttft)
+        tokens = self._tokens(messages)
+        await asyncio.sleep(max(len(tokens) - 1, 0) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.ttft)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -1,14 +1,22 @@
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.language_models.chat_models import BaseChatModel
+from app.llm.fake_llm import FakeChatModel
 from app.config.settings import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 class LLMClient:
-    def __init__(self, provider: str = None):
+    """
+    Builds one raw provider chat model. Components do not use this directly: they share the
+    pooled, routed clients of `LLMRegistry`.
+    """
+    DEFAULT_MODELS = {"groq": settings.GROQ_MODEL, "gemini": settings.GEMINI_MODEL, "fake": "fake"}
+
+    def __init__(self, provider: str = None, model_name: str = None):
         self.provider = provider or settings.LLM_PROVIDER
+        self.model_name = model_name or self.DEFAULT_MODELS.get(self.provider)
         self.model = self._initialize_model()
 
     def _initialize_model(self) -> BaseChatModel:
@@ -16,10 +24,10 @@ class LLMClient:
             if not settings.GROQ_API_KEY:
                 logger.error("GROQ_API_KEY not found.")
                 raise ValueError("GROQ_API_KEY not found.")
-            logger.info(f"Initializing Groq model: {settings.GROQ_MODEL}")
+            logger.info(f"Initializing Groq model: {self.model_name}")
             return ChatGroq(
                 groq_api_key=settings.GROQ_API_KEY,
-                model_name=settings.GROQ_MODEL,
+                model_name=self.model_name,
                 temperature=0.1,
                 # model_kwargs={"presence_penalty": 0.6} # Removed as it causes stuttering in Llama 3.1
             )
@@ -27,12 +35,16 @@ class LLMClient:
             if not settings.GOOGLE_API_KEY:
                 logger.error("GOOGLE_API_KEY not found.")
                 raise ValueError("GOOGLE_API_KEY not found.")
-            logger.info(f"Initializing Gemini model: {settings.GEMINI_MODEL}")
+            logger.info(f"Initializing Gemini model: {self.model_name}")
             return ChatGoogleGenerativeAI(
                 google_api_key=settings.GOOGLE_API_KEY,
-                model=settings.GEMINI_MODEL,
+                model=self.model_name,
                 temperature=0.0
             )
+        elif self.provider == "fake":
+            # Offline load testing: no network, latency and failures from the FAKE_LLM_* settings
+            logger.info(f"Initializing fake model: {self.model_name}")
+            return FakeChatModel.from_settings(self.model_name)
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
 
@@ -0,0 +1,602 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.llm.llm_client import LLMClient
+from app.llm.response_cache import LLMResponseCache
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class LLMCallCounter:
+    """Provider calls (response cache hits excluded) made by the code running under `count_llm_calls`."""
+    def __init__(self):
+        self.calls = 0
+
+
+_call_counter: contextvars.ContextVar = contextvars.ContextVar("llm_call_counter", default=None)
+
+
+def count_llm_calls() -> LLMCallCounter:
+    """
+    Starts counting the LLM calls made from the current context from here on. Tasks and
+    `asyncio.to_thread` calls started from it copy the context, so they share the counter.
+    """
+    counter = LLMCallCounter()
+    _call_counter.set(counter)
+    return counter
+
+
+def _record_llm_call():
+    counter = _call_counter.get()
+    if counter is not None:
+        counter.calls += 1
+
+
+class CircuitOpenError(RuntimeError):
+    """The route's circuit is open, or its single half-open trial call is already in flight."""
+
+
+class UnknownModelError(ValueError):
+    """A model name that is not among the configured providers and LLM_ALLOWED_MODELS."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. After `reset_timeout` seconds
+    exactly one trial call is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def available(self) -> bool:
+        """Whether a call could be let through now (routing hint; `acquire` decides)."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def acquire(self) -> bool:
+        """
+        Atomically claims the right to call: always when closed; when half-open only for the
+        first caller, whose call becomes the trial. Every successful acquire must end in
+        record_success, record_failure or release.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures, self.opened_at, self.trial_in_flight = 0, None, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """A call that was abandoned (lost a hedge race) says nothing about the provider's health."""
+        with self._lock:
+            self.trial_in_flight = False
+
+
+class LLMRoute:
+    """One pooled provider client (shared HTTP connection pool) with its health and latency."""
+    def __init__(self, provider: str, model_name: str, client: BaseChatModel):
+        self.provider = provider
+        self.model_name = model_name
+        self.client = client
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET)
+        # Per call type: a long generation and a one-line rewrite need different hedge delays
+        self.latencies: Dict[str, deque] = {}  # full responses, seconds
+        self.ttfts: Dict[str, deque] = {}      # first streamed token, seconds
+        self.calls = 0
+        self.failures = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model_name}"
+
+    def record_latency(self, call_type: str, seconds: float, streaming_first_token: bool = False):
+        samples = self.ttfts if streaming_first_token else self.latencies
+        samples.setdefault(call_type, deque(maxlen=500)).append(seconds)
+
+    def hedge_delay(self, call_type: str = "default", streaming: bool = False) -> float:
+        """p95 of this route's recent latency for the call type (TTFT for streams), once there are enough samples."""
+        samples = (self.ttfts if streaming else self.latencies).get(call_type, ())
+        if len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return float(np.percentile(list(samples), 95))
+
+    def stats(self) -> dict:
+        def pct(by_type):
+            stats = {}
+            for call_type, samples in by_type.items():
+                if samples:
+                    p50, p95 = np.percentile(list(samples), [50, 95])
+                    stats[call_type] = {"p50_ms": round(float(p50) * 1000, 1), "p95_ms": round(float(p95) * 1000, 1)}
+            return stats
+        return {"calls": self.calls, "failures": self.failures, "circuit": self.breaker.state,
+                "latency": pct(self.latencies), "ttft": pct(self.ttfts)}
+
+
+class LLMRegistry:
+    """
+    Process-wide registry of LLM clients: one pooled client per (provider, model), shared by
+    every component. Requests are routed by model name; the configured fallback providers
+    back up the primary route:
+    - hedging: if the primary has not answered (or streamed its first token) within its p95
+      latency for that call type, one duplicate request goes to the next healthy route and
+      the first answer wins,
+    - failover: a failed call is retried on the next route,
+    - circuit breaker: routes that keep failing are skipped until their reset timeout passes.
+    Deterministic calls are answered from the exact-match `LLMResponseCache` when possible.
+
+    Only configured models can be routed to (LLM_PROVIDER, LLM_FALLBACK_PROVIDERS and
+    LLM_ALLOWED_MODELS), so client-supplied model names cannot create new clients.
+    """
+    _instance = None
+    # Names the API used to send for "the default model"
+    DEFAULT_ALIASES = ("groq-llama3", "llama3", "default")
+
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], Optional[LLMRoute]] = {}
+        self._lock = threading.Lock()
+        # Sync hedged calls need a second thread; async ones use tasks
+        self.executor = ThreadPoolExecutor(max_workers=settings.LLM_WORKERS, thread_name_prefix="llm")
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.response_cache = LLMResponseCache() if settings.LLM_CACHE_ENABLED else None
+
+    @classmethod
+    def get_instance(cls) -> "LLMRegistry":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def get_model(self, model_name: str = None, call_type: str = "default") -> "RoutedChatModel":
+        """
+        Chat model (full Runnable interface) routed through the registry. A per-call route can
+        be chosen with `.bind(model_name=...)`. call_type selects the response cache TTL, the
+        latency samples its hedge delay is computed from, and the bucket its stats go to.
+        """
+        return RoutedChatModel(registry=self, default_model=model_name, call_type=call_type)
+
+    @staticmethod
+    def allowed_models() -> List[Tuple[str, str]]:
+        """(provider, model) pairs that can be routed to: each configured provider's default model, plus LLM_ALLOWED_MODELS."""
+        allowed = []
+        for provider in [settings.LLM_PROVIDER] + settings.LLM_FALLBACK_PROVIDERS:
+            key = (provider, LLMClient.DEFAULT_MODELS.get(provider))
+            if key[1] is not None and key not in allowed:
+                allowed.append(key)
+        for name in settings.LLM_ALLOWED_MODELS:
+            key = tuple(name.split(":", 1))
+            if len(key) == 2 and key not in allowed:
+                allowed.append(key)
+        return allowed
+
+    def resolve(self, model_name: str = None) -> Tuple[str, str]:
+        """
+        "provider:model" or a provider name (its default model). None and the legacy default
+        names (e.g. "groq-llama3") mean LLM_PROVIDER. Raises UnknownModelError for anything
+        that is not an allowed model.
+        """
+        if not model_name or model_name in self.DEFAULT_ALIASES:
+            return settings.LLM_PROVIDER, LLMClient.DEFAULT_MODELS.get(settings.LLM_PROVIDER)
+        if ":" in model_name:
+            key = tuple(model_name.split(":", 1))
+        else:
+            key = (model_name, LLMClient.DEFAULT_MODELS.get(model_name))
+        if key not in self.allowed_models():
+            raise UnknownModelError(f"Unknown model '{model_name}'.")
+        return key
+
+    def _route(self, provider: str, model_name: str) -> Optional[LLMRoute]:
+        key = (provider, model_name)
+        with self._lock:
+            if key not in self._routes:
+                try:
+                    self._routes[key] = LLMRoute(provider, model_name, LLMClient(provider, model_name).get_model())
+                except Exception as e:
+                    # e.g. no API key for a fallback provider: the route is simply unavailable
+                    logger.warning(f"LLM route {provider}:{model_name} unavailable: {e}")
+                    self._routes[key] = None
+            return self._routes[key]
+
+    def routes_for(self, model_name: str = None) -> List[LLMRoute]:
+        primary = self.resolve(model_name)
+        keys = [primary]
+        for provider in settings.LLM_FALLBACK_PROVIDERS:
+            key = self.resolve(provider)
+            if key not in keys:
+                keys.append(key)
+        routes = [route for route in (self._route(*key) for key in keys) if route is not None]
+        if not routes:
+            raise RuntimeError(f"No LLM provider configured for '{model_name}'.")
+        return routes
+
+    @staticmethod
+    def _available(routes: List[LLMRoute]) -> List[LLMRoute]:
+        available = [route for route in routes if route.breaker.available()]
+        if not available:
+            raise CircuitOpenError("All LLM providers are unavailable (circuits open).")
+        return available
+
+    @staticmethod
+    def _acquire(route: LLMRoute):
+        if not route.breaker.acquire():
+            raise CircuitOpenError(f"Circuit of {route.name} is open.")
+        route.calls += 1
+
+    @staticmethod
+    def _failed(route: LLMRoute):
+        route.failures += 1
+        route.breaker.record_failure()
+
+    # --- calls ---
+
+    def _call(self, route: LLMRoute, messages: List[BaseMessage], call_type: str, **kwargs) -> BaseMessage:
+        self._acquire(route)
+        start = time.perf_counter()
+        try:
+            message = route.client.invoke(messages, **kwargs)
+        except Exception:
+            self._failed(route)
+            raise
+        route.record_latency(call_type, time.perf_counter() - start)
+        route.breaker.record_success()
+        return message
+
+    async def _acall(self, route: LLMRoute, messages: List[BaseMessage], call_type: str, **kwargs) -> BaseMessage:
+        self._acquire(route)
+        start = time.perf_counter()
+        try:
+            message = await route.client.ainvoke(messages, **kwargs)
+        except asyncio.CancelledError:
+            route.breaker.release()
+            raise
+        except Exception:
+            self._failed(route)
+            raise
+        route.record_latency(call_type, time.perf_counter() - start)
+        route.breaker.record_success()
+        return message
+
+    def _hedge_delay(self, routes: List[LLMRoute], call_type: str, hedged: bool, streaming: bool = False) -> Optional[float]:
+        if not settings.LLM_HEDGING_ENABLED or hedged or len(routes) < 2:
+            return None
+        return routes[0].hedge_delay(call_type, streaming=streaming)
+
+    def invoke(self, routes: List[LLMRoute], messages: List[BaseMessage], call_type: str = "default", **kwargs) -> BaseMessage:
+        routes = self._available(routes)
+        backups = iter(routes[1:])
+        pending = {self.executor.submit(self._call, routes[0], messages, call_type, **kwargs): routes[0]}
+        hedged, last_error = False, None
+        while pending:
+            hedge_delay = self._hedge_delay(routes, call_type, hedged)
+            done, _ = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                backup = next(backups, None)
+                if backup is not None:
+                    self.hedges += 1
+                    logger.info(f"{routes[0].name} slower than {hedge_delay:.2f}s ({call_type}); hedging to {backup.name}")
+                    pending[self.executor.submit(self._call, backup, messages, call_type, **kwargs)] = backup
+                continue
+            for future in done:
+                route = pending.pop(future)
+                if future.exception() is None:
+                    # Losers keep running in their threads; their results are discarded
+                    if route is not routes[0]:
+                        self.hedge_wins += 1
+                    return future.result()
+                last_error = future.exception()
+                logger.warning(f"LLM call to {route.name} failed: {last_error}")
+            if not pending:
+                backup = next(backups, None)
+                if backup is not None:
+                    self.failovers += 1
+                    pending[self.executor.submit(self._call, backup, messages, call_type, **kwargs)] = backup
+        raise last_error
+
+    async def ainvoke(self, routes: List[LLMRoute], messages: List[BaseMessage], call_type: str = "default", **kwargs) -> BaseMessage:
+        routes = self._available(routes)
+        backups = iter(routes[1:])
+        pending = {asyncio.ensure_future(self._acall(routes[0], messages, call_type, **kwargs)): routes[0]}
+        hedged, last_error = False, None
+        try:
+            while pending:
+                hedge_delay = self._hedge_delay(routes, call_type, hedged)
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    backup = next(backups, None)
+                    if backup is not None:
+                        self.hedges += 1
+                        logger.info(f"{routes[0].name} slower than {hedge_delay:.2f}s ({call_type}); hedging to {backup.name}")
+                        pending[asyncio.ensure_future(self._acall(backup, messages, call_type, **kwargs))] = backup
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        if route is not routes[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"LLM call to {route.name} failed: {last_error}")
+                if not pending:
+                    backup = next(backups, None)
+                    if backup is not None:
+                        self.failovers += 1
+                        pending[asyncio.ensure_future(self._acall(backup, messages, call_type, **kwargs))] = backup
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, routes: List[LLMRoute], messages: List[BaseMessage], call_type: str = "default", **kwargs) -> Iterator[BaseMessage]:
+        """Sync streaming fails over before the first token (no hedging: it would need a thread per stream)."""
+        last_error = None
+        for i, route in enumerate(self._available(routes)):
+            if i:
+                self.failovers += 1
+            try:
+                self._acquire(route)
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            start = time.perf_counter()
+            try:
+                iterator = iter(route.client.stream(messages, **kwargs))
+                first = next(iterator)
+            except StopIteration:
+                route.breaker.record_success()
+                return
+            except Exception as e:
+                self._failed(route)
+                last_error = e
+                logger.warning(f"LLM stream from {route.name} failed: {e}")
+                continue
+            route.record_latency(call_type, time.perf_counter() - start, streaming_first_token=True)
+            yield from self._finish_stream(route, first, iterator, start, call_type)
+            return
+        raise last_error
+
+    def _finish_stream(self, route: LLMRoute, first, iterator, start: float, call_type: str) -> Iterator[BaseMessage]:
+        try:
+            yield first
+            yield from iterator
+        except Exception:
+            # Tokens already went out: mid-stream errors cannot fail over
+            self._failed(route)
+            raise
+        except GeneratorExit:
+            # The consumer stopped reading: nothing learned about the provider
+            route.breaker.release()
+            raise
+        route.record_latency(call_type, time.perf_counter() - start)
+        route.breaker.record_success()
+
+    @staticmethod
+    async def _aclose(iterator):
+        """Closes an abandoned provider stream, so its HTTP response is released instead of left open."""
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is None:
+            return
+        try:
+            await aclose()
+        except Exception as e:
+            logger.debug(f"Closing an abandoned LLM stream failed: {e}")
+
+    async def _afirst_chunk(self, route: LLMRoute, messages: List[BaseMessage], call_type: str, **kwargs):
+        self._acquire(route)
+        start = time.perf_counter()
+        iterator = route.client.astream(messages, **kwargs).__aiter__()
+        try:
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except asyncio.CancelledError:
+            route.breaker.release()
+            await self._aclose(iterator)
+            raise
+        except Exception:
+            self._failed(route)
+            raise
+        route.record_latency(call_type, time.perf_counter() - start, streaming_first_token=True)
+        return iterator, first, start
+
+    async def astream(self, routes: List[LLMRoute], messages: List[BaseMessage], call_type: str = "default", **kwargs) -> AsyncIterator[BaseMessage]:
+        """
+        Async streaming, hedged on time to first token: if the primary has not produced a token
+        within its p95 TTFT for the call type, a second stream is started and whichever speaks
+        first is kept.
+        """
+        routes = self._available(routes)
+        backups = iter(routes[1:])
+        pending = {asyncio.ensure_future(self._afirst_chunk(routes[0], messages, call_type, **kwargs)): routes[0]}
+        hedged, last_error, winner = False, None, None
+        try:
+            while pending and winner is None:
+                hedge_delay = self._hedge_delay(routes, call_type, hedged, streaming=True)
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    backup = next(backups, None)
+                    if backup is not None:
+                        self.hedges += 1
+                        logger.info(f"{routes[0].name} first token slower than {hedge_delay:.2f}s ({call_type}); hedging to {backup.name}")
+                        pending[asyncio.ensure_future(self._afirst_chunk(backup, messages, call_type, **kwargs))] = backup
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None and winner is None:
+                        winner = route, task.result()
+                        if route is not routes[0]:
+                            self.hedge_wins += 1
+                    elif task.exception() is None:
+                        # Both streams spoke in the same tick: the loser is dropped
+                        route.breaker.release()
+                        await self._aclose(task.result()[0])
+                    else:
+                        last_error = task.exception()
+                        logger.warning(f"LLM stream from {route.name} failed: {last_error}")
+                if winner is None and not pending:
+                    backup = next(backups, None)
+                    if backup is not None:
+                        self.failovers += 1
+                        pending[asyncio.ensure_future(self._afirst_chunk(backup, messages, call_type, **kwargs))] = backup
+        finally:
+            for task, route in pending.items():
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    # Finished after the winner was picked: nothing left to cancel, close its stream
+                    route.breaker.release()
+                    await self._aclose(task.result()[0])
+                else:
+                    task.cancel()
+        if winner is None:
+            raise last_error
+
+        route, (iterator, first, start) = winner
+        if first is None:
+            route.breaker.record_success()
+            return
+        try:
+            yield first
+            async for chunk in iterator:
+                yield chunk
+        except Exception:
+            self._failed(route)
+            raise
+        except (GeneratorExit, asyncio.CancelledError):
+            route.breaker.release()
+            await self._aclose(iterator)
+            raise
+        route.record_latency(call_type, time.perf_counter() - start)
+        route.breaker.record_success()
+
+    def stats(self) -> dict:
+        return {
+            "routes": {route.name: route.stats() for route in self._routes.values() if route is not None},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "response_cache": self.response_cache.stats() if self.response_cache is not None else None,
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Chat model facade over `LLMRegistry`: components use it like any LangChain chat model
+    (prompt | llm, invoke/ainvoke/stream/astream/batch) and the registry picks the client.
+    """
+    registry: Any
+    default_model: Optional[str] = None
+    call_type: str = "default"
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    def _prepare(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> Tuple[List[LLMRoute], str, Optional[str]]:
+        """Pops the routing options from kwargs; returns (routes, call type, response cache key or None)."""
+        routes = self.registry.routes_for(kwargs.pop("model_name", None) or self.default_model)
+        call_type = kwargs.pop("call_type", None) or self.call_type
+        cache = self.registry.response_cache
+        key = cache.make_key(call_type, routes[0], messages, dict(kwargs, stop=stop)) if cache is not None else None
+        return routes, call_type, key
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        routes, call_type, key = self._prepare(messages, stop, kwargs)
+        cached = self.registry.response_cache.get(call_type, key) if key else None
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=cached))])
+        _record_llm_call()
+        message = self.registry.invoke(routes, messages, call_type=call_type, stop=stop, **kwargs)
+        if key:
+            self.registry.response_cache.set(call_type, key, message.content)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs) -> ChatResult:
+        routes, call_type, key = self._prepare(messages, stop, kwargs)
+        # Cache stores may do network or disk I/O: keep them off the event loop
+        cached = await asyncio.to_thread(self.registry.response_cache.get, call_type, key) if key else None
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=cached))])
+        _record_llm_call()
+        message = await self.registry.ainvoke(routes, messages, call_type=call_type, stop=stop, **kwargs)
+        if key:
+            await asyncio.to_thread(self.registry.response_cache.set, call_type, key, message.content)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        routes, call_type, key = self._prepare(messages, stop, kwargs)
+        cached = self.registry.response_cache.get(call_type, key) if key else None
+        if cached is None:
+            _record_llm_call()
+        chunks = iter([AIMessageChunk(content=cached)]) if cached is not None else \
+            self.registry.stream(routes, messages, call_type=call_type, stop=stop, **kwargs)
+        content = ""
+        for chunk in chunks:
+            content += chunk.content
+            generation = ChatGenerationChunk(message=AIMessageChunk(content=chunk.content))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+        # Only a stream that ran to completion is stored
+        if key and cached is None:
+            self.registry.response_cache.set(call_type, key, content)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        routes, call_type, key = self._prepare(messages, stop, kwargs)
+        cached = await asyncio.to_thread(self.registry.response_cache.get, call_type, key) if key else None
+        if cached is not None:
+            generation = ChatGenerationChunk(message=AIMessageChunk(content=cached))
+            if run_manager:
+                await run_manager.on_llm_new_token(cached, chunk=generation)
+            yield generation
+            return
+        _record_llm_call()
+        content = ""
+        async for chunk in self.registry.astream(routes, messages, call_type=call_type, stop=stop, **kwargs):
+            content += chunk.content
+            generation = ChatGenerationChunk(message=AIMessageChunk(content=chunk.content))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+        if key:
+            await asyncio.to_thread(self.registry.response_cache.set, call_type, key, content)
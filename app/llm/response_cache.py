@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class _DiskStore:
+    """Local SQLite store with per-entry expiry (single-process deployments, no Redis)."""
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT content, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, content: str, ttl: int):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses (key, content, expires_at) VALUES (?, ?, ?)",
+                              (key, content, time.time() + ttl))
+            # Opportunistic cleanup keeps the file from growing with expired entries
+            self.conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self.conn.commit()
+
+
+class _RedisStore:
+    """Shared across workers. Sync client: the registry calls it from threads (async paths use to_thread)."""
+    PREFIX = "llm:"
+
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.redis.get(self.PREFIX + key)
+
+    def set(self, key: str, content: str, ttl: int):
+        self.redis.setex(self.PREFIX + key, ttl, content)
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache of LLM responses, keyed by a hash of (model, corpus version, messages,
+    call options). Only deterministic calls are cached: the route's temperature must be at most
+    LLM_CACHE_MAX_TEMPERATURE. Entries expire per call type (LLM_CACHE_TTLS); bumping the corpus
+    version on ingest makes every older entry unreachable.
+
+    Store errors are treated as misses: the cache must never fail an LLM call.
+    """
+    def __init__(self, backend: str = None):
+        self.backend = "redis" if (backend or settings.LLM_CACHE_BACKEND) == "redis" and settings.REDIS_URL else "disk"
+        if self.backend == "redis":
+            self.store = _RedisStore(settings.REDIS_URL)
+        else:
+            self.store = _DiskStore(os.path.join(settings.DATA_DIR, "llm_cache.sqlite"))
+        # Set by the pipeline; without it entries are keyed to version 0
+        self.corpus_version = None
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, call_type: str, name: str):
+        counters = self.counters.setdefault(call_type, {"hits": 0, "misses": 0, "uncacheable": 0, "errors": 0})
+        counters[name] += 1
+
+    @staticmethod
+    def is_deterministic(client, kwargs: dict) -> bool:
+        temperature = kwargs.get("temperature", getattr(client, "temperature", None))
+        return temperature is not None and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+
+    def make_key(self, call_type: str, route, messages: List[BaseMessage], kwargs: dict) -> Optional[str]:
+        """Returns None (and counts it) when the call is not deterministic."""
+        if not self.is_deterministic(route.client, kwargs):
+            self._count(call_type, "uncacheable")
+            return None
+        if self.corpus_version is not None and not self.corpus_version.shared:
+            # An ingest could not be shared with the other workers: their entries may be stale
+            self._count(call_type, "uncacheable")
+            return None
+        version = self.corpus_version.current if self.corpus_version is not None else 0
+        payload = json.dumps([
+            route.name, version,
+            [[message.type, message.content] for message in messages],
+            {k: v for k, v in kwargs.items() if v is not None},
+        ], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, call_type: str, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        try:
+            content = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"LLM response cache lookup failed: {e}")
+            self._count(call_type, "errors")
+            content = None
+        self._count(call_type, "hits" if content is not None else "misses")
+        if content is not None:
+            logger.info(f"LLM response cache hit ({call_type})")
+        return content
+
+    def set(self, call_type: str, key: Optional[str], content: str):
+        if key is None or not content:
+            return
+        ttl = settings.LLM_CACHE_TTLS.get(call_type, settings.LLM_CACHE_DEFAULT_TTL)
+        try:
+            self.store.set(key, content, ttl)
+        except Exception as e:
+            logger.warning(f"LLM response cache write failed: {e}")
+            self._count(call_type, "errors")
+
+    def stats(self) -> dict:
+        per_type = {}
+        for call_type, counters in self.counters.items():
+            lookups = counters["hits"] + counters["misses"]
+            per_type[call_type] = dict(counters, hit_rate=round(counters["hits"] / lookups, 4) if lookups else 0.0)
+        return {"backend": self.backend, "call_types": per_type}
@@ -0,0 +1,140 @@
+import json
+import time
+import uuid
+from typing import Dict, List, Optional
+import numpy as np
+from app.db.redis_client import RedisClient
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class _TenantIndex:
+    """Local mirror of one tenant's cached entries with a normalized embedding matrix."""
+    def __init__(self, entries: Dict[str, dict], version: Optional[int] = None):
+        self.ids = list(entries)
+        self.entries = entries
+        self.version = version
+        self.matrix = (
+            np.asarray([entries[i]["embedding"] for i in self.ids], dtype=np.float32)
+            if self.ids else np.zeros((0, 0), dtype=np.float32)
+        )
+        self.created_at = np.asarray([entries[i]["created_at"] for i in self.ids], dtype=np.float64)
+        self.models = np.asarray([entries[i].get("model", "") for i in self.ids], dtype=object)
+
+
+class SemanticAnswerCache:
+    """
+    Cache of final answers keyed by (rewritten query embedding, retrieved chunk-ID set), per tenant.
+
+    A lookup returns a cached answer when the nearest unexpired cached query answered by the
+    same model is above SEMANTIC_CACHE_THRESHOLD (cosine) *and* it was answered from exactly
+    the same chunks. The model is the resolved "provider:model", so aliases share entries.
+    Chunk IDs are content hashes, so a re-ingested, changed chunk never matches.
+    Each entry expires SEMANTIC_CACHE_TTL seconds after it was stored.
+
+    Entries live in a Redis hash per tenant (shared across workers) next to a version counter
+    that every store increments; each worker keeps a local embedding matrix per tenant and
+    reloads it when the version changes. Nearest-neighbour search is an exact inner product
+    over that matrix, which at the per-tenant cap (SEMANTIC_CACHE_MAX_ENTRIES) costs well
+    under a millisecond.
+    """
+    PREFIX = "semcache:"
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self._tenants: Dict[str, _TenantIndex] = {}
+        self.hits = 0
+        self.misses = 0
+        self.llm_calls_skipped = 0
+
+    def _key(self, tenant: str) -> str:
+        return f"{self.PREFIX}{tenant}"
+
+    def _version_key(self, tenant: str) -> str:
+        return f"{self.PREFIX}{tenant}:version"
+
+    async def _load(self, tenant: str) -> _TenantIndex:
+        index = self._tenants.get(tenant)
+        try:
+            version = int(await self.redis.redis.get(self._version_key(tenant)) or 0)
+            if index is None or index.version != version:
+                raw = await self.redis.redis.hgetall(self._key(tenant))
+                index = _TenantIndex({entry_id: json.loads(value) for entry_id, value in raw.items()}, version)
+                self._tenants[tenant] = index
+        except Exception as e:
+            logger.warning(f"Semantic cache Redis load failed, using local entries: {e}")
+            if index is None:
+                index = self._tenants.setdefault(tenant, _TenantIndex({}))
+        return index
+
+    async def lookup(self, tenant: str, model: str, query_embedding: List[float], chunk_ids: List[str]) -> Optional[str]:
+        index = await self._load(tenant)
+        if not index.ids or not chunk_ids:
+            self.misses += 1
+            return None
+
+        similarities = index.matrix @ np.asarray(query_embedding, dtype=np.float32)
+        similarities[index.created_at < time.time() - settings.SEMANTIC_CACHE_TTL] = -np.inf
+        # Another model's answer is not what this request asked for
+        similarities[index.models != model] = -np.inf
+        best = int(np.argmax(similarities))
+        entry = index.entries[index.ids[best]]
+        if similarities[best] >= settings.SEMANTIC_CACHE_THRESHOLD and set(entry["chunk_ids"]) == set(chunk_ids):
+            self.hits += 1
+            self.llm_calls_skipped += entry.get("llm_calls", 0)
+            logger.info(f"Semantic cache hit (similarity {similarities[best]:.3f}): '{entry['query']}'")
+            return entry["answer"]
+        self.misses += 1
+        return None
+
+    async def store(self, tenant: str, model: str, query: str, query_embedding: List[float], chunk_ids: List[str],
+                    answer: str, llm_calls: int = 0):
+        """`llm_calls`: provider calls the answer cost, i.e. what a later hit on it saves."""
+        index = await self._load(tenant)
+        now = time.time()
+        entry = {
+            "model": model,
+            "query": query,
+            "embedding": [float(x) for x in query_embedding],
+            "chunk_ids": list(chunk_ids),
+            "answer": answer,
+            "llm_calls": llm_calls,
+            "created_at": now,
+        }
+        entry_id = uuid.uuid4().hex
+        entries = {i: e for i, e in index.entries.items() if e["created_at"] >= now - settings.SEMANTIC_CACHE_TTL}
+        if len(entries) >= settings.SEMANTIC_CACHE_MAX_ENTRIES:
+            del entries[min(entries, key=lambda i: entries[i]["created_at"])]
+        entries[entry_id] = entry
+        evicted = [i for i in index.entries if i not in entries]
+
+        version = None
+        try:
+            async with self.redis.redis.pipeline(transaction=True) as pipe:
+                if evicted:
+                    pipe.hdel(self._key(tenant), *evicted)
+                pipe.hset(self._key(tenant), entry_id, json.dumps(entry))
+                pipe.incr(self._version_key(tenant))
+                # Idle tenants are dropped as a whole; live entries expire by their own timestamp
+                pipe.expire(self._key(tenant), settings.SEMANTIC_CACHE_TTL)
+                pipe.expire(self._version_key(tenant), settings.SEMANTIC_CACHE_TTL)
+                version = (await pipe.execute())[-3]
+        except Exception as e:
+            logger.warning(f"Semantic cache Redis write failed, caching locally: {e}")
+        # The local copy matches Redis only if no other worker stored in between; otherwise
+        # (or if the write failed) version None makes the next lookup reload
+        if version is None or index.version is None or version != index.version + 1:
+            version = None
+        self._tenants[tenant] = _TenantIndex(entries, version)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            # Generation and validation calls the cached answers cost when they were first produced
+            "llm_calls_skipped": self.llm_calls_skipped,
+            "tenants": len(self._tenants),
+        }
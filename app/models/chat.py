@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 from datetime import datetime
@@ -17,6 +17,9 @@ class Thread(Base):
     # Relationship
     messages = relationship("Message", back_populates="thread", cascade="all, delete-orphan")
 
+    # Keyset pagination of a user's threads (newest first); created for existing DBs by app.db.migrations
+    __table_args__ = (Index("ix_threads_user_id_created_at", "user_id", "created_at", "id"),)
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -28,3 +31,6 @@ class Message(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     thread = relationship("Thread", back_populates="messages")
+
+    # History reads and keyset pagination filter by thread and order by time
+    __table_args__ = (Index("ix_messages_thread_id_created_at", "thread_id", "created_at", "id"),)
@@ -1,28 +1,179 @@
-from typing import List
+import re
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+import numpy as np
 from langchain_core.documents import Document
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from app.llm.llm_client import LLMClient
-from app.config.prompts import CONTEXT_COMPRESSOR_PROMPT
+from app.embeddings.embedding_model import EmbeddingModel
+from app.utils.cache import TTLCache
+from app.config.settings import settings
 from app.utils.logger import setup_logger
 
 from langsmith import traceable
 
 logger = setup_logger(__name__)
 
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
 class ContextCompressor:
+    """
+    Extractive compression without LLM calls: every retrieved chunk is split into sentences,
+    all sentences are scored against the query embedding, and the best ones are kept (in their
+    original order, with the chunk's metadata) until CONTEXT_COMPRESSION_RATIO
+    of the context's characters is reached. When a chunk's metadata has a time span (start and
+    end or duration), its start is moved to the estimated time of the first kept sentence.
+
+    The original design summarized each chunk with the LLM, which was too slow and lost details.
+    """
+    GAP = "..."
+
     def __init__(self):
-        self.llm = LLMClient().get_model()
-        self.prompt = PromptTemplate.from_template(CONTEXT_COMPRESSOR_PROMPT)
+        self.embeddings = EmbeddingModel.get_embedding_model()
+        # Sentence vectors per chunk ID: reranked chunks repeat across turns and users
+        self.sentence_vectors = TTLCache(max_entries=settings.RERANK_CACHE_MAX_ENTRIES)
+        self.chars_before = 0
+        self.chars_after = 0
+        self.latencies_ms: deque = deque(maxlen=1000)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.CONTEXT_COMPRESSION_RATIO < 1.0
+
+    @staticmethod
+    def split_sentences(text: str) -> List[str]:
+        return [sentence for _, sentence in ContextCompressor.sentence_spans(text)]
+
+    @staticmethod
+    def sentence_spans(text: str) -> List[Tuple[int, str]]:
+        """Sentences of `text` with the character offset each one starts at."""
+        spans = []
+        stripped = text.strip()
+        lead = len(text) - len(text.lstrip())
+        position = 0
+        for sentence in SENTENCE_PATTERN.split(stripped):
+            offset = stripped.find(sentence, position)
+            position = offset + len(sentence)
+            # Fragments ("Yeah.", "Right?") read better attached to the previous sentence
+            if spans and len(sentence) < settings.COMPRESSION_MIN_SENTENCE_CHARS:
+                spans[-1] = (spans[-1][0], f"{spans[-1][1]} {sentence}")
+            elif sentence:
+                spans.append((lead + offset, sentence))
+        return spans
+
+    @staticmethod
+    def time_span(metadata: dict) -> Optional[Tuple[float, float]]:
+        """(start, end) seconds of a chunk, when its metadata has both ends."""
+        start = metadata.get('start', metadata.get('window_start_time', metadata.get('start_time')))
+        end = metadata.get('end', metadata.get('end_time'))
+        try:
+            start = float(start)
+            end = float(end) if end is not None else start + float(metadata["duration"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return (start, end) if end > start else None
+
+    def _vectors(self, documents: List[Document], sentences: List[List[str]]) -> List[np.ndarray]:
+        vectors: List[Optional[np.ndarray]] = []
+        to_encode = []
+        for i, doc in enumerate(documents):
+            cached = self.sentence_vectors.get(doc.metadata.get("chunk_id")) if doc.metadata.get("chunk_id") else None
+            vectors.append(cached)
+            if cached is None:
+                to_encode.append(i)
+        if to_encode:
+            # One batched encode for every uncached sentence of every chunk
+            flat = [sentence for i in to_encode for sentence in sentences[i]]
+            encoded = np.asarray(self.embeddings.embed_documents(flat), dtype=np.float32)
+            offset = 0
+            for i in to_encode:
+                vectors[i] = encoded[offset:offset + len(sentences[i])]
+                offset += len(sentences[i])
+                if documents[i].metadata.get("chunk_id"):
+                    self.sentence_vectors.set(documents[i].metadata["chunk_id"], vectors[i])
+        return vectors
 
     @traceable(name="context_compression", run_type="chain")
-    def compress(self, documents: List[Document]) -> List[Document]:
+    def compress(self, documents: List[Document], query: str = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Document]:
         """
-        Summarizes each document to reduce noise.
+        Keeps the query-relevant sentences of each document. Every document keeps at least its
+        best sentence, so citations to its timestamp stay possible. Returns new Documents.
         """
-        compressed_docs = []
-        logger.info(f"Compressing {len(documents)} documents...")
-        
-        # bypass compression for now to preserve details
-        logger.info("Compression disabled to preserve details.")
-        return documents
+        if not self.enabled or not documents or (query is None and query_embedding is None):
+            return documents
+
+        start = time.perf_counter()
+        # Precomputed summaries are already condensed
+        targets = [i for i, doc in enumerate(documents) if doc.metadata.get("type") != "summary"]
+        spans = [self.sentence_spans(documents[i].page_content) for i in targets]
+        sentences = [[sentence for _, sentence in doc_spans] for doc_spans in spans]
+        if not any(sentences):
+            return documents
+
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(query)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        vectors = self._vectors([documents[i] for i in targets], sentences)
+
+        # Global selection: best sentences first until the character budget is spent
+        candidates = []
+        keep = {doc_pos: set() for doc_pos in range(len(sentences))}
+        used = 0
+        for doc_pos, (doc_sentences, doc_vectors) in enumerate(zip(sentences, vectors)):
+            if not doc_sentences:
+                continue
+            scores = doc_vectors @ query_vector
+            best = int(np.argmax(scores))
+            keep[doc_pos].add(best)
+            used += len(doc_sentences[best])
+            for sentence_pos, score in enumerate(scores):
+                candidates.append((float(score), doc_pos, sentence_pos))
+        candidates.sort(reverse=True)
+
+        total_chars = sum(len(s) for doc_sentences in sentences for s in doc_sentences)
+        budget = settings.CONTEXT_COMPRESSION_RATIO * total_chars
+        for score, doc_pos, sentence_pos in candidates:
+            if used >= budget:
+                break
+            if sentence_pos not in keep[doc_pos]:
+                keep[doc_pos].add(sentence_pos)
+                used += len(sentences[doc_pos][sentence_pos])
+
+        compressed = list(documents)
+        for doc_pos, i in enumerate(targets):
+            if not sentences[doc_pos]:
+                continue
+            parts, previous = [], None
+            for sentence_pos in sorted(keep[doc_pos]):
+                if previous is not None and sentence_pos != previous + 1:
+                    parts.append(self.GAP)
+                parts.append(sentences[doc_pos][sentence_pos])
+                previous = sentence_pos
+            metadata = dict(documents[i].metadata)
+            metadata["compressed"] = True
+            # Where the kept sentences sit in the original chunk; with a known time span, the
+            # citation timestamp moves to the first kept sentence instead of the chunk's start
+            offsets = [spans[doc_pos][sentence_pos][0] for sentence_pos in sorted(keep[doc_pos])]
+            metadata["sentence_offsets"] = offsets
+            span = self.time_span(metadata)
+            if span is not None:
+                fraction = offsets[0] / max(len(documents[i].page_content), 1)
+                metadata["start"] = round(span[0] + fraction * (span[1] - span[0]), 2)
+            compressed[i] = Document(page_content=" ".join(parts), metadata=metadata)
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        before = sum(len(doc.page_content) for doc in documents)
+        after = sum(len(doc.page_content) for doc in compressed)
+        self.chars_before += before
+        self.chars_after += after
+        self.latencies_ms.append(latency_ms)
+        logger.info(f"Compressed context {before} -> {after} chars in {latency_ms:.1f}ms")
+        return compressed
+
+    def stats(self) -> dict:
+        return {
+            "ratio": settings.CONTEXT_COMPRESSION_RATIO,
+            "chars_before": self.chars_before,
+            "chars_after": self.chars_after,
+            "avg_ms": round(float(np.mean(self.latencies_ms)), 2) if self.latencies_ms else None,
+        }
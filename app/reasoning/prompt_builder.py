@@ -1,6 +1,37 @@
-from typing import List
+import re
+from typing import Dict, List, Optional, Tuple
 from langchain_core.documents import Document
 from app.config.prompts import ANSWER_GENERATOR_SYSTEM_PROMPT
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+")
+WORD_PATTERN = re.compile(r"\w+")
+
+class TokenCounter:
+    """
+    Local prompt token counts. Uses the PROMPT_TOKENIZER Hugging Face tokenizer (by default the
+    embedding model's, already on disk); falls back to ~4 characters per token if it cannot load.
+    The count is an estimate of the LLM's own tokenizer, which is why budgets keep some headroom.
+    """
+    _tokenizer = None
+    _loaded = False
+
+    @classmethod
+    def count(cls, text: str) -> int:
+        if not cls._loaded:
+            cls._loaded = True
+            try:
+                from transformers import AutoTokenizer
+                cls._tokenizer = AutoTokenizer.from_pretrained(settings.PROMPT_TOKENIZER)
+            except Exception as e:
+                logger.warning(f"Prompt tokenizer unavailable, estimating tokens from length: {e}")
+        if cls._tokenizer is None:
+            return max(1, len(text) // 4)
+        return len(cls._tokenizer.encode(text, add_special_tokens=False, verbose=False))
+
 
 class PromptBuilder:
     @staticmethod
@@ -51,3 +82,129 @@ class PromptBuilder:
             context_parts.append(content)
             
         return "\n".join(context_parts)
+
+    # --- Token-budgeted context packing ---
+
+    @staticmethod
+    def token_budget(model_name: Optional[str] = None) -> int:
+        return settings.CONTEXT_TOKEN_BUDGETS.get(model_name, settings.CONTEXT_TOKEN_BUDGET)
+
+    @staticmethod
+    def _metadata(doc) -> dict:
+        return doc.get("metadata", doc) if isinstance(doc, dict) else getattr(doc, "metadata", {})
+
+    @staticmethod
+    def _content(doc) -> str:
+        if isinstance(doc, dict):
+            return doc.get("text", doc.get("page_content", ""))
+        return getattr(doc, "page_content", "")
+
+    @staticmethod
+    def _shingles(text: str) -> set:
+        words = WORD_PATTERN.findall(text.lower())
+        return {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+
+    @staticmethod
+    def _adjacency_key(metadata: dict) -> Optional[Tuple]:
+        """Chunks with the same key and consecutive chunk_index were split from contiguous text."""
+        if metadata.get("chunk_index") is None or metadata.get("type") == "summary":
+            return None
+        if metadata.get("video_id") is not None:
+            return metadata["video_id"], metadata.get("window_start_time")
+        if metadata.get("source") is not None:
+            return (metadata["source"],)
+        return None
+
+    @staticmethod
+    def _join_overlapping(first: str, second: str) -> str:
+        # The splitter repeats up to CHUNK_OVERLAP characters between neighbours: keep them once
+        for k in range(min(len(first), len(second), int(settings.CHUNK_OVERLAP * 1.5)), 19, -1):
+            if first.endswith(second[:k]):
+                return first + second[k:]
+        return first + " " + second
+
+    @staticmethod
+    def _trim(text: str, max_tokens: int) -> str:
+        kept, used = [], 0
+        for sentence in SENTENCE_SPLIT_PATTERN.split(text):
+            tokens = TokenCounter.count(sentence)
+            if used + tokens > max_tokens:
+                break
+            kept.append(sentence)
+            used += tokens
+        return " ".join(kept)
+
+    @staticmethod
+    def pack_documents(documents: List, token_budget: int) -> Tuple[List[Document], Dict[str, int]]:
+        """
+        Fits reranked documents (best first) into `token_budget` prompt tokens:
+        1. drops near-duplicates (word 3-gram containment >= CONTEXT_DEDUP_THRESHOLD) of better chunks,
+        2. merges chunks adjacent by chunk index in the same video window / PDF, removing the
+           text the splitter repeated between them,
+        3. adds merged groups by relevance until the budget is used; the first group that does not
+           fit is trimmed at a sentence boundary if enough budget is left, the rest are dropped.
+        Returns (packed documents, report with token counts before and after).
+        """
+        report = {"chunks_in": len(documents), "duplicates_dropped": 0, "merged": 0, "trimmed": 0,
+                  "tokens_before": 0, "tokens_after": 0}
+
+        kept, kept_shingles = [], []
+        for doc in documents:
+            content = PromptBuilder._content(doc)
+            report["tokens_before"] += TokenCounter.count(content)
+            shingles = PromptBuilder._shingles(content)
+            if any(len(shingles & other) / max(min(len(shingles), len(other)), 1) >= settings.CONTEXT_DEDUP_THRESHOLD
+                   for other in kept_shingles):
+                report["duplicates_dropped"] += 1
+                continue
+            kept.append(doc)
+            kept_shingles.append(shingles)
+
+        # Group chains of consecutive chunk indexes; a group ranks as its best member
+        groups: List[List] = []
+        by_position: Dict[Tuple, List] = {}
+        for doc in kept:
+            metadata = PromptBuilder._metadata(doc)
+            key = PromptBuilder._adjacency_key(metadata)
+            index = metadata.get("chunk_index")
+            group = None
+            if key is not None:
+                group = by_position.get((key, index - 1)) or by_position.get((key, index + 1))
+            if group is None:
+                group = []
+                groups.append(group)
+            else:
+                report["merged"] += 1
+            group.append(doc)
+            if key is not None:
+                by_position[(key, index)] = group
+
+        packed, remaining = [], token_budget
+        for group in groups:
+            group.sort(key=lambda d: PromptBuilder._metadata(d).get("chunk_index") or 0)
+            content = PromptBuilder._content(group[0])
+            for doc in group[1:]:
+                content = PromptBuilder._join_overlapping(content, PromptBuilder._content(doc))
+            metadata = dict(PromptBuilder._metadata(group[0]))
+            if len(group) > 1:
+                metadata["merged_chunk_ids"] = [PromptBuilder._metadata(d).get("chunk_id") for d in group]
+
+            tokens = TokenCounter.count(content)
+            if tokens > remaining:
+                if remaining < settings.CONTEXT_MIN_TRIM_TOKENS:
+                    break
+                content = PromptBuilder._trim(content, remaining)
+                if not content:
+                    break
+                tokens = TokenCounter.count(content)
+                metadata["trimmed"] = True
+                report["trimmed"] += 1
+            packed.append(Document(page_content=content, metadata=metadata))
+            remaining -= tokens
+            report["tokens_after"] += tokens
+            if remaining <= 0:
+                break
+
+        report["chunks_out"] = len(packed)
+        logger.info(f"Packed context: {report}")
+        return packed, report
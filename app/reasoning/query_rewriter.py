@@ -1,51 +1,175 @@
+import asyncio
+import hashlib
+import re
+from typing import Optional, Tuple
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from app.llm.llm_client import LLMClient
+from app.llm.llm_registry import LLMRegistry
 from app.config.prompts import QUERY_REWRITE_PROMPT
+from app.config.settings import settings
+from app.utils.cache import TTLCache
 from app.utils.logger import setup_logger
 
 from langsmith import traceable
 
 logger = setup_logger(__name__)
 
+# Anaphora: words that point back into the conversation. Demonstratives only count when they
+# stand for a noun ("what is that?", "why does this work"), not when they modify one ("this video").
+REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|itself|he|him|his|himself|she|her|hers|herself|they|them|their|theirs|themselves|"
+    r"former|latter|same|(first|second|third|last|other|next|previous) ones?)\b"
+    r"|\b(this|that|these|those)\b(?=\s*([?.!,]|$|(is|are|was|were|mean|means|work|works|do|does|did|true|right|correct)\b))"
+)
+# A follow-up made only of these ("why?", "and then?", "how so") has nothing to search for by itself
+FUNCTION_WORDS = frozenset(
+    "a an and or but so then also too what why how when where who which whom is are was were do does "
+    "did can could would should will more about tell me explain please again really ok okay".split()
+)
+WORD_PATTERN = re.compile(r"\w+")
+
 class QueryRewriter:
+    """
+    LLM query rewriting behind a policy: cheap local heuristics decide whether a rewrite is
+    needed at all, rewrites are cached per (query, recent history), and the async path falls
+    back to the raw query when the LLM does not answer within REWRITE_TIMEOUT.
+    """
+    HISTORY_ANSWER_CHARS = 500
+
     def __init__(self):
-        self.llm = LLMClient().get_model()
-        # self.prompt = PromptTemplate.from_template(QUERY_REWRITE_PROMPT) # This is no longer needed if prompt is constructed dynamically
+        self.llm = LLMRegistry.get_instance().get_model(call_type="rewrite")
+        self.cache = TTLCache(max_entries=settings.REWRITE_CACHE_MAX_ENTRIES, ttl=settings.REWRITE_CACHE_TTL)
+        self.counters = {"requests": 0, "skipped": 0, "cache_hits": 0, "llm_calls": 0, "timeouts": 0, "errors": 0}
+        self.chain = self._build_chain()
+
+    @staticmethod
+    def _recent_history(chat_history: list = None) -> list:
+        # Last 3 turns: (user, assistant) tuples from routes.py, or role/content dict messages
+        return (chat_history or [])[-3:]
+
+    @staticmethod
+    def format_history(chat_history: list = None) -> str:
+        lines = []
+        for turn in QueryRewriter._recent_history(chat_history):
+            if isinstance(turn, dict):
+                lines.append(f"{turn['role'].upper()}: {turn['content']}")
+            else:
+                user_msg, assistant_msg = turn
+                lines.append(f"USER: {user_msg}")
+                # Answers can be long; their opening is enough to resolve references
+                lines.append(f"ASSISTANT: {assistant_msg[:QueryRewriter.HISTORY_ANSWER_CHARS]}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def needs_rewrite(query: str, chat_history: list = None) -> Tuple[bool, str]:
+        """
+        Local policy: only follow-ups that lean on the conversation are sent to the LLM, i.e. ones
+        with anaphora or with no content word at all. Everything else, including bare keyword
+        queries, is searched as typed. Returns (needs_rewrite, reason).
+        """
+        if not chat_history:
+            return False, "no_history"
+        if REFERENCE_PATTERN.search(query.lower()):
+            return True, "reference"
+        if all(word in FUNCTION_WORDS for word in WORD_PATTERN.findall(query.lower())):
+            return True, "elliptical"
+        return False, "self_contained"
+
+    def _cache_key(self, query: str, chat_history: list = None) -> tuple:
+        history_hash = hashlib.sha1(self.format_history(chat_history).encode("utf-8")).hexdigest()
+        return " ".join(query.lower().split()), history_hash
+
+    def _plan(self, query: str, chat_history: list = None) -> Tuple[Optional[str], tuple]:
+        """Returns (answer without an LLM call or None, cache key)."""
+        self.counters["requests"] += 1
+        needed, reason = self.needs_rewrite(query, chat_history)
+        if not needed:
+            self.counters["skipped"] += 1
+            logger.info(f"Query rewrite skipped ({reason}): {query}")
+            return query, None
+        key = self._cache_key(query, chat_history)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.counters["cache_hits"] += 1
+            logger.info(f"Query rewrite cache hit: {cached}")
+            return cached, key
+        self.counters["llm_calls"] += 1
+        return None, key
+
+    def stats(self) -> dict:
+        requests = self.counters["requests"]
+        avoided = self.counters["skipped"] + self.counters["cache_hits"]
+        return {
+            **self.counters,
+            "calls_avoided": avoided,
+            "avoided_rate": round(avoided / requests, 4) if requests else 0.0,
+        }
+
+    def _build_chain(self):
+        # History and query are template variables, not interpolated text: user text with
+        # braces ("what does {x} mean") would otherwise be parsed as template fields
+        prompt_template_str = (
+            "You are an expert search query optimizer.\n"
+            "Chat History:\n{history}\n\n"
+            "Original Query: {query}\n"
+            "Task: Rewrite the query to be an effective keyword search for a transcript.\n"
+            "Rules:\n"
+            "1. Resolve pronouns ('it', 'he', 'that') using Chat History.\n"
+            "2. If the query asks about a specific named entity (e.g. 'AlphaFold', 'Demis'), KEEP IT EXPLICIT in the rewrite.\n"
+            "3. Remove conversational filler ('what is', 'tell me about').\n"
+            "4. Add 1-2 relevant synonyms or context keywords ONLY if the query is ambiguous.\n"
+            "5. If the query is already a specific keyword, return it AS IS.\n"
+            "Output ONLY the rewritten query text."
+        )
+        prompt = PromptTemplate.from_template(prompt_template_str)
+        return prompt | self.llm | StrOutputParser()
+
+    def _chain_inputs(self, query: str, chat_history: list = None) -> dict:
+        return {"history": self.format_history(chat_history), "query": query}
 
     @traceable(name="query_rewrite", run_type="chain")
     def rewrite(self, query: str, chat_history: list = None) -> str:
         """
         Rewrites the user query to be search-optimized, using history for context.
         """
-        history_str = ""
-        if chat_history:
-            # Format last 3 turns
-            recent = chat_history[-3:]
-            history_str = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in recent])
+        planned, key = self._plan(query, chat_history)
+        if planned is not None:
+            return planned
+
+        logger.info(f"Rewriting query: {query}")
+        try:
+            rewritten_query = self.chain.invoke(self._chain_inputs(query, chat_history))
+            logger.info(f"Rewritten query: {rewritten_query}")
+            self.cache.set(key, rewritten_query.strip())
+            return rewritten_query.strip()
+        except Exception as e:
+            logger.error(f"Error rewriting query: {e}")
+            self.counters["errors"] += 1
+            return query
+
+    @traceable(name="query_rewrite_async", run_type="chain")
+    async def arewrite(self, query: str, chat_history: list = None) -> str:
+        """
+        Async rewrite for the event loop (network call via ainvoke, no thread blocked).
+        The LLM call is bounded by REWRITE_TIMEOUT; on timeout the raw query is used.
+        """
+        planned, key = self._plan(query, chat_history)
+        if planned is not None:
+            return planned
 
-        prompt_template_str = (
-            f"You are an expert search query optimizer.\n"
-            f"Chat History:\n{history_str}\n\n"
-            f"Original Query: {query}\n"
-            f"Task: Rewrite the query to be an effective keyword search for a transcript.\n"
-            f"Rules:\n"
-            f"1. Resolve pronouns ('it', 'he', 'that') using Chat History.\n"
-            f"2. If the query asks about a specific named entity (e.g. 'AlphaFold', 'Demis'), KEEP IT EXPLICIT in the rewrite.\n"
-            f"3. Remove conversational filler ('what is', 'tell me about').\n"
-            f"4. Add 1-2 relevant synonyms or context keywords ONLY if the query is ambiguous.\n"
-            f"5. If the query is already a specific keyword, return it AS IS.\n"
-            f"Output ONLY the rewritten query text."
-        )
         logger.info(f"Rewriting query: {query}")
         try:
-            # Create a PromptTemplate on the fly for the dynamic prompt string
-            dynamic_prompt = PromptTemplate.from_template(prompt_template_str)
-            chain = dynamic_prompt | self.llm | StrOutputParser()
-            # Since the query is already embedded in the prompt_template_str, invoke with an empty dictionary or None
-            rewritten_query = chain.invoke({})
+            rewritten_query = await asyncio.wait_for(
+                self.chain.ainvoke(self._chain_inputs(query, chat_history)), timeout=settings.REWRITE_TIMEOUT
+            )
             logger.info(f"Rewritten query: {rewritten_query}")
+            self.cache.set(key, rewritten_query.strip())
             return rewritten_query.strip()
+        except asyncio.TimeoutError:
+            logger.warning(f"Query rewrite timed out after {settings.REWRITE_TIMEOUT}s; using raw query.")
+            self.counters["timeouts"] += 1
+            return query
         except Exception as e:
             logger.error(f"Error rewriting query: {e}")
+            self.counters["errors"] += 1
             return query
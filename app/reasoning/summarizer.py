@@ -0,0 +1,79 @@
+import hashlib
+from typing import Dict, List
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.llm.llm_registry import LLMRegistry
+from app.embeddings.embedding_model import EmbeddingModel
+from app.vectorstore.summary_store import SummaryStore
+from app.config.prompts import WINDOW_SUMMARY_PROMPT, VIDEO_SUMMARY_PROMPT
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+from langsmith import traceable
+
+logger = setup_logger(__name__)
+
+def _format_time(seconds: float) -> str:
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+class HierarchicalSummarizer:
+    """
+    Map-reduce summaries built at ingest time:
+    map = one summary per time window, reduce = one overview per video.
+    """
+    def __init__(self, store: SummaryStore):
+        self.store = store
+        self.llm = LLMRegistry.get_instance().get_model(call_type="summarize")
+        self.window_chain = PromptTemplate.from_template(WINDOW_SUMMARY_PROMPT) | self.llm | StrOutputParser()
+        self.video_chain = PromptTemplate.from_template(VIDEO_SUMMARY_PROMPT) | self.llm | StrOutputParser()
+
+    @staticmethod
+    def source_hash(chunks: List[dict]) -> str:
+        """Chunk IDs are content hashes, so this changes exactly when the source's content does."""
+        chunk_ids = sorted(chunk["chunk_id"] for chunk in chunks)
+        return hashlib.sha1("|".join(chunk_ids).encode("utf-8")).hexdigest()
+
+    @traceable(name="summarize_source", run_type="chain")
+    def summarize_source(self, source: str, chunks: List[dict]):
+        """
+        Builds (or reuses) the summaries of one video. Safe to run as a background task.
+        """
+        if not chunks:
+            return
+        source_hash = self.source_hash(chunks)
+        cached = self.store.get(source)
+        if cached and cached.get("source_hash") == source_hash:
+            logger.info(f"Summary for {source} is up to date.")
+            return
+        if cached:
+            # Re-ingested with different content: stop serving the stale summary right away
+            self.store.delete(source)
+
+        # Map: one summary per time window, in parallel
+        windows: Dict[float, List[str]] = {}
+        for chunk in chunks:
+            windows.setdefault(float(chunk.get("window_start_time", 0.0)), []).append(chunk["text"])
+        starts = sorted(windows)
+
+        logger.info(f"Summarizing {source}: {len(starts)} windows...")
+        try:
+            window_summaries = self.window_chain.batch(
+                [{"start": _format_time(start), "context": " ".join(windows[start])} for start in starts],
+                config={"max_concurrency": settings.SUMMARY_MAX_CONCURRENCY}
+            )
+            # Reduce: one overview from the window summaries
+            summary = self.video_chain.invoke({
+                "context": "\n\n".join(f"[{_format_time(start)}]\n{text.strip()}" for start, text in zip(starts, window_summaries))
+            })
+        except Exception as e:
+            logger.error(f"Failed to summarize {source}: {e}")
+            return
+
+        self.store.save({
+            "source": source,
+            "source_hash": source_hash,
+            "summary": summary.strip(),
+            "windows": [{"start": start, "summary": text.strip()} for start, text in zip(starts, window_summaries)],
+            "embedding": EmbeddingModel.get_embedding_model().embed_query(summary),
+        })
+        logger.info(f"Summary for {source} saved.")
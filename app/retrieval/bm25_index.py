@@ -0,0 +1,231 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+ARRAY_FILES = ("terms", "indptr", "doc_ids", "tfs", "weights", "doc_lengths", "chunk_ids")
+
+
+class BM25State(NamedTuple):
+    """One consistent version of the index arrays; never modified once published."""
+    terms: np.ndarray
+    indptr: np.ndarray
+    doc_ids: np.ndarray
+    tfs: np.ndarray
+    weights: np.ndarray
+    doc_lengths: np.ndarray
+    chunk_ids: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "BM25State":
+        return cls(terms=np.zeros(0, dtype="<U1"), indptr=np.zeros(1, dtype=np.int64),
+                   doc_ids=np.zeros(0, dtype=np.int32), tfs=np.zeros(0, dtype=np.float32),
+                   weights=np.zeros(0, dtype=np.float32), doc_lengths=np.zeros(0, dtype=np.int32),
+                   chunk_ids=np.zeros(0, dtype="<U1"))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a term-major CSR matrix.
+
+    Row t of the matrix holds the postings of term t: `doc_ids[indptr[t]:indptr[t+1]]`
+    with their term frequencies and precomputed BM25 impact weights. A query only
+    touches the rows of its own terms, so scoring cost follows the postings length
+    instead of the corpus size.
+
+    The vocabulary is a sorted fixed-width string array (term id = position), looked up
+    with searchsorted. Every array is saved as .npy and memory-mapped on load, so opening
+    the index costs the same at any corpus size. `chunk_ids[doc]` points into the MetadataStore.
+
+    Scoring matches rank_bm25.BM25Okapi (same idf formula and epsilon floor) for documents
+    without over-long tokens.
+
+    Searches may run while documents are added: the arrays live in an immutable `BM25State`,
+    `add_documents` builds the next state aside and publishes it with a single assignment,
+    and every search reads one state from start to end. Writers are serialized.
+    """
+    # Bounds the fixed-width vocabulary array. Longer tokens (URLs, hashes, run-together text) are
+    # not indexed: they still count towards the document length but never match a query.
+    MAX_TERM_LENGTH = 64
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.state = BM25State.empty()
+        self._write_lock = threading.Lock()
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.state.doc_lengths)
+
+    def _term_ids(self, state: BM25State, tokens: List[str]) -> np.ndarray:
+        """Maps tokens to term ids; unknown tokens map to -1."""
+        if not tokens or not len(state.terms):
+            return np.full(len(tokens), -1, dtype=np.int64)
+        indexable = np.asarray([len(t) <= self.MAX_TERM_LENGTH for t in tokens], dtype=bool)
+        needles = np.asarray([t if ok else "" for t, ok in zip(tokens, indexable)])
+        pos = np.minimum(np.searchsorted(state.terms, needles), len(state.terms) - 1)
+        return np.where(indexable & (state.terms[pos] == needles), pos, -1)
+
+    def add_documents(self, tokenized_docs: List[List[str]], chunk_ids: List[str]) -> int:
+        """
+        Appends documents to the matrix and recomputes the weights; returns how many were added.
+        Chunk IDs already in the index (re-ingested sources) and repeats within the batch are
+        skipped. Existing postings are merged in COO form, so nothing is re-tokenized.
+        """
+        with self._write_lock:
+            old = self.state
+            new_ids = np.asarray(chunk_ids, dtype=str)
+            keep = ~np.isin(new_ids, old.chunk_ids)
+            keep &= np.isin(np.arange(len(new_ids)), np.unique(new_ids, return_index=True)[1])
+            tokenized_docs = [tokens for tokens, ok in zip(tokenized_docs, keep) if ok]
+            if not tokenized_docs:
+                return 0
+            self.state = self._merge(old, tokenized_docs, new_ids[keep])
+            return len(tokenized_docs)
+
+    def _merge(self, old: BM25State, tokenized_docs: List[List[str]], chunk_ids: np.ndarray) -> BM25State:
+        offset = len(old.doc_lengths)
+        lengths = np.asarray([len(tokens) for tokens in tokenized_docs], dtype=np.int32)
+        kept = [[t for t in tokens if len(t) <= self.MAX_TERM_LENGTH] for tokens in tokenized_docs]
+        flat = np.asarray([t for tokens in kept for t in tokens], dtype=str)
+        kept_lengths = np.asarray([len(tokens) for tokens in kept], dtype=np.int64)
+        flat_docs = np.repeat(np.arange(offset, offset + len(lengths), dtype=np.int64), kept_lengths)
+
+        # Merge vocabularies; old term ids shift to their position in the union
+        merged_terms = np.union1d(old.terms, flat)
+        old_rows = np.repeat(np.arange(len(old.indptr) - 1, dtype=np.int64), np.diff(old.indptr))
+        old_terms = np.searchsorted(merged_terms, old.terms)[old_rows]
+
+        # (doc, term) pairs of the new documents with their term frequencies
+        vocab_size = max(len(merged_terms), 1)
+        new_terms = np.searchsorted(merged_terms, flat)
+        keys, new_tfs = np.unique(flat_docs * vocab_size + new_terms, return_counts=True)
+        new_docs, new_terms = np.divmod(keys, vocab_size)
+
+        terms = np.concatenate([old_terms, new_terms])
+        docs = np.concatenate([old.doc_ids, new_docs.astype(np.int32)])
+        tfs = np.concatenate([old.tfs, new_tfs.astype(np.float32)])
+
+        # New doc ids are all larger than existing ones, so a stable sort on term keeps rows doc-ordered
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(merged_terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(merged_terms)), out=indptr[1:])
+        doc_ids, tfs = docs[order], tfs[order]
+        doc_lengths = np.concatenate([old.doc_lengths, lengths])
+        weights = self._compute_weights(indptr, doc_ids, tfs, doc_lengths)
+        return BM25State(terms=merged_terms, indptr=indptr, doc_ids=doc_ids, tfs=tfs, weights=weights,
+                         doc_lengths=doc_lengths, chunk_ids=np.concatenate([old.chunk_ids, chunk_ids]))
+
+    def _compute_weights(self, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                         doc_lengths: np.ndarray) -> np.ndarray:
+        n_docs = len(doc_lengths)
+        doc_freqs = np.diff(indptr).astype(np.float64)
+        idf = np.log(n_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        # rank_bm25 floors negative idf (very common terms) at epsilon * mean idf
+        if len(idf):
+            idf[idf < 0] = self.epsilon * idf.mean()
+
+        avgdl = doc_lengths.mean() if n_docs else 0.0
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths / avgdl) if avgdl else np.full(n_docs, self.k1)
+
+        row_idf = np.repeat(idf, np.diff(indptr))
+        tfs = tfs.astype(np.float64)
+        return (row_idf * tfs * (self.k1 + 1) / (tfs + norm[doc_ids])).astype(np.float32)
+
+    def _scores(self, state: BM25State, tokenized_query: List[str]) -> np.ndarray:
+        scores = np.zeros(len(state.doc_lengths), dtype=np.float32)
+        term_ids = self._term_ids(state, tokenized_query)
+        term_ids, counts = np.unique(term_ids[term_ids >= 0], return_counts=True)
+
+        for term_id, count in zip(term_ids, counts):
+            start, end = state.indptr[term_id], state.indptr[term_id + 1]
+            # doc ids are unique within a row, so fancy-index accumulation is safe
+            scores[state.doc_ids[start:end]] += count * state.weights[start:end]
+        return scores
+
+    def get_scores(self, tokenized_query: List[str]) -> np.ndarray:
+        """
+        Scores every document; only postings of the query terms are visited.
+        """
+        return self._scores(self.state, tokenized_query)
+
+    def _top_k(self, state: BM25State, tokenized_query: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self._scores(state, tokenized_query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
+
+    def top_k(self, tokenized_query: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (doc_indices, scores) of the k best documents, best first.
+        Uses argpartition so only the k winners are sorted.
+        """
+        return self._top_k(self.state, tokenized_query, k)
+
+    def search(self, tokenized_query: List[str], k: int) -> Tuple[List[str], np.ndarray]:
+        """`top_k` as (chunk_ids, scores), both read from the same state."""
+        state = self.state
+        indices, scores = self._top_k(state, tokenized_query, k)
+        return [str(c) for c in state.chunk_ids[indices]], scores
+
+    def save(self, index_dir: str):
+        """
+        Writes the index to a fresh directory and swaps it in, so readers never see a partial index.
+        """
+        parent = os.path.dirname(os.path.abspath(index_dir))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = f"{index_dir}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_dir)
+
+        state = self.state
+        for name in ARRAY_FILES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(getattr(state, name)))
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "num_docs": len(state.doc_lengths),
+            "vocab_size": len(state.terms),
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        old_dir = f"{index_dir}.old-{uuid.uuid4().hex}"
+        if os.path.exists(index_dir):
+            os.rename(index_dir, old_dir)
+        os.rename(tmp_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["BM25Index"]:
+        """
+        Memory-maps a saved index. Returns None if there is no index or its format version differs.
+        """
+        manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            return None
+
+        index = cls(k1=manifest["k1"], b=manifest["b"], epsilon=manifest["epsilon"])
+        index.state = BM25State(**{name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+                                   for name in ARRAY_FILES})
+        return index
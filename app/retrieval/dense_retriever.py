@@ -12,10 +12,10 @@ class DenseRetriever:
         self.vector_store = vector_store
 
     @traceable(name="dense_retrieval", run_type="retriever")
-    def retrieve(self, query: str, top_k: int = 10) -> List[Tuple[Document, float]]:
+    def retrieve(self, query: str, top_k: int = 10, query_embedding: List[float] = None) -> List[Tuple[Document, float]]:
         """
         Retrieves documents using vector similarity.
-        Returns list of (Document, score).
+        Returns list of (Document, score). Pass `query_embedding` if the query is already embedded.
         Note: FAISS scores are L2 distances (lower is better) if using default, 
         or Inner Product (higher is better) if normalized.
         LangChain's similarity_search_with_score usually returns L2.
@@ -25,7 +25,10 @@ class DenseRetriever:
             return []
             
         logger.info(f"Dense retrieval for: {query}")
-        results = self.vector_store.vector_store.similarity_search_with_score(query, k=top_k)
+        if query_embedding is not None:
+            results = self.vector_store.similarity_search_by_vector(query_embedding, k=top_k)
+        else:
+            results = self.vector_store.similarity_search_with_score(query, k=top_k)
         
         # Normalize scores if needed? 
         # For L2, lower is better. We might want to convert to similarity 0-1.
@@ -0,0 +1,57 @@
+from typing import Dict, List, Tuple
+from langchain_core.documents import Document
+from app.vectorstore.metadata_store import MetadataStore
+
+ScoredDocs = List[Tuple[Document, float]]
+
+
+def annotate(doc: Document, **scores) -> Document:
+    """
+    Copy of `doc` with `scores` added to its metadata. Dense hits are the FAISS docstore's
+    shared Document objects, so per-request scores must never be written into them.
+    """
+    return Document(page_content=doc.page_content, metadata={**doc.metadata, **scores}, id=doc.id)
+
+
+def reciprocal_rank_fusion(result_lists: List[ScoredDocs], k: int = 60) -> ScoredDocs:
+    """
+    RRF: score(d) = sum over lists of 1 / (k + rank). Uses ranks only, so it needs
+    no score calibration between FAISS distances and BM25 scores.
+    Documents are identified by chunk ID. Returns (doc, fused_score), best first.
+    """
+    fused: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            chunk_id = MetadataStore.ensure_chunk_id(doc)
+            docs.setdefault(chunk_id, doc)
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(((docs[c], s) for c, s in fused.items()), key=lambda x: x[1], reverse=True)
+
+
+def _min_max(scores: List[float]) -> List[float]:
+    if not scores:
+        return []
+    lo, hi = min(scores), max(scores)
+    if hi == lo:
+        return [1.0] * len(scores)
+    return [(s - lo) / (hi - lo) for s in scores]
+
+
+def weighted_score_fusion(dense_results: ScoredDocs, sparse_results: ScoredDocs, dense_weight: float = 0.5) -> ScoredDocs:
+    """
+    Min-max normalizes each leg's scores to [0, 1] and takes a weighted sum.
+    FAISS returns L2 distances (lower is better), so they are negated first.
+    """
+    fused: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    legs = [
+        (dense_results, _min_max([-score for _, score in dense_results]), dense_weight),
+        (sparse_results, _min_max([score for _, score in sparse_results]), 1.0 - dense_weight),
+    ]
+    for results, normalized, weight in legs:
+        for (doc, _), score in zip(results, normalized):
+            chunk_id = MetadataStore.ensure_chunk_id(doc)
+            docs.setdefault(chunk_id, doc)
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight * score
+    return sorted(((docs[c], s) for c, s in fused.items()), key=lambda x: x[1], reverse=True)
@@ -1,8 +1,18 @@
-from typing import List
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
 from langchain_core.documents import Document
 from app.retrieval.dense_retriever import DenseRetriever
 from app.retrieval.sparse_retriever import SparseRetriever
 from app.retrieval.reranker import Reranker
+from app.retrieval.sharded_retriever import ShardedRetriever
+from app.retrieval.fusion import annotate, reciprocal_rank_fusion, weighted_score_fusion
+from app.vectorstore.summary_store import SummaryStore
+from app.vectorstore.metadata_store import MetadataStore
+from app.retrieval.retrieval_cache import RetrievalCache
 from app.utils.logger import setup_logger
 from app.config.settings import settings
 
@@ -11,53 +21,175 @@ from langsmith import traceable
 logger = setup_logger(__name__)
 
 class HybridRetriever:
-    def __init__(self, dense_retriever: DenseRetriever, sparse_retriever: SparseRetriever, reranker: Reranker):
+    def __init__(self, dense_retriever: DenseRetriever, sparse_retriever: SparseRetriever, reranker: Reranker,
+                 shards: Optional[ShardedRetriever] = None, summaries: Optional[SummaryStore] = None,
+                 cache: Optional[RetrievalCache] = None):
         self.dense = dense_retriever
         self.sparse = sparse_retriever
         self.reranker = reranker
+        # Sharded mode: both legs fan out to the shard workers instead of the local indexes
+        self.shards = shards
+        # Precomputed per-video summaries, served directly for summarization intent
+        self.summaries = summaries
+        # Result cache in front of asearch (chunk IDs + scores per normalized query and corpus version)
+        self.cache = cache
+        # FAISS, NumPy and torch release the GIL, so the legs overlap on threads
+        self.executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+        self.leg_latencies: Dict[str, deque] = {"dense": deque(maxlen=1000), "sparse": deque(maxlen=1000)}
+
+    @staticmethod
+    def _is_summary_intent(query: str) -> bool:
+        return "summar" in query.lower() or "overview" in query.lower()
+
+    def _summary_documents(self, query: str) -> List[Document]:
+        """
+        Precomputed overview + window summaries of the best matching video, or [] if no summary
+        is similar enough to the query (the caller then falls back to normal retrieval).
+        Replaces the wide retrieve-and-rerank for summarization queries.
+        """
+        if self.summaries is None or not self.summaries.entries:
+            return []
+        query_embedding = self.dense.vector_store.embeddings.embed_query(query)
+        sources = self.summaries.find(query_embedding, top_k=1)
+        if not sources:
+            logger.info("Summarization intent detected, but no precomputed summary matches the query.")
+            return []
+        logger.info(f"Summarization intent detected. Serving precomputed summary of {sources}.")
+        return self.summaries.as_documents(sources[0])
+
+    def _candidate_k(self, query: str) -> int:
+        # Summarization Intent (Heuristic) without a precomputed summary: retrieve with much higher K to cover ground
+        if self._is_summary_intent(query):
+            logger.info("Summarization intent detected. Fetching broad context distribution.")
+            return 50
+        return settings.RETRIEVAL_TOP_K
+
+    def _retrieve(self, query: str, top_k: int):
+        if self.shards is not None:
+            return self.shards.retrieve(query, dense_k=top_k, sparse_k=top_k)
+        return self.dense.retrieve(query, top_k=top_k), self.sparse.retrieve(query, top_k=top_k)
 
     @traceable(name="hybrid_search_pipeline", run_type="chain")
     def search(self, query: str) -> List[Document]:
         """
-        Executes hybrid search: Dense + Sparse -> Merge -> Rerank.
+        Executes hybrid search: Dense + Sparse -> Fuse -> Budget -> Rerank.
         """
-        # 1. Check for Summarization Intent (Heuristic)
-        if "summar" in query.lower() or "overview" in query.lower():
-            logger.info("Summarization intent detected. Fetching broad context distribution.")
-            # Strategy: Get chunks from beginning, middle, and end.
-            # Dense retriever usually finds *similar* chunks, which might be repetitive intro/outro.
-            # Sparse is better for keywords.
-            # But the best way is essentially ignoring search and grabbing spread-out chunks.
-            # For this simple implementation, we'll force retrieving a large number of top chunks
-            # and hope they cover different parts, OR we rely on the fact that "summary" might match abstract sections.
-            
-            # Better approach: Just use standard retrieval but with much higher K to cover ground.
-            dense_results = self.dense.retrieve(query, top_k=50)
-            sparse_results = self.sparse.retrieve(query, top_k=50)
+        if self._is_summary_intent(query):
+            summary_docs = self._summary_documents(query)
+            if summary_docs:
+                return summary_docs
+
+        # 1. Retrieve. For summaries, dense retrieval tends to find *similar* (repetitive intro/outro)
+        # chunks and sparse is better for keywords, so we simply widen both.
+        start = time.perf_counter()
+        dense_results, sparse_results = self._retrieve(query, top_k=self._candidate_k(query))
+        return self._merge_and_rerank(query, dense_results, sparse_results, start)
+
+    @traceable(name="hybrid_search_pipeline_async", run_type="chain")
+    async def asearch(self, query: str) -> List[Document]:
+        """
+        Async hybrid search for the event loop: the dense and sparse legs run concurrently
+        in the retrieval pool, each bounded by RETRIEVAL_LEG_TIMEOUT. A leg that times out
+        or fails contributes no results, so the search degrades to the other leg.
+        Results are served from / stored in the retrieval cache when one is configured.
+        """
+        if self.cache is None:
+            return await self._asearch(query)
+
+        docs, key = await self.cache.get(query)
+        if docs is not None:
+            return docs
+        docs = await self._asearch(query)
+        await self.cache.set(key, docs)
+        return docs
+
+    async def _asearch(self, query: str) -> List[Document]:
+        loop = asyncio.get_running_loop()
+        if self._is_summary_intent(query):
+            summary_docs = await loop.run_in_executor(self.executor, self._summary_documents, query)
+            if summary_docs:
+                return summary_docs
+
+        start = time.perf_counter()
+        top_k = self._candidate_k(query)
+        if self.shards is not None:
+            # Shards already run both legs in parallel per worker; one bounded call covers them
+            results = await self._run_leg("sharded", lambda: self._retrieve(query, top_k))
+            dense_results, sparse_results = results or ([], [])
         else:
-            # Standard Retrieval
-            dense_results = self.dense.retrieve(query, top_k=settings.RETRIEVAL_TOP_K)
-            sparse_results = self.sparse.retrieve(query, top_k=settings.RETRIEVAL_TOP_K)
-        
-        # 2. Merge (Deduplicate based on content or ID)
-        # Note: Since documents are objects, we use content as a hash for simple dedup
-        seen_content = set()
-        merged_docs = []
-        
-        # Simple interleave or score merge could be better, but appending unique is fine for reranker
-        for doc, score in dense_results:
-            if doc.page_content not in seen_content:
-                seen_content.add(doc.page_content)
-                merged_docs.append(doc)
-        
-        for doc, score in sparse_results:
-            if doc.page_content not in seen_content:
-                seen_content.add(doc.page_content)
-                merged_docs.append(doc)
-                
-        logger.info(f"Merged {len(merged_docs)} unique documents.")
-
-        # 3. Rerank
-        final_docs = self.reranker.rerank(query, merged_docs, top_k=settings.RERANK_TOP_K)
+            dense_results, sparse_results = await asyncio.gather(
+                self._run_leg("dense", lambda: self.dense.retrieve(query, top_k=top_k)),
+                self._run_leg("sparse", lambda: self.sparse.retrieve(query, top_k=top_k)),
+            )
+            dense_results, sparse_results = dense_results or [], sparse_results or []
+
+        return await loop.run_in_executor(self.executor, self._merge_and_rerank, query, dense_results, sparse_results, start)
+
+    async def _run_leg(self, name: str, fn: Callable):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        results, status = None, "ok"
+        try:
+            results = await asyncio.wait_for(loop.run_in_executor(self.executor, fn), timeout=settings.RETRIEVAL_LEG_TIMEOUT)
+        except asyncio.TimeoutError:
+            # The worker thread finishes in the background; its result is discarded
+            status = "timeout"
+        except Exception as e:
+            logger.error(f"{name} retrieval failed: {e}")
+            status = "error"
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.leg_latencies.setdefault(name, deque(maxlen=1000)).append(latency_ms)
+        logger.info(f"{name} leg: {status} in {latency_ms:.1f}ms")
+        return results
+
+    def leg_latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95 per retrieval leg over the most recent async searches."""
+        stats = {}
+        for name, samples in self.leg_latencies.items():
+            if samples:
+                p50, p95 = np.percentile(list(samples), [50, 95])
+                stats[name] = {"count": len(samples), "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2)}
+        return stats
+
+    def fuse(self, dense_results: List[Tuple[Document, float]],
+             sparse_results: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """
+        Fuses both legs by chunk ID into one ranked list of (doc, fused_score).
+        """
+        if settings.FUSION_METHOD == "weighted":
+            return weighted_score_fusion(dense_results, sparse_results, dense_weight=settings.FUSION_DENSE_WEIGHT)
+        return reciprocal_rank_fusion([dense_results, sparse_results], k=settings.RRF_K)
+
+    @staticmethod
+    def first_stage_confidence(dense_results: List[Tuple[Document, float]],
+                               sparse_results: List[Tuple[Document, float]], k: int) -> float:
+        """
+        Agreement between the legs: share of the dense top k that is also in the sparse top k.
+        Two independent signals picking the same chunks is a cheap proxy for an easy query.
+        """
+        if not dense_results or not sparse_results:
+            return 0.0
+        dense_ids = {MetadataStore.ensure_chunk_id(doc) for doc, _ in dense_results[:k]}
+        sparse_ids = {MetadataStore.ensure_chunk_id(doc) for doc, _ in sparse_results[:k]}
+        return len(dense_ids & sparse_ids) / max(min(k, len(dense_ids), len(sparse_ids)), 1)
+
+    def _merge_and_rerank(self, query: str, dense_results: List[Tuple[Document, float]],
+                          sparse_results: List[Tuple[Document, float]], start: Optional[float] = None) -> List[Document]:
+        # 2. Fuse (deduplicated by chunk ID, ranked by fused score)
+        fused = self.fuse(dense_results, sparse_results)
+
+        # 3. Candidate budget: only the best fused candidates reach the CrossEncoder
+        budget = settings.RERANK_CANDIDATE_BUDGET or len(fused)
+        candidates = [annotate(doc, fusion_score=float(score)) for doc, score in fused[:budget]]
+        logger.info(f"Fused {len(fused)} unique documents, reranking {len(candidates)}.")
+
+        # 4. Rerank: cascade within what is left of the search latency budget
+        budget_ms, confidence = None, 0.0
+        if settings.SEARCH_LATENCY_BUDGET_MS and start is not None:
+            remaining_ms = settings.SEARCH_LATENCY_BUDGET_MS - (time.perf_counter() - start) * 1000
+            budget_ms = max(remaining_ms, settings.RERANK_MIN_BUDGET_MS)
+            confidence = self.first_stage_confidence(dense_results, sparse_results, settings.RERANK_TOP_K)
+        final_docs = self.reranker.rerank(query, candidates, top_k=settings.RERANK_TOP_K,
+                                          budget_ms=budget_ms, first_stage_confidence=confidence)
         
         return final_docs
@@ -1,46 +1,210 @@
-from typing import List
+import hashlib
+import time
+from typing import List, Optional, Tuple
+import numpy as np
 from langchain_core.documents import Document
 from sentence_transformers import CrossEncoder
 from app.config.settings import settings
+from app.vectorstore.metadata_store import MetadataStore
+from app.retrieval.fusion import annotate
+from app.utils.cache import TTLCache
 from app.utils.logger import setup_logger
 
 from langsmith import traceable
 
 logger = setup_logger(__name__)
 
+def spearman(a: List[float], b: List[float]) -> float:
+    """Spearman rank correlation of two score lists (ties broken by position)."""
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
 class Reranker:
-    def __init__(self):
-        # Lightweight cross encoder
-        model_name = "cross-encoder/ms-marco-MiniLM-L-6-v2"
-        logger.info(f"Loading reranker model: {model_name}")
-        self.model = CrossEncoder(model_name)
+    # Lightweight cross encoder
+    MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    # Pairs of graded relevance for the load-time agreement check of the fast engine
+    PROBE_QUERY = "how does gradient descent update the weights"
+    PROBE_PASSAGES = [
+        "Gradient descent updates each weight by subtracting the learning rate times the gradient of the loss.",
+        "The weights move a small step against the gradient, scaled by the learning rate, after every batch.",
+        "Backpropagation computes the gradient of the loss with respect to every weight in the network.",
+        "A learning rate that is too large makes the loss oscillate instead of converging.",
+        "Stochastic gradient descent estimates the gradient from a random mini-batch of examples.",
+        "Adam keeps running averages of the gradients and their squares to adapt the step size per weight.",
+        "Overfitting happens when a model memorizes the training set instead of generalizing.",
+        "Convolutional layers share weights across positions of the input image.",
+        "The dataset was split into training, validation and test sets before training.",
+        "In this video we also look at how to deploy the model behind a REST API.",
+        "Thanks for watching, and remember to subscribe to the channel for more videos.",
+        "The recipe needs two cups of flour, one egg and a pinch of salt.",
+    ]
+
+    def __init__(self, backend: str = None):
+        self.backend = backend or settings.RERANKER_BACKEND
+        self.model = self._load_model()
+        self.agreement = None
+        if self.backend != "torch" and settings.RERANKER_MIN_AGREEMENT > 0:
+            self._check_agreement()
+        # Scores keyed by (query hash, chunk ID): multi-turn chats rerank the same chunks repeatedly
+        self.score_cache = TTLCache(max_entries=settings.RERANK_CACHE_MAX_ENTRIES)
+        self.pairs_requested = 0
+        self.pairs_scored = 0
+        self.cascade_skips = 0
+        self.cascade_early_stops = 0
+
+    def _load_model(self) -> CrossEncoder:
+        """
+        "torch": fp32 PyTorch (default).
+        "onnx": int8-quantized ONNX export of the same model via onnxruntime (fast mode).
+        Both truncate pairs at RERANK_MAX_LENGTH tokens.
+        """
+        logger.info(f"Loading reranker model: {self.MODEL_NAME} ({self.backend})")
+        if self.backend == "onnx":
+            return CrossEncoder(
+                self.MODEL_NAME,
+                max_length=settings.RERANK_MAX_LENGTH,
+                backend="onnx",
+                model_kwargs={"file_name": settings.RERANKER_ONNX_FILE}
+            )
+        return CrossEncoder(self.MODEL_NAME, max_length=settings.RERANK_MAX_LENGTH)
+
+    def _check_agreement(self):
+        """
+        Compares this engine's ranking of the probe pairs with fp32 torch (the model the
+        thresholds were tuned on) and warns if they disagree. The torch model is loaded only
+        for the check; a failed check is logged, never fatal.
+        """
+        pairs = [[self.PROBE_QUERY, passage] for passage in self.PROBE_PASSAGES]
+        try:
+            reference = CrossEncoder(self.MODEL_NAME, max_length=settings.RERANK_MAX_LENGTH)
+            ref_scores = reference.predict(pairs, show_progress_bar=False)
+            self.agreement = spearman(ref_scores, self.predict(pairs))
+        except Exception as e:
+            logger.warning(f"Reranker agreement check skipped: {e}")
+            return
+        if self.agreement < settings.RERANKER_MIN_AGREEMENT:
+            logger.warning(f"Reranker backend '{self.backend}' ranks differently from fp32 torch "
+                           f"(Spearman {self.agreement:.3f} < {settings.RERANKER_MIN_AGREEMENT}); "
+                           f"check RERANKER_ONNX_FILE or use RERANKER_BACKEND=torch.")
+        else:
+            logger.info(f"Reranker backend '{self.backend}' agrees with fp32 torch (Spearman {self.agreement:.3f}).")
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        """
+        Scores pairs in length buckets: sorted by length, each batch pads only to
+        its own longest pair instead of the longest chunk overall. Returns scores in input order.
+        """
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+        sorted_scores = self.model.predict(
+            [pairs[i] for i in order], batch_size=settings.RERANK_BATCH_SIZE, show_progress_bar=False
+        )
+        scores = [0.0] * len(pairs)
+        for i, score in zip(order, sorted_scores):
+            scores[i] = float(score)
+        return scores
+
+    def _score(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        CrossEncoder scores for (query, doc) pairs. Only pairs missing from the score cache
+        go through the model.
+        """
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        keys = [(query_hash, MetadataStore.ensure_chunk_id(doc)) for doc in documents]
+        scores = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        
+        if missing:
+            # Prepare pairs [query, doc_text] and predict scores for the unseen ones
+            pairs = [[query, documents[i].page_content] for i in missing]
+            for i, score in zip(missing, self.predict(pairs)):
+                scores[i] = float(score)
+                self.score_cache.set(keys[i], scores[i])
+        self.pairs_requested += len(documents)
+        self.pairs_scored += len(missing)
+        return scores
 
     @traceable(name="rerank", run_type="retriever")
-    def rerank(self, query: str, documents: List[Document], top_k: int = 4) -> List[Document]:
+    def rerank(self, query: str, documents: List[Document], top_k: int = 4,
+               budget_ms: Optional[float] = None, first_stage_confidence: float = 0.0) -> List[Document]:
         """
         Reranks a list of documents based on relevance to the query.
+
+        Cascade mode (budget_ms given): `documents` must be in first-stage order (fused scores).
+        - If first_stage_confidence >= RERANK_SKIP_CONFIDENCE, the first-stage order is kept as is.
+        - Otherwise candidates are scored in batches, most promising first, until the budget is
+          spent or a batch no longer changes the top k. The first batch is scored even if the
+          budget is already spent. Unscored candidates keep their first-stage order behind the
+          scored ones.
+
+        Returned documents are copies. Their `relevance_score` is the CrossEncoder score, or None
+        for documents the cascade did not score (their first-stage score stays in `fusion_score`).
         """
         if not documents:
             return []
+
+        if budget_ms is not None and first_stage_confidence >= settings.RERANK_SKIP_CONFIDENCE:
+            logger.info(f"First stage confident ({first_stage_confidence:.2f}); skipping rerank.")
+            self.cascade_skips += 1
+            return [annotate(doc, relevance_score=None) for doc in documents[:top_k]]
             
         logger.info(f"Reranking {len(documents)} documents...")
         
-        # Prepare pairs [query, doc_text]
-        pairs = [[query, doc.page_content] for doc in documents]
-        
-        # Predict scores
-        scores = self.model.predict(pairs)
-        
-        # Combine docs with scores
-        doc_scores = list(zip(documents, scores))
+        if budget_ms is None:
+            scored = list(zip(documents, self._score(query, documents)))
+        else:
+            scored = self._cascade(query, documents, top_k, budget_ms)
         
         # Sort by score descending
-        doc_scores.sort(key=lambda x: x[1], reverse=True)
+        scored.sort(key=lambda x: x[1], reverse=True)
         
-        # Return top k docs with scores in metadata
-        final_docs = []
-        for doc, score in doc_scores[:top_k]:
-            doc.metadata['relevance_score'] = float(score)
-            final_docs.append(doc)
+        # Return top k docs with scores in metadata (on copies: the inputs may be shared objects)
+        final_docs = [annotate(doc, relevance_score=float(score)) for doc, score in scored[:top_k]]
+        # Budget ran out before k candidates were scored: fill up in first-stage order.
+        # They were never scored, so any relevance_score they carry is not for this query.
+        final_docs.extend(annotate(doc, relevance_score=None)
+                          for doc in documents[len(scored):len(scored) + top_k - len(final_docs)])
             
         return final_docs
+
+    def _cascade(self, query: str, documents: List[Document], top_k: int, budget_ms: float) -> List[Tuple[Document, float]]:
+        start = time.perf_counter()
+        batch_size = settings.RERANK_CASCADE_BATCH
+        scored: List[Tuple[Document, float]] = []
+        top_ids = None
+
+        for i in range(0, len(documents), batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # Stop before a batch that would (by the last batch's cost) overrun the budget. The first
+            # batch is always scored: an exhausted budget means a small rerank, not an unscored one.
+            last_batch_ms = elapsed_ms / (i // batch_size) if i else 0.0
+            if i and elapsed_ms + last_batch_ms > budget_ms:
+                logger.info(f"Rerank budget reached after {len(scored)}/{len(documents)} candidates.")
+                self.cascade_early_stops += 1
+                break
+
+            batch = documents[i:i + batch_size]
+            scored.extend(zip(batch, self._score(query, batch)))
+
+            new_top_ids = {id(doc) for doc, _ in sorted(scored, key=lambda x: x[1], reverse=True)[:top_k]}
+            if top_ids is not None and len(scored) >= top_k and new_top_ids == top_ids:
+                logger.info(f"Top {top_k} stable after {len(scored)}/{len(documents)} candidates.")
+                self.cascade_early_stops += 1
+                break
+            top_ids = new_top_ids
+        return scored
+
+    def stats(self) -> dict:
+        saved = self.pairs_requested - self.pairs_scored
+        return {
+            "pairs_requested": self.pairs_requested,
+            "forward_passes": self.pairs_scored,
+            "forward_passes_saved": saved,
+            "hit_ratio": round(saved / self.pairs_requested, 4) if self.pairs_requested else 0.0,
+            "cache_entries": len(self.score_cache),
+            "cascade_skips": self.cascade_skips,
+            "cascade_early_stops": self.cascade_early_stops,
+            "backend": self.backend,
+            "agreement_with_torch": self.agreement,
+        }
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import re
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from app.db.redis_client import RedisClient
+from app.vectorstore.metadata_store import MetadataStore
+from app.utils.cache import TTLCache
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class CorpusVersion:
+    """
+    Counter bumped on every ingest. Cache keys include it, so entries computed
+    against an older corpus are never served. Shared through Redis across workers.
+
+    A bump that cannot reach Redis cannot reach the other workers either, so until it is
+    published (retried on every `get`) the version is reported as unknown and the caches
+    keyed on it are bypassed. The same holds while the version cannot be read.
+    """
+    KEY = "corpus:version"
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self.current = 0
+        self.shared = True
+        self._unpublished_bumps = 0
+
+    async def get(self) -> Optional[int]:
+        """The shared version, or None if it is unknown (caches must not be used)."""
+        try:
+            if self._unpublished_bumps:
+                await self._publish()
+            value = await self.redis.get_value(self.KEY)
+            self.current = int(value or 0)
+            self.shared = True
+        except Exception as e:
+            logger.warning(f"Corpus version unavailable from Redis, bypassing caches: {e}")
+            self.shared = False
+            return None
+        return self.current
+
+    async def bump(self) -> Optional[int]:
+        self._unpublished_bumps += 1
+        try:
+            await self._publish()
+        except Exception as e:
+            logger.warning(f"Corpus version bump failed in Redis, bypassing caches until it is published: {e}")
+            self.shared = False
+            return None
+        logger.info(f"Corpus version is now {self.current}")
+        return self.current
+
+    async def _publish(self):
+        # Several ingests during an outage need only one increment: any new value invalidates
+        self.current = await self.redis.incr(self.KEY)
+        self._unpublished_bumps = 0
+        self.shared = True
+
+
+class RetrievalCache:
+    """
+    Two-tier cache of hybrid search results: an in-process LRU in front of Redis.
+    Keyed by (normalized query, corpus version). Only chunk IDs and scores are
+    stored; documents are rehydrated from the MetadataStore on a hit.
+    """
+    PREFIX = "retrieval:"
+
+    def __init__(self, metadata_store: MetadataStore, redis_client: RedisClient, corpus_version: CorpusVersion):
+        self.metadata_store = metadata_store
+        self.redis = redis_client
+        self.corpus_version = corpus_version
+        self.local = TTLCache(max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES, ttl=settings.RETRIEVAL_CACHE_LOCAL_TTL)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        query = re.sub(r"\s+", " ", query.lower()).strip()
+        return query.strip(" ?.!\"'")
+
+    def make_key(self, query: str, version: int) -> str:
+        payload = json.dumps([self.normalize_query(query), version])
+        return self.PREFIX + hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _hydrate(self, entries: List[list]) -> Optional[List[Document]]:
+        docs = self.metadata_store.get_documents([chunk_id for chunk_id, _ in entries])
+        if any(doc is None for doc in docs):
+            return None  # chunk no longer stored: treat as a miss
+        for doc, (_, score) in zip(docs, entries):
+            doc.metadata['relevance_score'] = score
+        return docs
+
+    async def get(self, query: str) -> Tuple[Optional[List[Document]], Optional[str]]:
+        """
+        Returns (documents or None, key). Pass the key back to `set` so the entry is stored
+        under the corpus version the search started with, even if an ingest lands meanwhile.
+        The key is None (nothing is served or stored) while the corpus version is unknown.
+        """
+        version = await self.corpus_version.get()
+        if version is None:
+            self.bypassed += 1
+            return None, None
+        key = self.make_key(query, version)
+
+        entries, tier = self.local.get(key), "local"
+        if entries is None:
+            tier = "redis"
+            try:
+                raw = await self.redis.get_value(key)
+            except Exception as e:
+                logger.warning(f"Retrieval cache Redis lookup failed: {e}")
+                raw = None
+            entries = json.loads(raw) if raw is not None else None
+
+        docs = self._hydrate(entries) if entries is not None else None
+        if docs is None:
+            self.misses += 1
+            return None, key
+        if tier == "local":
+            self.local_hits += 1
+        else:
+            self.redis_hits += 1
+            self.local.set(key, entries)
+        logger.info(f"Retrieval cache hit ({tier}) for: {query}")
+        return docs, key
+
+    async def set(self, key: Optional[str], documents: List[Document]):
+        # Only chunk-backed results can be rehydrated (precomputed summaries are served directly)
+        if key is None or not documents or any(not doc.metadata.get("chunk_id") for doc in documents):
+            return
+        entries = [[doc.metadata["chunk_id"], doc.metadata.get("relevance_score")] for doc in documents]
+        self.local.set(key, entries)
+        try:
+            await self.redis.set_value(key, json.dumps(entries), expire=settings.RETRIEVAL_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Retrieval cache Redis write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+        }
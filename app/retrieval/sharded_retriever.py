@@ -0,0 +1,318 @@
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.config.settings import settings
+from app.embeddings.embedding_model import EmbeddingModel
+from app.vectorstore.metadata_store import MetadataStore
+from app.utils.logger import setup_logger
+
+from langsmith import traceable
+
+logger = setup_logger(__name__)
+
+
+def shard_for_source(source: str, num_shards: int) -> int:
+    """
+    Stable source -> shard mapping (Python's hash() is salted per process).
+    All chunks of one video/PDF land on the same shard.
+    """
+    return int(hashlib.md5(source.encode("utf-8")).hexdigest(), 16) % num_shards
+
+
+def _shard_worker(shard_dir: str, conn):
+    """
+    Worker process loop. Owns one FAISS index and one BM25 index under `shard_dir`.
+    Requests are handled in arrival order:
+      (request_id, "search", query, query_embedding, dense_k, sparse_k) | (request_id, "add", chunks) | (None, "stop")
+    Replies: (request_id, "ok", payload) | (request_id, "error", message)
+    The ready message carries the number of chunks the shard already holds.
+    """
+    # Imported here so the parent does not need these modules loaded before spawning
+    from app.vectorstore.faiss_store import FaissVectorStore
+    from app.retrieval.dense_retriever import DenseRetriever
+    from app.retrieval.sparse_retriever import SparseRetriever
+
+    try:
+        vector_store = FaissVectorStore(index_path=os.path.join(shard_dir, "faiss_index"))
+        metadata_store = MetadataStore(db_path=os.path.join(shard_dir, "metadata.sqlite"))
+        dense = DenseRetriever(vector_store)
+        sparse = SparseRetriever(metadata_store, index_dir=os.path.join(shard_dir, "bm25_index"))
+    except Exception as e:
+        conn.send(("error", str(e)))
+        conn.close()
+        return
+    num_docs = max(sparse.bm25.num_docs if sparse.bm25 is not None else 0,
+                   vector_store.vector_store.index.ntotal if vector_store.vector_store is not None else 0)
+    conn.send(("ok", num_docs))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        request_id, op = request[0], request[1]
+        if op == "stop":
+            break
+        try:
+            if op == "search":
+                _, _, query, query_embedding, dense_k, sparse_k = request
+                payload = (dense.retrieve(query, top_k=dense_k, query_embedding=query_embedding),
+                           sparse.retrieve(query, top_k=sparse_k))
+            elif op == "add":
+                chunks = request[2]
+                vector_store.add_documents(chunks)
+                sparse.add_documents([
+                    Document(page_content=c['text'], metadata={k: v for k, v in c.items() if k != 'text'})
+                    for c in chunks
+                ])
+                payload = len(chunks)
+            else:
+                conn.send((request_id, "error", f"Unknown op: {op}"))
+                continue
+            conn.send((request_id, "ok", payload))
+        except Exception as e:
+            conn.send((request_id, "error", str(e)))
+    conn.close()
+
+
+class _ShardConnection:
+    """
+    Request queue to one shard process. Any number of callers can have requests in flight:
+    sends are serialized by a short lock, and a reader thread hands each reply to the Future
+    of its request ID. Nothing is held while the shard works, so concurrent queries pipeline
+    through the shards instead of waiting for each other's round trips.
+    """
+    def __init__(self, index: int, conn):
+        self.index = index
+        self.conn = conn
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._alive = True
+        self._reader = threading.Thread(target=self._read_replies, name=f"retrieval-shard-{index}", daemon=True)
+
+    def start(self):
+        self._reader.start()
+
+    def submit(self, request: tuple) -> Future:
+        future = Future()
+        request_id = next(self._ids)
+        with self._pending_lock:
+            if not self._alive:
+                future.set_exception(RuntimeError("shard process is not running"))
+                return future
+            self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self.conn.send((request_id,) + request)
+        except (OSError, BrokenPipeError) as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            future.set_exception(e)
+        return future
+
+    def _read_replies(self):
+        while True:
+            try:
+                request_id, status, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._pending_lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+        # The process exited: fail whatever was still waiting on it
+        with self._pending_lock:
+            self._alive = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("shard process exited"))
+
+    def stop(self):
+        try:
+            with self._send_lock:
+                self.conn.send((None, "stop"))
+        except (OSError, BrokenPipeError):
+            pass
+
+
+class ShardedRetriever:
+    """
+    Scatter-gather retrieval over N shard worker processes.
+    The corpus is partitioned by source; each query fans out to every shard over a pipe
+    and the per-shard top-k lists are merged. A shard that fails or does not answer within
+    SHARD_SEARCH_TIMEOUT contributes nothing to that query.
+
+    The query is embedded once here and the vector is sent to the shards.
+
+    Switching an existing deployment to sharded mode: on first start the chunks of
+    `source_store` (the unsharded corpus's metadata store) are split into the shards. The
+    shard count is recorded in shards_dir/manifest.json, and a start with a different count
+    is refused, because chunks would no longer be on the shard their source hashes to.
+
+    Note: BM25 idf is computed per shard, so sparse scores are comparable across shards
+    only approximately (sources are spread by hash, which keeps the term statistics similar).
+    """
+    MANIFEST_FILE = "manifest.json"
+    MIGRATION_BATCH = 1000
+
+    def __init__(self, num_shards: int = None, shards_dir: str = None, source_store: Optional[MetadataStore] = None):
+        self.num_shards = num_shards or settings.RETRIEVAL_SHARDS
+        self.shards_dir = shards_dir or settings.SHARDS_DIR
+        self.embeddings = EmbeddingModel.get_embedding_model()
+        os.makedirs(self.shards_dir, exist_ok=True)
+        self._has_manifest()  # fail fast, before any worker is spawned
+        # spawn: the workers load torch/FAISS, which are not fork-safe once initialized
+        ctx = mp.get_context("spawn")
+
+        self._shards: List[_ShardConnection] = []
+        self._processes = []
+        for i in range(self.num_shards):
+            shard_dir = os.path.join(self.shards_dir, f"shard_{i}")
+            os.makedirs(shard_dir, exist_ok=True)
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=_shard_worker, args=(shard_dir, child_conn), daemon=True)
+            process.start()
+            self._shards.append(_ShardConnection(i, parent_conn))
+            self._processes.append(process)
+
+        # Wait for every shard to finish loading its indexes
+        shard_docs = 0
+        for shard in self._shards:
+            if not shard.conn.poll(settings.SHARD_STARTUP_TIMEOUT):
+                status, payload = "error", f"not ready after {settings.SHARD_STARTUP_TIMEOUT}s"
+            else:
+                try:
+                    status, payload = shard.conn.recv()
+                except EOFError:
+                    status, payload = "error", "process exited"
+            if status != "ok":
+                self.close()
+                raise RuntimeError(f"Retrieval shard {shard.index} failed to start: {payload}")
+            shard.start()
+            shard_docs += payload
+            logger.info(f"Retrieval shard {shard.index} ready ({payload} chunks).")
+
+        if not self._has_manifest():
+            try:
+                if source_store is not None and source_store.count():
+                    self._migrate(source_store, shard_docs)
+                self._write_manifest()
+            except Exception:
+                self.close()
+                raise
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.shards_dir, self.MANIFEST_FILE)
+
+    def _has_manifest(self) -> bool:
+        """
+        Refuses a shards_dir partitioned for another shard count: its chunks would no longer be
+        on the shard their source hashes to. No manifest means the corpus was not split yet.
+        """
+        if not os.path.exists(self._manifest_path()):
+            return False
+        with open(self._manifest_path(), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("num_shards") != self.num_shards:
+            raise RuntimeError(
+                f"{self.shards_dir} is partitioned into {manifest.get('num_shards')} shards, not {self.num_shards}. "
+                f"Set RETRIEVAL_SHARDS={manifest.get('num_shards')}, or remove the directory to re-split "
+                f"the corpus from the metadata store."
+            )
+        return True
+
+    def _write_manifest(self):
+        # Written only once the split is complete; an interrupted split is redone on the next
+        # start (chunks already in a shard are skipped)
+        with open(self._manifest_path(), "w", encoding="utf-8") as f:
+            json.dump({"num_shards": self.num_shards}, f)
+
+    def _migrate(self, source_store: MetadataStore, shard_docs: int):
+        total = source_store.count()
+        logger.info(f"Splitting the existing corpus ({total} chunks) into {self.num_shards} shards "
+                    f"({shard_docs} already sharded)...")
+        batch = []
+        for doc in source_store.iter_documents():
+            batch.append({"text": doc.page_content, **doc.metadata})
+            if len(batch) >= self.MIGRATION_BATCH:
+                self.add_documents(batch)
+                batch = []
+        if batch:
+            self.add_documents(batch)
+        logger.info(f"Corpus split into {self.num_shards} shards.")
+
+    def _scatter_gather(self, requests: Dict[int, tuple], timeout: float) -> Dict[int, object]:
+        """
+        Queues each shard its request, then collects the replies within one shared deadline.
+        Shards work in parallel; a failed or timed-out shard contributes nothing.
+        """
+        futures = {i: self._shards[i].submit(request) for i, request in requests.items()}
+        deadline = time.monotonic() + timeout
+        results = {}
+        for i, future in futures.items():
+            try:
+                results[i] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                logger.error(f"Shard {i} did not answer within {timeout}s.")
+            except Exception as e:
+                logger.error(f"Shard {i} failed: {e}")
+        return results
+
+    @traceable(name="sharded_retrieval", run_type="retriever")
+    def retrieve(self, query: str, dense_k: int, sparse_k: int,
+                 query_embedding: List[float] = None) -> Tuple[List[Tuple[Document, float]], List[Tuple[Document, float]]]:
+        """
+        Returns (dense_results, sparse_results) merged across shards, in the same
+        shape as DenseRetriever.retrieve / SparseRetriever.retrieve.
+        """
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(query)
+        request = ("search", query, list(query_embedding), dense_k, sparse_k)
+        replies = self._scatter_gather({i: request for i in range(self.num_shards)},
+                                      timeout=settings.SHARD_SEARCH_TIMEOUT)
+
+        dense_results, sparse_results = [], []
+        for shard_dense, shard_sparse in replies.values():
+            dense_results.extend(shard_dense)
+            sparse_results.extend(shard_sparse)
+
+        # FAISS returns L2 distances (lower is better); BM25 scores are higher-is-better
+        dense_results.sort(key=lambda x: x[1])
+        sparse_results.sort(key=lambda x: x[1], reverse=True)
+        return dense_results[:dense_k], sparse_results[:sparse_k]
+
+    def add_documents(self, chunks: List[dict]):
+        """
+        Routes chunk dicts (chunker output) to their source's shard.
+        """
+        by_shard: Dict[int, List[dict]] = {}
+        for chunk in chunks:
+            shard = shard_for_source(MetadataStore.source_of(chunk), self.num_shards)
+            by_shard.setdefault(shard, []).append(chunk)
+
+        replies = self._scatter_gather({i: ("add", shard_chunks) for i, shard_chunks in by_shard.items()},
+                                      timeout=settings.SHARD_INDEX_TIMEOUT)
+        if len(replies) != len(by_shard):
+            raise RuntimeError("Indexing failed on one or more retrieval shards.")
+        logger.info(f"Indexed {len(chunks)} chunks across {len(by_shard)} shard(s).")
+
+    def close(self):
+        for shard in self._shards:
+            shard.stop()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
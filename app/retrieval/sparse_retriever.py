@@ -1,8 +1,10 @@
 import pickle
 import os
+import threading
 from typing import List, Tuple
 from langchain_core.documents import Document
-from rank_bm25 import BM25Okapi
+from app.retrieval.bm25_index import BM25Index
+from app.vectorstore.metadata_store import MetadataStore
 from app.config.settings import settings
 from app.utils.logger import setup_logger
 from langsmith import traceable
@@ -10,67 +12,100 @@ from langsmith import traceable
 logger = setup_logger(__name__)
 
 class SparseRetriever:
-    def __init__(self):
+    def __init__(self, metadata_store: MetadataStore = None, index_dir: str = None):
         self.bm25 = None
-        self.documents = []
-        self.index_path = os.path.join(settings.DATA_DIR, "bm25_index.pkl")
+        self.metadata_store = metadata_store or MetadataStore()
+        self.index_dir = index_dir or os.path.join(settings.DATA_DIR, "bm25_index")
+        # Only the default (unsharded) index has a legacy pickle to migrate
+        self.legacy_index_path = None if index_dir else os.path.join(settings.DATA_DIR, "bm25_index.pkl")
+        # Serializes ingests (index updates and saves); searches never take it
+        self._write_lock = threading.RLock()
         self.load_index()
 
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        return text.lower().split()
+
     def create_index(self, documents: List[Document]):
         """
         Creates BM25 index from documents.
         documents: List of LangChain Documents.
         """
         logger.info(f"Creating BM25 index with {len(documents)} documents...")
-        self.documents = documents
-        self._build()
+        with self._write_lock:
+            # Built aside and swapped in, so searches meanwhile keep using the previous index
+            bm25 = BM25Index()
+            self.metadata_store.add_documents(documents)
+            bm25.add_documents([self._tokenize(doc.page_content) for doc in documents],
+                               [doc.metadata["chunk_id"] for doc in documents])
+            self.bm25 = bm25
+            self.save_index()
 
     def add_documents(self, documents: List[Document]):
         """
-        Adds documents to the existing index and rebuilds it.
+        Adds documents to the existing index.
+        Only the new documents are tokenized; existing postings are merged.
+        Chunk payloads go to the metadata store, the index keeps their chunk IDs
+        (chunks already indexed, e.g. from a re-ingested source, are not added twice).
         """
-        logger.info(f"Adding {len(documents)} documents to BM25 index...")
-        self.documents.extend(documents)
-        self._build()
-
-    def _build(self):
-        tokenized_corpus = [doc.page_content.lower().split() for doc in self.documents]
-        self.bm25 = BM25Okapi(tokenized_corpus)
-        self.save_index()
+        with self._write_lock:
+            if self.bm25 is None:
+                self.create_index(documents)
+                return
+            self.metadata_store.add_documents(documents)
+            added = self.bm25.add_documents(
+                [self._tokenize(doc.page_content) for doc in documents],
+                [doc.metadata["chunk_id"] for doc in documents]
+            )
+            logger.info(f"Added {added} of {len(documents)} documents to BM25 index.")
+            self.save_index()
 
     def save_index(self):
-        with open(self.index_path, "wb") as f:
-            pickle.dump((self.bm25, self.documents), f)
+        self.bm25.save(self.index_dir)
         logger.info("BM25 index saved.")
 
     def load_index(self):
-        if os.path.exists(self.index_path):
-            try:
-                with open(self.index_path, "rb") as f:
-                    self.bm25, self.documents = pickle.load(f)
-                logger.info("BM25 index loaded.")
-            except Exception as e:
-                logger.error(f"Failed to load BM25 index: {e}")
-                self.bm25 = None
+        try:
+            self.bm25 = BM25Index.load(self.index_dir)
+        except Exception as e:
+            logger.error(f"Failed to load BM25 index: {e}")
+            self.bm25 = None
+
+        if self.bm25 is not None:
+            logger.info(f"BM25 index loaded ({self.bm25.num_docs} documents).")
+        elif self.legacy_index_path and os.path.exists(self.legacy_index_path):
+            self._migrate_legacy_index()
+        elif os.path.exists(self.index_dir) and self.metadata_store.count():
+            # Unknown format version: rebuild from the chunks in the metadata store
+            logger.info("BM25 index format changed. Rebuilding from metadata store...")
+            self.create_index(list(self.metadata_store.iter_documents()))
         else:
             logger.info("No BM25 index found.")
 
+    def _migrate_legacy_index(self):
+        """
+        One-time migration from the pickled (BM25Okapi, documents) tuple.
+        The pickle is renamed afterwards so it is never loaded again.
+        """
+        logger.info(f"Migrating legacy BM25 pickle: {self.legacy_index_path}")
+        try:
+            with open(self.legacy_index_path, "rb") as f:
+                _, documents = pickle.load(f)
+            self.create_index(documents)
+            os.replace(self.legacy_index_path, f"{self.legacy_index_path}.migrated")
+            logger.info(f"Migrated {len(documents)} documents to {self.index_dir}")
+        except Exception as e:
+            logger.error(f"Failed to migrate legacy BM25 index: {e}")
+            self.bm25 = None
+
     @traceable(name="sparse_retrieval", run_type="retriever")
     def retrieve(self, query: str, top_k: int = 10) -> List[Tuple[Document, float]]:
-        if not self.bm25 or not self.documents:
+        bm25 = self.bm25  # create_index may swap in a new index meanwhile
+        if not bm25 or not bm25.num_docs:
             logger.warning("BM25 index is empty.")
             return []
-        
-        tokenized_query = query.lower().split()
-        scores = self.bm25.get_scores(tokenized_query)
-        top_n = self.bm25.get_top_n(tokenized_query, self.documents, n=top_k)
-        
-        # We need to map back to get scores for these top_n
-        # This is a bit inefficient with rank_bm25 unmodified, so we do it manually
-        doc_scores = []
-        # Zip all scores with docs
-        all_doc_scores = zip(self.documents, scores)
-        # Sort by score desc
-        sorted_docs = sorted(all_doc_scores, key=lambda x: x[1], reverse=True)
-        
-        return sorted_docs[:top_k]
+
+        # Single scoring pass over the query terms' postings, then argpartition for the top k
+        chunk_ids, scores = bm25.search(self._tokenize(query), top_k)
+        documents = self.metadata_store.get_documents(chunk_ids)
+        return [(doc, float(score)) for doc, score in zip(documents, scores) if doc is not None]
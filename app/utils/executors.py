@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class ExecutorQueueFull(RuntimeError):
+    """Raised when a BoundedExecutor already has queue_size jobs waiting."""
+
+
+class BoundedExecutor:
+    """
+    Sized thread pool for blocking work called from async code (model inference, disk, network SDKs).
+
+    At most `max_workers` jobs run at once and at most `queue_size` more wait for a slot; beyond
+    that `run` raises ExecutorQueueFull so callers can shed load instead of piling up work.
+    The event loop itself never blocks: waiting happens on an asyncio semaphore.
+    """
+    def __init__(self, name: str, max_workers: int, queue_size: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self.waiting >= self.queue_size and self._slots.locked():
+            self.rejected += 1
+            raise ExecutorQueueFull(f"{self.name} executor queue is full ({self.queue_size} waiting)")
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
@@ -1,19 +1,29 @@
 import os
 import shutil
-from typing import List, Optional
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from app.embeddings.embedding_model import EmbeddingModel
 from app.config.settings import settings
+from app.utils.locks import ReadWriteLock
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 class FaissVectorStore:
-    def __init__(self):
+    def __init__(self, index_path: str = None):
         self.embeddings = EmbeddingModel.get_embedding_model()
-        self.index_path = settings.VECTORSTORE_DIR
+        self.index_path = index_path or settings.VECTORSTORE_DIR
         self.vector_store: Optional[FAISS] = None
+        # chunk_id -> position in the FAISS index, rebuilt when the index grows
+        self._positions: Dict[str, int] = {}
+        self._positions_size = 0
+        # Searches hold the read lock; appending to the index and swapping it in need the write lock.
+        # Ingests are serialized separately and embed their chunks before taking the write lock.
+        self._lock = ReadWriteLock()
+        self._ingest_lock = threading.RLock()
         self.load_index()
 
     def load_index(self):
@@ -34,6 +44,10 @@ class FaissVectorStore:
             logger.info("No existing FAISS index found.")
             self.vector_store = None
 
+    @staticmethod
+    def _texts_and_metadatas(chunks: List[dict]) -> Tuple[List[str], List[dict]]:
+        return [c['text'] for c in chunks], [{k: v for k, v in c.items() if k != 'text'} for c in chunks]
+
     def create_index(self, chunks: List[dict]):
         """
         Creates a new FAISS index from enriched chunks.
@@ -43,37 +57,92 @@ class FaissVectorStore:
             logger.warning("No chunks provided to create index.")
             return
 
-        documents = []
-        for chunk in chunks:
-            doc = Document(
-                page_content=chunk['text'],
-                metadata={k: v for k, v in chunk.items() if k != 'text'}
-            )
-            documents.append(doc)
-
-        logger.info(f"Creating FAISS index with {len(documents)} documents...")
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
-        self.save_index()
+        with self._ingest_lock:
+            texts, metadatas = self._texts_and_metadatas(chunks)
+            logger.info(f"Creating FAISS index with {len(texts)} documents...")
+            # Built aside and swapped in: searches keep using the previous index meanwhile
+            vectors = self.embeddings.embed_documents(texts)
+            vector_store = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas)
+            with self._lock.write():
+                self.vector_store = vector_store
+            self.save_index()
 
     def add_documents(self, chunks: List[dict]):
-        """Adds documents to existing index or creates new one."""
-        if self.vector_store is None:
-            self.create_index(chunks)
-        else:
-            documents = [
-                Document(page_content=c['text'], metadata={k: v for k, v in c.items() if k != 'text'}) 
-                for c in chunks
-            ]
-            self.vector_store.add_documents(documents)
+        """
+        Adds documents to existing index or creates new one. Chunks whose chunk_id is already
+        indexed (a re-ingested source) are skipped, so the index never holds duplicates.
+        """
+        with self._ingest_lock:
+            with self._lock.read():
+                known = set(self._chunk_positions()) if self.vector_store is not None else set()
+            new_chunks = []
+            for chunk in chunks:
+                chunk_id = chunk.get("chunk_id")
+                if chunk_id is None or chunk_id not in known:
+                    new_chunks.append(chunk)
+                    if chunk_id is not None:
+                        known.add(chunk_id)
+            if len(new_chunks) < len(chunks):
+                logger.info(f"Skipping {len(chunks) - len(new_chunks)} chunks already in the FAISS index.")
+            if not new_chunks:
+                return
+            if self.vector_store is None:
+                self.create_index(new_chunks)
+                return
+
+            texts, metadatas = self._texts_and_metadatas(new_chunks)
+            # Embedding is the slow part and runs unlocked; only the append itself blocks searches
+            vectors = self.embeddings.embed_documents(texts)
+            with self._lock.write():
+                self.vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
             self.save_index()
 
     def save_index(self):
         """Saves the index to disk."""
-        if self.vector_store:
-            if not os.path.exists(self.index_path):
-                os.makedirs(self.index_path)
-            self.vector_store.save_local(self.index_path)
-            logger.info(f"FAISS index saved to {self.index_path}")
+        with self._lock.read():
+            if self.vector_store:
+                if not os.path.exists(self.index_path):
+                    os.makedirs(self.index_path)
+                self.vector_store.save_local(self.index_path)
+                logger.info(f"FAISS index saved to {self.index_path}")
+
+    def similarity_search_with_score(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """(Document, L2 distance) of the k nearest chunks to the query."""
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Like `similarity_search_with_score` for an already embedded query."""
+        with self._lock.read():
+            if not self.vector_store:
+                return []
+            return self.vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+
+    def get_vectors(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Stored embeddings by chunk ID, reconstructed from the index (no re-encoding).
+        Unknown chunk IDs are left out.
+        """
+        with self._lock.read():
+            if not self.vector_store:
+                return {}
+            positions = self._chunk_positions()
+            index = self.vector_store.index
+            return {
+                chunk_id: index.reconstruct(positions[chunk_id])
+                for chunk_id in chunk_ids if chunk_id in positions
+            }
+
+    def _chunk_positions(self) -> Dict[str, int]:
+        """chunk_id -> position in the FAISS index, rebuilt when the index has grown. Needs the read lock."""
+        index = self.vector_store.index
+        if self._positions_size != index.ntotal:
+            positions = {}
+            for position, doc_id in self.vector_store.index_to_docstore_id.items():
+                doc = self.vector_store.docstore.search(doc_id)
+                if isinstance(doc, Document) and doc.metadata.get("chunk_id"):
+                    positions[doc.metadata["chunk_id"]] = position
+            self._positions, self._positions_size = positions, index.ntotal
+        return self._positions
 
     def as_retriever(self, search_kwargs: dict = None):
         if not self.vector_store:
@@ -1,7 +1,97 @@
-# Mostly handled by FAISS, but kept for structure compliance
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+from langchain_core.documents import Document
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
 class MetadataStore:
     """
-    Helper class for metadata filtering or external metadata storage if needed.
-    Currently, metadata is stored directly in the VectorStore chunks.
+    Chunk text and metadata keyed by stable chunk ID.
+    Indexes (BM25, caches) keep only chunk IDs and resolve them here, so the chunk
+    payload is stored once on disk instead of inside every index file.
     """
-    pass
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.path.join(settings.DATA_DIR, "metadata.sqlite")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "chunk_id TEXT PRIMARY KEY, source TEXT, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_source ON chunks (source)")
+        self.conn.commit()
+
+    @staticmethod
+    def source_of(metadata: dict) -> str:
+        """The ingest unit a chunk belongs to: YouTube video ID or PDF filename."""
+        return str(metadata.get("video_id") or metadata.get("source") or "")
+
+    @staticmethod
+    def make_chunk_id(text: str, metadata: dict) -> str:
+        """
+        Deterministic ID from the chunk's source, position and content.
+        Re-ingesting unchanged content yields the same IDs; changed content yields new ones.
+        """
+        position = (
+            metadata.get("window_start_time", metadata.get("page", "")),
+            metadata.get("chunk_index", ""),
+        )
+        key = f"{MetadataStore.source_of(metadata)}|{position[0]}|{position[1]}|{text}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def ensure_chunk_id(cls, doc: Document) -> str:
+        """Returns the document's chunk ID, assigning one if it predates chunk IDs."""
+        if not doc.metadata.get("chunk_id"):
+            doc.metadata["chunk_id"] = cls.make_chunk_id(doc.page_content, doc.metadata)
+        return doc.metadata["chunk_id"]
+
+    def add_documents(self, documents: Iterable[Document]):
+        rows = [
+            (self.ensure_chunk_id(doc), self.source_of(doc.metadata), doc.page_content, json.dumps(doc.metadata))
+            for doc in documents
+        ]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def get_documents(self, chunk_ids: List[str]) -> List[Optional[Document]]:
+        """
+        Returns documents in the order of `chunk_ids`; unknown IDs yield None.
+        """
+        if not chunk_ids:
+            return []
+        found: Dict[str, Document] = {}
+        unique_ids = list(dict.fromkeys(chunk_ids))
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique_ids), 500):
+                batch = unique_ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                cursor = self.conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                )
+                for chunk_id, text, metadata in cursor:
+                    found[chunk_id] = Document(page_content=text, metadata=json.loads(metadata))
+        # Fresh copies per position: callers annotate metadata (e.g. relevance_score)
+        return [Document(page_content=found[c].page_content, metadata=dict(found[c].metadata)) if c in found else None
+                for c in chunk_ids]
+
+    def iter_documents(self) -> Iterable[Document]:
+        """Returns every stored chunk, in insertion order."""
+        with self._lock:
+            rows = self.conn.execute("SELECT text, metadata FROM chunks ORDER BY rowid").fetchall()
+        for text, metadata in rows:
+            yield Document(page_content=text, metadata=json.loads(metadata))
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class SummaryStore:
+    """
+    Precomputed per-source summaries, stored next to the chunks (data/summaries/<source>.json).
+    Each entry holds the whole-video summary, the per-window summaries, the hash of the
+    chunks it was built from (for invalidation), and the summary embedding (for routing).
+    """
+    def __init__(self, summaries_dir: str = None):
+        self.summaries_dir = summaries_dir or os.path.join(settings.DATA_DIR, "summaries")
+        os.makedirs(self.summaries_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        self.load()
+
+    def _path(self, source: str) -> str:
+        safe_name = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in source)
+        return os.path.join(self.summaries_dir, f"{safe_name}.json")
+
+    def load(self):
+        for name in os.listdir(self.summaries_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.summaries_dir, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                self.entries[entry["source"]] = entry
+            except Exception as e:
+                logger.error(f"Failed to load summary {name}: {e}")
+        logger.info(f"Loaded {len(self.entries)} precomputed summaries.")
+
+    def get(self, source: str) -> Optional[dict]:
+        return self.entries.get(source)
+
+    def save(self, entry: dict):
+        with self._lock:
+            with open(self._path(entry["source"]), "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            self.entries[entry["source"]] = entry
+
+    def delete(self, source: str):
+        with self._lock:
+            self.entries.pop(source, None)
+            if os.path.exists(self._path(source)):
+                os.remove(self._path(source))
+
+    def find(self, query_embedding: List[float], top_k: int = 1, min_similarity: float = None) -> List[str]:
+        """
+        Sources whose summary is closest to the query (cosine; embeddings are normalized), best
+        first. Only summaries with a similarity of at least `min_similarity` are returned, so a
+        query about a source without a summary does not get some other source's.
+        """
+        if min_similarity is None:
+            min_similarity = settings.SUMMARY_MIN_SIMILARITY
+        sources = list(self.entries)
+        if not sources:
+            return []
+        matrix = np.asarray([self.entries[s]["embedding"] for s in sources], dtype=np.float32)
+        similarities = matrix @ np.asarray(query_embedding, dtype=np.float32)
+        best = [i for i in np.argsort(-similarities)[:top_k] if similarities[i] >= min_similarity]
+        return [sources[i] for i in best]
+
+    def as_documents(self, source: str) -> List[Document]:
+        """
+        The overview followed by the per-window summaries, shaped like retrieved chunks.
+        """
+        entry = self.entries.get(source)
+        if not entry:
+            return []
+        docs = [Document(
+            page_content=entry["summary"],
+            metadata={"video_id": source, "type": "summary", "level": "video"}
+        )]
+        for window in entry["windows"]:
+            docs.append(Document(
+                page_content=window["summary"],
+                metadata={"video_id": source, "type": "summary", "level": "window",
+                          "window_start_time": window["start"]}
+            ))
+        return docs
@@ -14,6 +14,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset pagination cursor of /threads and message history
 )
 
 @app.get("/")
@@ -25,8 +26,14 @@ try:
     from app.api.auth import router as auth_router
     from app.api.routes import router
 
+    from app.db.chat_history import chat_history
+
     app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
     app.include_router(router)
 
+    # Write-behind persistence of chat history (re-persists entries a crashed worker left behind)
+    app.add_event_handler("startup", chat_history.start)
+    app.add_event_handler("shutdown", chat_history.stop)
+
 except Exception as e:
     print("Router load failed:", e)
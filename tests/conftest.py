@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+# Settings are read from the environment at import time, and the shard worker processes
+# re-import them, so the test environment is set up before anything from `app` is imported.
+_TEST_ROOT = tempfile.mkdtemp(prefix="youtubegpt-tests-")
+TEST_VOCABULARY = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november "
+    "oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu"
+).split()
+
+
+def _build_embedding_model(path: str):
+    """A tiny local static-embedding model, so no model download is needed."""
+    import numpy as np
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import StaticEmbedding
+
+    words = ["[UNK]"] + TEST_VOCABULARY
+    tokenizer = Tokenizer(models.WordLevel({w: i for i, w in enumerate(words)}, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    weights = np.random.default_rng(0).normal(size=(len(words), 32)).astype(np.float32)
+    SentenceTransformer(modules=[StaticEmbedding(tokenizer, embedding_weights=weights)]).save(path)
+
+
+try:
+    _model_dir = os.path.join(_TEST_ROOT, "embedding_model")
+    _build_embedding_model(_model_dir)
+    os.environ.setdefault("EMBEDDING_MODEL_NAME", _model_dir)
+except ImportError:
+    pass  # tests that need embeddings skip themselves
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_FALLBACK_PROVIDERS", "")
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
+# Let app.db.session and app.db.redis_client build their (lazy) clients; nothing connects to
+# them: tests pass fakes explicitly and the Redis-backed caches are switched off
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/youtubegpt_test")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/15")
+os.environ.setdefault("LLM_CACHE_BACKEND", "disk")
+os.environ.setdefault("USER_CACHE_REDIS", "false")
+os.environ.setdefault("CHAT_HISTORY_CACHE_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from app.config.settings import settings
+from app.llm.answer_generator import AnswerGenerator
+from app.llm.fake_llm import FakeChatModel
+from app.llm.llm_registry import LLMRegistry
+
+DOCUMENTS = [Document(page_content="Alpha is covered first. Bravo comes later.",
+                      metadata={"chunk_id": "c0", "video_id": "v", "start": 30.0})]
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(LLMRegistry, "_instance", None)
+    generator = AnswerGenerator()
+    # The open parenthesis is held back by the citation formatter and sent as the tail
+    generator.llm = FakeChatModel(model_name="fake", ttft=0.01, tokens_per_second=1000,
+                                  script=[{"match": "", "response": "Alpha is covered first (see"}])
+    return generator
+
+
+def test_astream_answer_records_time_to_first_token(generator):
+    async def run():
+        events = [event async for event in generator.astream_answer("what is alpha?", DOCUMENTS)]
+        text = "".join([chunk async for chunk in generator.agenerate_answer("what is alpha?", DOCUMENTS, mode="live")])
+        return events, text
+
+    events, text = asyncio.run(run())
+    assert [name for name, _ in events][-1] == "validation"
+    assert "".join(data for name, data in events if name == "token") == "Alpha is covered first (see"
+    assert text.startswith("Alpha is covered first (see")
+    # One sample per answer, whether streamed as SSE events or as live text
+    assert len(generator.ttft_ms["live"]) == 2
+    assert generator.stats()["ttft"]["live"]["count"] == 2
+
+
+def test_validation_starts_with_the_tail_and_is_cancelled_if_the_client_leaves(generator):
+    started, cancelled = asyncio.Event(), []
+
+    async def avalidate(question, answer, context, documents=None):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(answer)
+            raise
+        return True
+
+    generator.validator.avalidate = avalidate
+
+    async def run():
+        stream = generator.astream_answer("what is alpha?", DOCUMENTS)
+        async for name, data in stream:
+            if data == "(see":
+                break
+        await asyncio.sleep(0)
+        running = started.is_set()  # validation runs while the tail is still being delivered
+        await stream.aclose()
+        await asyncio.sleep(0)
+        return running
+
+    assert asyncio.run(run())
+    assert cancelled == ["Alpha is covered first (see"]
@@ -0,0 +1,154 @@
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from app.config.settings import settings
+from app.retrieval.bm25_index import FORMAT_VERSION, MANIFEST_FILE, BM25Index
+from app.retrieval.sparse_retriever import SparseRetriever
+from app.vectorstore.metadata_store import MetadataStore
+
+TEXTS = [
+    "alpha bravo charlie",
+    "bravo bravo delta echo",
+    "charlie delta foxtrot golf",
+    "alpha echo echo echo hotel",
+    "india juliet kilo alpha",
+]
+
+
+def _documents():
+    return [Document(page_content=text, metadata={"video_id": f"video{i % 2}", "chunk_id": f"chunk{i}"})
+            for i, text in enumerate(TEXTS)]
+
+
+def _index():
+    index = BM25Index()
+    index.add_documents([text.split() for text in TEXTS], [f"chunk{i}" for i in range(len(TEXTS))])
+    return index
+
+
+def test_save_load_round_trip_is_memory_mapped(tmp_path):
+    index = _index()
+    index.save(str(tmp_path / "bm25"))
+    loaded = BM25Index.load(str(tmp_path / "bm25"))
+
+    assert loaded.num_docs == len(TEXTS)
+    assert all(isinstance(array, np.memmap) for array in loaded.state)
+    for query in (["alpha"], ["bravo", "echo"], ["unknown"]):
+        assert np.allclose(loaded.get_scores(query), index.get_scores(query))
+        assert loaded.search(query, 3)[0] == index.search(query, 3)[0]
+
+    # A loaded index keeps accepting documents; the new state is in memory, not in the mapped files
+    assert loaded.add_documents([["lima", "alpha"]], ["chunk9"]) == 1
+    assert loaded.search(["lima"], 1)[0] == ["chunk9"]
+
+
+def test_duplicate_chunk_ids_are_not_indexed_twice():
+    index = _index()
+    assert index.add_documents([TEXTS[0].split(), ["new", "alpha"], ["new", "alpha"]],
+                               ["chunk0", "chunk5", "chunk5"]) == 1
+    assert index.num_docs == len(TEXTS) + 1
+    assert index.add_documents([TEXTS[0].split()], ["chunk0"]) == 0
+    assert list(index.state.chunk_ids).count("chunk5") == 1
+
+
+def test_searches_see_a_consistent_index_while_documents_are_added():
+    index = _index()
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                chunk_ids, scores = index.search(["alpha", "lima"], 5)
+                assert len(chunk_ids) == len(scores)
+                assert all(chunk_id.startswith("chunk") for chunk_id in chunk_ids)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(200):
+        index.add_documents([["lima", "alpha", f"term{i}"]], [f"chunk{100 + i}"])
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert not errors
+    assert index.num_docs == len(TEXTS) + 200
+
+
+def test_legacy_pickle_is_migrated_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    legacy_path = tmp_path / "bm25_index.pkl"
+    documents = _documents()
+    with open(legacy_path, "wb") as f:
+        pickle.dump((BM25Okapi([doc.page_content.split() for doc in documents]), documents), f)
+
+    sparse = SparseRetriever(MetadataStore(db_path=str(tmp_path / "metadata.sqlite")))
+    assert sparse.bm25.num_docs == len(TEXTS)
+    assert not legacy_path.exists() and (tmp_path / "bm25_index.pkl.migrated").exists()
+    assert os.path.exists(tmp_path / "bm25_index" / MANIFEST_FILE)
+    assert sparse.retrieve("kilo", top_k=1)[0][0].metadata["chunk_id"] == "chunk4"
+
+    # The next start loads the new format directly
+    reopened = SparseRetriever(MetadataStore(db_path=str(tmp_path / "metadata.sqlite")))
+    assert reopened.bm25.num_docs == len(TEXTS)
+
+
+def test_format_version_mismatch_rebuilds_from_metadata_store(tmp_path):
+    metadata_store = MetadataStore(db_path=str(tmp_path / "metadata.sqlite"))
+    index_dir = tmp_path / "bm25_index"
+    SparseRetriever(metadata_store, index_dir=str(index_dir)).create_index(_documents())
+
+    manifest_path = index_dir / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    manifest["format_version"] = FORMAT_VERSION - 1
+    manifest_path.write_text(json.dumps(manifest))
+    assert BM25Index.load(str(index_dir)) is None
+
+    rebuilt = SparseRetriever(metadata_store, index_dir=str(index_dir))
+    assert rebuilt.bm25.num_docs == len(TEXTS)
+    assert json.loads(manifest_path.read_text())["format_version"] == FORMAT_VERSION
+    assert rebuilt.retrieve("foxtrot", top_k=1)[0][0].metadata["chunk_id"] == "chunk2"
+
+
+PARITY_CORPUS = [
+    "the cat sat on the mat",
+    "the dog sat on the log the end",
+    "cats and dogs and the cat",
+    "the the the",
+    "a quick brown fox jumps over the lazy dog",
+    "mat mat mat cat",
+    "log cabin in the woods",
+]
+
+
+@pytest.mark.parametrize("query", [
+    "cat", "the", "cat cat mat", "the dog the log", "fox zebra", "zebra", "",
+])
+def test_top_k_matches_rank_bm25(query):
+    corpus = [text.split() for text in PARITY_CORPUS]
+    okapi = BM25Okapi(corpus)
+    index = BM25Index()
+    index.add_documents(corpus, [f"doc{i}" for i in range(len(corpus))])
+
+    tokens = query.split()
+    expected = okapi.get_scores(tokens)
+    assert np.allclose(index.get_scores(tokens), expected, atol=1e-5)
+
+    k = 3
+    chunk_ids, scores = index.search(tokens, k)
+    positions = [int(chunk_id[3:]) for chunk_id in chunk_ids]
+    # Same scores in the same order; ids may differ only among tied scores
+    assert np.allclose(scores, np.sort(expected)[::-1][:k], atol=1e-5)
+    assert np.allclose(expected[positions], scores, atol=1e-5)
+    if not tokens:
+        assert not scores.any()
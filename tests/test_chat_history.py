@@ -0,0 +1,91 @@
+import asyncio
+import types
+import uuid
+
+import pytest
+
+pytest.importorskip("greenlet")
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.config.settings import settings
+from app.db.chat_history import ChatHistoryStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_PERSIST_MAX_DELIVERIES", 3)
+    monkeypatch.setattr(settings, "CHAT_PERSIST_CLAIM_IDLE_MS", 0)
+    monkeypatch.setattr(settings, "CHAT_PERSIST_INTERVAL_MS", 20)
+    store = ChatHistoryStore(types.SimpleNamespace(redis=fakeredis.aioredis.FakeRedis(decode_responses=True)))
+    store.written = []
+
+    async def write(threads, messages):
+        # Postgres stand-in: a message with "poison" content violates a constraint
+        if any(m["content"] == "poison" for m in messages):
+            raise ValueError("constraint violated")
+        store.written += [m["content"] for m in messages]
+
+    monkeypatch.setattr(store, "_write", write)
+    return store
+
+
+async def _setup(store, contents):
+    await store.redis.redis.xgroup_create(store.STREAM, store.GROUP, id="0", mkstream=True)
+    thread_id = uuid.uuid4()
+    for content in contents:
+        await store.append(thread_id, "user", content)
+
+
+async def _read(store):
+    response = await store.redis.redis.xreadgroup(store.GROUP, store.consumer, {store.STREAM: ">"}, count=100)
+    return response[0][1]
+
+
+def test_bad_record_does_not_block_batch_and_is_dead_lettered(store):
+    async def scenario():
+        await _setup(store, ["first", "poison", "second"])
+        await store._persist(await _read(store))
+        assert store.written == ["first", "second"]
+        assert (await store.redis.redis.xpending(store.STREAM, store.GROUP))["pending"] == 1
+
+        await store._reclaim()  # second delivery: still below the limit
+        assert await store.redis.redis.xlen(store.DEAD_STREAM) == 0
+        await store._reclaim()  # third delivery: moved aside and acknowledged
+        dead = await store.redis.redis.xrange(store.DEAD_STREAM)
+        assert len(dead) == 1 and dead[0][1]["deliveries"] == "3" and "constraint" in dead[0][1]["error"]
+        assert (await store.redis.redis.xpending(store.STREAM, store.GROUP))["pending"] == 0
+        assert await store.redis.redis.xlen(store.STREAM) == 0
+
+    asyncio.run(scenario())
+    assert (store.record_failures, store.dead_lettered, store.persisted) == (3, 1, 3)
+
+
+def test_reclaim_failure_does_not_stop_flushing(store, monkeypatch):
+    async def broken_reclaim():
+        raise ConnectionError("XAUTOCLAIM failed")
+
+    monkeypatch.setattr(store, "_reclaim", broken_reclaim)
+    xreadgroup = store.redis.redis.xreadgroup
+
+    async def blocking_xreadgroup(*args, block=None, **kwargs):
+        # The fake returns at once; a real BLOCK waits (and yields to the event loop)
+        response = await xreadgroup(*args, **kwargs)
+        if not response and block:
+            await asyncio.sleep(block / 1000)
+        return response
+
+    monkeypatch.setattr(store.redis.redis, "xreadgroup", blocking_xreadgroup)
+
+    async def scenario():
+        await _setup(store, ["hello"])
+        task = asyncio.create_task(store._run())
+        for _ in range(100):
+            if store.written:
+                break
+            await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert store.written == ["hello"]
@@ -0,0 +1,18 @@
+import asyncio
+
+from app.config.settings import settings
+from app.evaluation.benchmarks import bench_chat
+from app.llm.llm_registry import LLMRegistry
+
+
+def test_chat_benchmark_runs_offline_with_default_model(monkeypatch, capsys):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_MS", 5)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 5000)
+    monkeypatch.setattr(LLMRegistry, "_instance", None)
+
+    asyncio.run(bench_chat([1, 4], n_requests=8))
+
+    lines = [line for line in capsys.readouterr().out.splitlines() if "failures=" in line]
+    assert len(lines) == 2
+    assert all("model=('fake', 'fake')" in line and "failures=0" in line for line in lines)
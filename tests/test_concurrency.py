@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+import types
+import uuid
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("youtube_transcript_api")
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.documents import Document
+
+from conftest import TEST_VOCABULARY
+from app.api import routes
+from app.api.deps import get_current_user, get_pipeline
+from app.config.settings import settings
+from app.db.session import get_db
+from app.llm.answer_generator import AnswerGenerator
+from app.llm.llm_registry import LLMRegistry
+from app.reasoning.context_compressor import ContextCompressor
+from app.reasoning.query_rewriter import QueryRewriter
+from app.retrieval.dense_retriever import DenseRetriever
+from app.retrieval.fusion import annotate
+from app.retrieval.hybrid_retriever import HybridRetriever
+from app.retrieval.sparse_retriever import SparseRetriever
+from app.utils.executors import BoundedExecutor
+from app.vectorstore.faiss_store import FaissVectorStore
+from app.vectorstore.metadata_store import MetadataStore
+
+CHAT_CONCURRENCY = 8
+PROBES = 20
+
+
+class BlockingReranker:
+    """Stands in for CrossEncoder inference: holds its thread for a while, like the real model."""
+    def rerank(self, query, documents, top_k=4, budget_ms=None, first_stage_confidence=0.0):
+        time.sleep(0.05)
+        return [annotate(doc, relevance_score=1.0) for doc in documents[:top_k]]
+
+
+class EmptyResult:
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+
+class FakeSession:
+    async def execute(self, stmt):
+        return EmptyResult()
+
+
+def _chunks(prefix: str, n: int):
+    return [{"text": " ".join(TEST_VOCABULARY[(i + j) % 20] for j in range(8)), "video_id": f"{prefix}{i // 10}",
+             "start": float(i), "chunk_index": i % 10, "chunk_id": f"{prefix}-{i:04d}"} for i in range(n)]
+
+
+def _documents(chunks):
+    return [Document(page_content=c["text"], metadata={k: v for k, v in c.items() if k != "text"}) for c in chunks]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_MS", 100)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 400)
+    monkeypatch.setattr(settings, "FAKE_LLM_OUTPUT_TOKENS", 40)
+    monkeypatch.setattr(LLMRegistry, "_instance", None)
+
+    vector_store = FaissVectorStore(index_path=str(tmp_path / "faiss_index"))
+    sparse = SparseRetriever(MetadataStore(db_path=str(tmp_path / "metadata.sqlite")),
+                             index_dir=str(tmp_path / "bm25_index"))
+    pipeline = types.SimpleNamespace(
+        vector_store=vector_store,
+        sparse_retriever=sparse,
+        hybrid_retriever=HybridRetriever(DenseRetriever(vector_store), sparse, BlockingReranker()),
+        query_rewriter=QueryRewriter(),
+        context_compressor=ContextCompressor(),
+        answer_generator=AnswerGenerator(vector_store),
+        answer_cache=None,
+        inference=BoundedExecutor("inference", settings.INFERENCE_WORKERS, settings.INFERENCE_QUEUE_SIZE),
+    )
+    chunks = _chunks("seed", 200)
+    vector_store.add_documents(chunks)
+    sparse.add_documents(_documents(chunks))
+
+    app = FastAPI()
+    app.include_router(routes.router)
+    user = types.SimpleNamespace(id=uuid.uuid4(), is_active=True)
+    app.dependency_overrides[get_pipeline] = lambda: pipeline
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_db] = FakeSession
+    yield app, pipeline
+    pipeline.hybrid_retriever.executor.shutdown(wait=False)
+
+
+async def _probe_threads(client) -> list:
+    latencies = []
+    for _ in range(PROBES):
+        start = time.perf_counter()
+        response = await client.get("/threads")
+        assert response.status_code == 200
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.02)
+    return latencies
+
+
+def test_threads_latency_stays_flat_under_chat_load(app):
+    app, pipeline = app
+
+    def ingest(stop: threading.Event):
+        # Indexing runs on a worker thread while the chats search the same indexes
+        batch = 0
+        while not stop.is_set():
+            chunks = _chunks(f"ingest{batch}", 20)
+            pipeline.vector_store.add_documents(chunks)
+            pipeline.sparse_retriever.add_documents(_documents(chunks))
+            batch += 1
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            idle = await _probe_threads(client)
+
+            stop, statuses = asyncio.Event(), []
+
+            async def chat_load(i: int):
+                while not stop.is_set():
+                    response = await client.post("/chat", json={"message": f"what is {TEST_VOCABULARY[i]} about",
+                                                                "session_id": "load"})
+                    statuses.append(response.status_code)
+
+            ingest_stop = threading.Event()
+            ingest_thread = threading.Thread(target=ingest, args=(ingest_stop,))
+            ingest_thread.start()
+            load = [asyncio.create_task(chat_load(i)) for i in range(CHAT_CONCURRENCY)]
+            await asyncio.sleep(0.5)  # let the chats reach retrieval and generation
+            loaded = await _probe_threads(client)
+            stop.set()
+            await asyncio.gather(*load)
+            ingest_stop.set()
+            ingest_thread.join()
+            return idle, loaded, statuses
+
+    idle, loaded, statuses = asyncio.run(run())
+    assert statuses and set(statuses) == {200}
+    # Rewrite, retrieval, reranking and generation never block the event loop: a blocked loop
+    # would delay /threads by a rerank (50ms) or an LLM first token (100ms) per probe
+    assert np.percentile(loaded, 95) < np.percentile(idle, 95) + 40, (idle, loaded)
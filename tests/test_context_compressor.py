@@ -0,0 +1,56 @@
+import pytest
+from langchain_core.documents import Document
+
+pytest.importorskip("sentence_transformers")
+
+from app.config.settings import settings
+from app.ingestion.chunker import TimeAwareChunker
+from app.reasoning.context_compressor import ContextCompressor
+
+SENTENCES = [
+    "alpha bravo charlie delta echo foxtrot golf.",
+    "hotel india juliet kilo lima mike november.",
+    "oscar papa quebec romeo sierra tango uniform.",
+    "victor whiskey xray yankee zulu alpha bravo.",
+]
+TEXT = " ".join(SENTENCES)
+
+
+@pytest.fixture
+def compressor(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_COMPRESSION_RATIO", 0.2)
+    return ContextCompressor()
+
+
+def test_sentence_spans_point_into_the_original_text():
+    spans = ContextCompressor.sentence_spans("  " + TEXT)
+    assert [sentence for _, sentence in spans] == SENTENCES
+    assert all(("  " + TEXT)[offset:].startswith(sentence) for offset, sentence in spans)
+
+
+def test_compressed_chunk_starts_at_its_first_kept_sentence(compressor):
+    doc = Document(page_content=TEXT, metadata={"chunk_id": "c0", "start": 100.0, "end": 200.0})
+    [compressed] = compressor.compress([doc], query="oscar papa quebec romeo")
+
+    assert compressed.page_content == SENTENCES[2]
+    offset = TEXT.index(SENTENCES[2])
+    assert compressed.metadata["sentence_offsets"] == [offset]
+    assert compressed.metadata["start"] == pytest.approx(100.0 + 100.0 * offset / len(TEXT), abs=0.01)
+    assert doc.metadata["start"] == 100.0
+
+
+def test_chunk_without_an_end_keeps_its_start(compressor):
+    doc = Document(page_content=TEXT, metadata={"chunk_id": "c1", "window_start_time": 60.0})
+    [compressed] = compressor.compress([doc], query="oscar papa quebec romeo")
+    assert "start" not in compressed.metadata and compressed.metadata["window_start_time"] == 60.0
+
+
+def test_chunks_carry_the_time_span_of_their_transcript_items(monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 200)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP", 0)
+    items = [{"text": f"{sentence} ", "start": 10.0 * i, "duration": 10.0} for i, sentence in enumerate(SENTENCES * 3)]
+    chunks = TimeAwareChunker().create_chunks(items, video_id="v")
+
+    # The splitter cuts before the ".", so later chunks open on the previous item's last character
+    assert [(chunk["start"], chunk["end"]) for chunk in chunks] == [(0.0, 40.0), (30.0, 80.0), (70.0, 120.0)]
+    assert all(chunk["window_start_time"] == 0.0 for chunk in chunks)
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from app.vectorstore.faiss_store import FaissVectorStore
+
+
+def _chunks(ids):
+    return [{"text": f"alpha bravo {i}", "video_id": "video0", "chunk_id": chunk_id} for i, chunk_id in enumerate(ids)]
+
+
+def test_reingested_chunks_are_not_added_twice(tmp_path):
+    store = FaissVectorStore(index_path=str(tmp_path / "faiss_index"))
+    store.add_documents(_chunks(["a", "b", "b"]))
+    assert store.vector_store.index.ntotal == 2
+
+    store.add_documents(_chunks(["a", "b", "c"]))
+    assert store.vector_store.index.ntotal == 3
+    assert set(store.get_vectors(["a", "b", "c"])) == {"a", "b", "c"}
+
+
+def test_searches_run_while_documents_are_added(tmp_path):
+    store = FaissVectorStore(index_path=str(tmp_path / "faiss_index"))
+    store.add_documents(_chunks([f"seed{i}" for i in range(10)]))
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                results = store.similarity_search_with_score("alpha bravo", 5)
+                assert len(results) == 5 and all(doc.metadata["chunk_id"] for doc, _ in results)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for batch in range(20):
+        store.add_documents(_chunks([f"batch{batch}-{i}" for i in range(5)]))
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert not errors
+    assert store.vector_store.index.ntotal == 10 + 20 * 5
+    assert len(store.get_vectors([f"batch19-{i}" for i in range(5)])) == 5
@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from app.config.settings import settings
+from app.evaluation.answer_validator import AnswerValidator
+from app.evaluation.grounding_checker import BORDERLINE, SUPPORTED, UNSUPPORTED, GroundingChecker
+from app.llm.fake_llm import FakeChatModel
+from app.llm.llm_registry import LLMRegistry
+from app.vectorstore.faiss_store import FaissVectorStore
+
+DOCUMENTS = [
+    Document(page_content="alpha bravo charlie delta echo foxtrot.", metadata={"chunk_id": "c0", "start": 60.0}),
+    Document(page_content="golf hotel india juliet kilo lima.", metadata={"chunk_id": "c1", "start": 400.0}),
+]
+SUPPORTED_ANSWER = "Alpha bravo charlie delta [01:10]."
+UNSUPPORTED_ANSWER = "Sierra tango uniform victor whiskey."
+BORDERLINE_ANSWER = "Alpha bravo mike november."
+FABRICATED_TIMESTAMP_ANSWER = "Alpha bravo charlie delta [19:59]."
+
+
+@pytest.fixture(scope="module")
+def checker():
+    return GroundingChecker()
+
+
+@pytest.mark.parametrize("answer, verdict", [
+    (SUPPORTED_ANSWER, SUPPORTED),
+    (UNSUPPORTED_ANSWER, UNSUPPORTED),
+    (BORDERLINE_ANSWER, BORDERLINE),
+    (FABRICATED_TIMESTAMP_ANSWER, UNSUPPORTED),
+])
+def test_verdicts(checker, answer, verdict):
+    assert checker.check(answer, DOCUMENTS)["verdict"] == verdict
+
+
+def test_fabricated_timestamp_is_a_citation_failure(checker):
+    [claim] = checker.check(FABRICATED_TIMESTAMP_ANSWER, DOCUMENTS)["claims"]
+    assert claim["lexical"] == 1.0 and not claim["citation_ok"]
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.mark.parametrize("rewrite", [{"compressed": True}, {"trimmed": True}, {"merged_chunk_ids": ["c0", "c1"]}])
+def test_rewritten_documents_are_embedded_from_their_own_text(tmp_path, rewrite):
+    store = FaissVectorStore(index_path=str(tmp_path / "faiss_index"))
+    store.add_documents([{"text": "alpha bravo charlie delta echo foxtrot.", "chunk_id": "c0"}])
+    checker = GroundingChecker(store)
+
+    indexed = Document(page_content="alpha bravo.", metadata={"chunk_id": "c0"})
+    rewritten = Document(page_content="alpha bravo.", metadata={"chunk_id": "c0", **rewrite})
+    stored, embedded = checker._chunk_vectors([indexed, rewritten])
+
+    assert np.allclose(stored, _unit(store.get_vectors(["c0"])["c0"]), atol=1e-5)
+    assert np.allclose(embedded, _unit(store.embeddings.embed_query("alpha bravo.")), atol=1e-5)
+
+
+@pytest.fixture
+def validator(monkeypatch):
+    monkeypatch.setattr(settings, "VALIDATOR_MODE", "local")
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(LLMRegistry, "_instance", None)
+    validator = AnswerValidator()
+    validator.llm = FakeChatModel(model_name="validator", ttft=0.0, tokens_per_second=1000,
+                                  script=[{"match": "", "response": "YES"}])
+    return validator
+
+
+@pytest.mark.parametrize("answer, expected, escalated", [
+    (SUPPORTED_ANSWER, True, False),
+    (UNSUPPORTED_ANSWER, False, False),
+    (FABRICATED_TIMESTAMP_ANSWER, False, False),
+    (BORDERLINE_ANSWER, True, True),  # decided by the LLM ("YES")
+])
+def test_validator_escalates_only_borderline_answers(validator, answer, expected, escalated):
+    assert validator.validate("q", answer, "context", DOCUMENTS) is expected
+    assert asyncio.run(validator.avalidate("q", answer, "context", DOCUMENTS)) is expected
+    assert (validator.escalations, validator.local_decisions) == ((2, 0) if escalated else (0, 2))
+    assert len(validator.llm_ms) == (2 if escalated else 0)
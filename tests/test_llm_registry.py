@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from app.config.settings import settings
+from app.llm.fake_llm import FakeChatModel
+from app.llm.llm_registry import CircuitBreaker, LLMRegistry, LLMRoute, UnknownModelError
+
+MESSAGES = [HumanMessage(content="Context: alpha bravo\n\nQuestion: what?")]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "LLM_BREAKER_RESET", 0.1)
+    registry = LLMRegistry()
+    yield registry
+    registry.executor.shutdown(wait=False)
+
+
+def route(name: str, ttft: float, error_rate: float = 0.0) -> LLMRoute:
+    """A fake route with scripted latency that answers with its own name."""
+    client = FakeChatModel(model_name=name, ttft=ttft, tokens_per_second=1000, error_rate=error_rate,
+                           script=[{"match": "", "response": f"answer from {name}"}])
+    return LLMRoute("fake", name, client)
+
+
+def test_hedges_slow_primary(registry):
+    routes = [route("slow", ttft=0.5), route("fast", ttft=0.01)]
+    assert registry.invoke(routes, MESSAGES).content == "answer from fast"
+    assert asyncio.run(registry.ainvoke(routes, MESSAGES)).content == "answer from fast"
+    assert (registry.hedges, registry.hedge_wins) == (2, 2)
+
+
+def test_astream_hedges_on_first_token(registry):
+    routes = [route("slow", ttft=0.5), route("fast", ttft=0.01)]
+
+    async def collect():
+        return "".join([chunk.content async for chunk in registry.astream(routes, MESSAGES)])
+
+    assert asyncio.run(collect()) == "answer from fast"
+    assert registry.hedge_wins == 1
+    # The abandoned primary stream does not count against its breaker
+    assert routes[0].breaker.state == "closed" and not routes[0].breaker.trial_in_flight
+
+
+def test_fast_primary_is_not_hedged(registry):
+    routes = [route("primary", ttft=0.0), route("backup", ttft=0.0)]
+    assert registry.invoke(routes, MESSAGES).content == "answer from primary"
+    assert registry.hedges == 0
+
+
+def test_fails_over_to_backup(registry):
+    routes = [route("broken", ttft=0.0, error_rate=1.0), route("backup", ttft=0.0)]
+    assert registry.invoke(routes, MESSAGES).content == "answer from backup"
+    assert "".join(chunk.content for chunk in registry.stream(routes, MESSAGES)) == "answer from backup"
+    assert registry.failovers == 2
+    assert routes[0].failures == 2
+
+
+def test_open_circuit_is_skipped_until_reset(registry):
+    routes = [route("broken", ttft=0.0, error_rate=1.0), route("backup", ttft=0.0)]
+    for _ in range(2):
+        registry.invoke(routes, MESSAGES)
+    assert routes[0].breaker.state == "open"
+
+    registry.invoke(routes, MESSAGES)
+    assert routes[0].calls == 2  # skipped while open
+
+    time.sleep(0.1)
+    assert routes[0].breaker.state == "half_open"
+    routes[0].client.error_rate = 0.0
+    assert registry.invoke(routes, MESSAGES).content == "answer from broken"
+    assert routes[0].breaker.state == "closed"
+
+
+def test_breaker_transitions():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.acquire()
+
+    time.sleep(0.05)
+    assert breaker.state == "half_open"
+    assert breaker.acquire()
+    assert not breaker.acquire()  # single trial
+    breaker.record_failure()  # failed trial re-opens at once
+    assert breaker.state == "open"
+
+    time.sleep(0.05)
+    assert breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_half_open_allows_one_concurrent_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    barrier = threading.Barrier(16)
+    granted = []
+
+    def attempt():
+        barrier.wait()
+        granted.append(breaker.acquire())
+
+    threads = [threading.Thread(target=attempt) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert granted.count(True) == 1
+
+
+def test_hedge_delay_per_call_type(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_DELAY", 3.0)
+    r = route("primary", ttft=0.0)
+    for _ in range(10):
+        r.record_latency("rewrite", 0.1)
+        r.record_latency("generate", 2.0)
+        r.record_latency("generate", 0.2, streaming_first_token=True)
+    assert r.hedge_delay("rewrite") == pytest.approx(0.1)
+    assert r.hedge_delay("generate") == pytest.approx(2.0)
+    assert r.hedge_delay("generate", streaming=True) == pytest.approx(0.2)
+    assert r.hedge_delay("validate") == 3.0
+    assert set(r.stats()["latency"]) == {"rewrite", "generate"}
+
+
+def test_routed_model_records_latency_by_call_type(registry):
+    registry._routes[registry.resolve()] = route("fake", ttft=0.0)
+    registry.get_model(call_type="rewrite").invoke(MESSAGES)
+    assert list(registry.routes_for()[0].latencies) == ["rewrite"]
+
+
+def test_resolve_accepts_only_configured_models(registry, monkeypatch):
+    default = (settings.LLM_PROVIDER, "fake")
+    assert registry.resolve(None) == default
+    assert registry.resolve("groq-llama3") == default
+    assert registry.resolve("fake") == default
+    with pytest.raises(UnknownModelError):
+        registry.resolve("fake:other")
+    with pytest.raises(UnknownModelError):
+        registry.resolve("openai:gpt-4o")
+
+    monkeypatch.setattr(settings, "LLM_ALLOWED_MODELS", ["fake:other"])
+    assert registry.resolve("fake:other") == ("fake", "other")
+
+
+class ScriptedStream:
+    """Streaming client that records when its stream is closed; `ready` gates the first token."""
+    def __init__(self, name: str, closed: list, ready: asyncio.Event = None, release: asyncio.Event = None):
+        self.name, self.closed, self.ready, self.release = name, closed, ready, release
+        self.streams = []  # keeps abandoned streams alive: only an explicit aclose may finish them
+
+    def astream(self, messages, **kwargs):
+        stream = self._stream()
+        self.streams.append(stream)
+        return stream
+
+    async def _stream(self):
+        try:
+            if self.release is not None:
+                self.release.set()
+            if self.ready is not None:
+                await self.ready.wait()
+            for token in ("answer ", "from ", self.name):
+                yield AIMessageChunk(content=token)
+                await asyncio.sleep(0)
+        finally:
+            self.closed.append(self.name)
+
+
+def test_astream_closes_same_tick_loser(registry):
+    async def run():
+        closed, ready = [], asyncio.Event()
+        # The primary waits until the hedge starts; the backup releases it and answers at once,
+        # so both first tokens arrive before the registry looks at them
+        routes = [LLMRoute("fake", "primary", ScriptedStream("primary", closed, ready=ready)),
+                  LLMRoute("fake", "backup", ScriptedStream("backup", closed, release=ready))]
+        text = "".join([chunk.content async for chunk in registry.astream(routes, MESSAGES)])
+        return text, list(closed), routes
+
+    text, closed, routes = asyncio.run(run())
+    assert text in ("answer from primary", "answer from backup")
+    assert sorted(closed) == ["backup", "primary"]
+    assert all(not route.breaker.trial_in_flight for route in routes)
+
+
+def test_astream_closes_provider_stream_when_consumer_stops(registry):
+    async def run():
+        closed = []
+        routes = [LLMRoute("fake", "primary", ScriptedStream("primary", closed))]
+        stream = registry.astream(routes, MESSAGES)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first.content, list(closed)
+
+    assert asyncio.run(run()) == ("answer ", ["primary"])
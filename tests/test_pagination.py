@@ -0,0 +1,40 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, MetaData, Table, Uuid, create_engine, insert, select
+
+from app.api.pagination import decode_cursor, encode_cursor, keyset_after, keyset_order
+
+
+def test_cursor_round_trip_with_null_created_at():
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(None, row_id)) == (None, row_id)
+    created_at = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(created_at, row_id)) == (created_at, row_id)
+
+
+def test_keyset_pages_cover_rows_with_and_without_created_at():
+    metadata = MetaData()
+    rows = Table("rows", metadata, Column("id", Uuid, primary_key=True), Column("created_at", DateTime, nullable=True))
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    base = datetime(2024, 1, 1)
+    values = [{"id": uuid.uuid4(), "created_at": None} for _ in range(5)]
+    values += [{"id": uuid.uuid4(), "created_at": base + timedelta(minutes=i // 2)} for i in range(8)]
+
+    with engine.connect() as conn:
+        conn.execute(insert(rows), values)
+        expected = [row.id for row in conn.execute(select(rows).order_by(*keyset_order(rows.c.created_at, rows.c.id)))]
+        seen, cursor = [], None
+        while True:
+            stmt = select(rows)
+            after = decode_cursor(cursor)
+            if after is not None:
+                stmt = stmt.where(keyset_after(rows.c.created_at, rows.c.id, after))
+            page = conn.execute(stmt.order_by(*keyset_order(rows.c.created_at, rows.c.id)).limit(3)).all()
+            seen += [row.id for row in page]
+            if len(page) < 3:
+                break
+            cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+    assert seen == expected and len(seen) == len(values)
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from app.config.settings import settings
+from app.llm.fake_llm import FakeChatModel
+from app.llm.llm_registry import LLMRegistry
+from app.reasoning.query_rewriter import QueryRewriter
+
+HISTORY = [("what is a {dict} in python", "A {dict} maps keys to values, e.g. {'a': 1}.")]
+QUERY = "how do I iterate over it with {k: v}?"
+
+
+@pytest.fixture
+def rewriter(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(LLMRegistry, "_instance", None)
+    rewriter = QueryRewriter()
+    # Only answers when the braces reached the prompt verbatim
+    rewriter.llm = FakeChatModel(model_name="rewrite", ttft=0.0, tokens_per_second=1000, script=[
+        {"match": r"USER: what is a \{dict\} in python[\s\S]*Original Query: how do I iterate over it with \{k: v\}\?",
+         "response": "iterate python dict items"},
+        {"match": "", "response": "unexpected prompt"},
+    ])
+    rewriter.chain = rewriter._build_chain()
+    return rewriter
+
+
+def test_braces_in_query_and_history_reach_the_prompt_verbatim(rewriter):
+    assert rewriter.rewrite(QUERY, HISTORY) == "iterate python dict items"
+    rewriter.cache.clear()
+    assert asyncio.run(rewriter.arewrite(QUERY, HISTORY)) == "iterate python dict items"
+    assert rewriter.counters["llm_calls"] == 2 and rewriter.counters["errors"] == 0
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+pytest.importorskip("sentence_transformers")
+
+from app.config.settings import settings
+from app.retrieval.hybrid_retriever import HybridRetriever
+from app.retrieval.reranker import Reranker, spearman
+
+
+@pytest.fixture(scope="module")
+def onnx_reranker():
+    pytest.importorskip("optimum.onnxruntime")
+    try:
+        return Reranker(backend="onnx")
+    except OSError as e:  # model files not downloadable here
+        pytest.skip(f"Reranker model unavailable: {e}")
+
+
+def test_onnx_ranks_like_torch(onnx_reranker):
+    assert onnx_reranker.agreement is not None
+    assert onnx_reranker.agreement >= settings.RERANKER_MIN_AGREEMENT
+
+
+def test_length_buckets_keep_input_order(onnx_reranker):
+    pairs = [[Reranker.PROBE_QUERY, passage] for passage in Reranker.PROBE_PASSAGES]
+    unbucketed = onnx_reranker.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+    assert onnx_reranker.predict(pairs) == pytest.approx([float(s) for s in unbucketed], abs=1e-3)
+
+
+def test_spearman():
+    assert spearman([1, 2, 3, 4], [10, 20, 30, 40]) == pytest.approx(1.0)
+    assert spearman([1, 2, 3, 4], [4, 3, 2, 1]) == pytest.approx(-1.0)
+
+
+class ScriptedCrossEncoder:
+    """Scores a passage by the number after "doc"; each predict call takes `batch_ms`."""
+    def __init__(self, batch_ms: float = 0.0, reverse: bool = False):
+        self.batch_ms = batch_ms
+        self.reverse = reverse
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        self.calls += 1
+        time.sleep(self.batch_ms / 1000)
+        return [(-1 if self.reverse else 1) * float(passage.split("doc")[1]) for _, passage in pairs]
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_CASCADE_BATCH", 4)
+    monkeypatch.setattr(settings, "RERANK_SKIP_CONFIDENCE", 0.75)
+
+    def make(**model_kwargs):
+        monkeypatch.setattr(Reranker, "_load_model", lambda self: ScriptedCrossEncoder(**model_kwargs))
+        return Reranker(backend="torch")
+    return make
+
+
+def _candidates(n: int):
+    return [Document(page_content=f"doc{i}", metadata={"chunk_id": f"c{i}", "fusion_score": 1.0 / (i + 1)})
+            for i in range(n)]
+
+
+def _scores(docs):
+    return [doc.metadata["relevance_score"] for doc in docs]
+
+
+def test_cascade_skips_rerank_when_first_stage_is_confident(cascade):
+    reranker = cascade()
+    docs = reranker.rerank("q", _candidates(12), top_k=4, budget_ms=100, first_stage_confidence=0.8)
+    assert [d.page_content for d in docs] == ["doc0", "doc1", "doc2", "doc3"]
+    assert _scores(docs) == [None] * 4
+    assert reranker.model.calls == 0 and reranker.cascade_skips == 1
+
+
+def test_cascade_scores_first_batch_when_budget_is_spent(cascade):
+    reranker = cascade()
+    for budget_ms in (0.0, -250.0):
+        docs = reranker.rerank(f"q{budget_ms}", _candidates(12), top_k=4, budget_ms=budget_ms)
+        assert [d.page_content for d in docs] == ["doc3", "doc2", "doc1", "doc0"]
+        assert None not in _scores(docs)
+
+
+def test_cascade_stops_when_next_batch_would_overrun_budget(cascade):
+    reranker = cascade(batch_ms=30)
+    docs = reranker.rerank("q", _candidates(12), top_k=4, budget_ms=50)
+    assert reranker.model.calls == 1 and reranker.cascade_early_stops == 1
+    assert [d.page_content for d in docs] == ["doc3", "doc2", "doc1", "doc0"]
+
+
+def test_cascade_stops_when_top_k_is_stable(cascade):
+    reranker = cascade(reverse=True)  # the first-stage order is already the best one
+    docs = reranker.rerank("q", _candidates(20), top_k=4, budget_ms=10_000)
+    assert reranker.model.calls == 2 and reranker.cascade_early_stops == 1
+    assert [d.page_content for d in docs] == ["doc0", "doc1", "doc2", "doc3"]
+
+
+def test_cascade_fills_up_unscored_in_first_stage_order(cascade, monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_CASCADE_BATCH", 2)
+    reranker = cascade()
+    docs = reranker.rerank("q", _candidates(12), top_k=4, budget_ms=0)
+    assert [d.page_content for d in docs] == ["doc1", "doc0", "doc2", "doc3"]
+    assert _scores(docs) == [1.0, 0.0, None, None]
+
+
+def test_search_budget_is_clamped_for_the_reranker(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_LATENCY_BUDGET_MS", 400)
+    monkeypatch.setattr(settings, "RERANK_MIN_BUDGET_MS", 50)
+    budgets = []
+
+    class RecordingReranker:
+        def rerank(self, query, documents, top_k=4, budget_ms=None, first_stage_confidence=0.0):
+            budgets.append(budget_ms)
+            return documents[:top_k]
+
+    hybrid = HybridRetriever(None, None, RecordingReranker())
+    results = [(doc, 1.0) for doc in _candidates(6)]
+    hybrid._merge_and_rerank("q", results, results, start=time.perf_counter() - 1.0)  # retrieval took 1s
+    hybrid._merge_and_rerank("q", results, results, start=time.perf_counter())
+    hybrid.executor.shutdown(wait=False)
+    assert budgets[0] == 50
+    assert 350 < budgets[1] <= 400
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import time
+import types
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.llm.semantic_cache import SemanticAnswerCache
+
+EMBEDDING = [1.0, 0.0, 0.0]
+CHUNKS = ["c1", "c2"]
+
+
+def _cache():
+    return SemanticAnswerCache(types.SimpleNamespace(redis=fakeredis.aioredis.FakeRedis(decode_responses=True)))
+
+
+def test_answers_are_reused_only_for_the_same_model():
+    async def run():
+        cache = _cache()
+        await cache.store("tenant", "groq:llama3", "what is alpha", EMBEDDING, CHUNKS, "answer from llama3")
+        return (await cache.lookup("tenant", "groq:llama3", EMBEDDING, list(reversed(CHUNKS))),
+                await cache.lookup("tenant", "openai:gpt-4o", EMBEDDING, CHUNKS),
+                await cache.lookup("other-tenant", "groq:llama3", EMBEDDING, CHUNKS))
+
+    assert asyncio.run(run()) == ("answer from llama3", None, None)
+
+
+def test_nearest_entry_of_the_requested_model_wins():
+    async def run():
+        cache = _cache()
+        await cache.store("tenant", "openai:gpt-4o", "q", EMBEDDING, CHUNKS, "answer from gpt-4o")
+        await cache.store("tenant", "groq:llama3", "q", [0.99, 0.14, 0.0], CHUNKS, "answer from llama3")
+        return await cache.lookup("tenant", "groq:llama3", EMBEDDING, CHUNKS)
+
+    assert asyncio.run(run()) == "answer from llama3"
+
+
+def test_entries_without_a_model_are_never_served():
+    async def run():
+        cache = _cache()
+        legacy = {"query": "q", "embedding": EMBEDDING, "chunk_ids": CHUNKS, "answer": "old answer",
+                  "llm_calls": 1, "created_at": time.time()}
+        await cache.redis.redis.hset(cache._key("tenant"), "legacy", json.dumps(legacy))
+        await cache.redis.redis.incr(cache._version_key("tenant"))
+        return await cache.lookup("tenant", "groq:llama3", EMBEDDING, CHUNKS)
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,122 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from langchain_core.documents import Document
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from conftest import TEST_VOCABULARY
+from app.retrieval.dense_retriever import DenseRetriever
+from app.retrieval.sharded_retriever import ShardedRetriever, shard_for_source
+from app.retrieval.sparse_retriever import SparseRetriever
+from app.vectorstore.faiss_store import FaissVectorStore
+from app.vectorstore.metadata_store import MetadataStore
+
+NUM_SHARDS = 2
+TOP_K = 10
+
+
+def _corpus():
+    """Equal-length chunks (so both shards see the same average length) over 8 sources."""
+    rng = random.Random(7)
+    chunks = []
+    for i in range(160):
+        video = f"video{i // 20}"
+        words = rng.sample(TEST_VOCABULARY[:-1], 6)
+        if video == "video3" and i % 2:
+            words[0] = TEST_VOCABULARY[-1]  # a term that only one source contains
+        chunks.append({"text": " ".join(words), "video_id": video, "window_start_time": float(i),
+                       "chunk_index": i % 20, "chunk_id": f"{i:016x}"})
+    return chunks
+
+
+@pytest.fixture(scope="module")
+def indexes(tmp_path_factory):
+    chunks = _corpus()
+    assert len({shard_for_source(MetadataStore.source_of(c), NUM_SHARDS) for c in chunks}) == NUM_SHARDS
+
+    root = tmp_path_factory.mktemp("retrieval")
+    vector_store = FaissVectorStore(index_path=str(root / "faiss_index"))
+    vector_store.add_documents(chunks)
+    sparse = SparseRetriever(MetadataStore(db_path=str(root / "metadata.sqlite")), index_dir=str(root / "bm25_index"))
+    sparse.create_index([_document(c) for c in chunks])
+
+    shards = ShardedRetriever(num_shards=NUM_SHARDS, shards_dir=str(root / "shards"))
+    shards.add_documents(chunks)
+    yield DenseRetriever(vector_store), sparse, shards
+    shards.close()
+
+
+def _document(chunk):
+    return Document(page_content=chunk["text"], metadata={k: v for k, v in chunk.items() if k != "text"})
+
+
+def _ids(results):
+    return [doc.metadata["chunk_id"] for doc, _ in results]
+
+
+def test_dense_top_k_matches_unsharded(indexes):
+    dense, _, shards = indexes
+    for query in ["alpha bravo charlie", "kilo lima", "xray yankee delta echo"]:
+        sharded_dense, _ = shards.retrieve(query, dense_k=TOP_K, sparse_k=TOP_K)
+        expected = dense.retrieve(query, top_k=TOP_K)
+        assert _ids(sharded_dense) == _ids(expected)
+        assert [score for _, score in sharded_dense] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+
+def test_sparse_top_k_matches_unsharded_for_single_source_term(indexes):
+    _, sparse, shards = indexes
+    query = TEST_VOCABULARY[-1]
+    _, sharded_sparse = shards.retrieve(query, dense_k=TOP_K, sparse_k=TOP_K)
+    expected = [(doc, score) for doc, score in sparse.retrieve(query, top_k=TOP_K) if score > 0]
+    assert expected
+    # idf is per shard, so only the set of hits is comparable (they tie: same tf and length)
+    assert set(_ids([(doc, score) for doc, score in sharded_sparse if score > 0])) == set(_ids(expected))
+
+
+def test_concurrent_queries_get_their_own_results(indexes):
+    dense, _, shards = indexes
+    queries = ["alpha bravo", "golf hotel", "oscar papa", "sierra tango"] * 5
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda q: shards.retrieve(q, dense_k=TOP_K, sparse_k=TOP_K)[0], queries))
+    for query, result in zip(queries, results):
+        assert _ids(result) == _ids(dense.retrieve(query, top_k=TOP_K))
+
+
+def test_dead_shard_contributes_nothing(tmp_path):
+    chunks = _corpus()
+    shards = ShardedRetriever(num_shards=NUM_SHARDS, shards_dir=str(tmp_path))
+    try:
+        shards.add_documents(chunks)
+        shards._processes[0].terminate()
+        shards._processes[0].join()
+        dense_results, _ = shards.retrieve("alpha bravo", dense_k=TOP_K, sparse_k=TOP_K)
+        assert dense_results
+        assert {shard_for_source(doc.metadata["video_id"], NUM_SHARDS) for doc, _ in dense_results} == {1}
+    finally:
+        shards.close()
+
+
+def test_existing_unsharded_corpus_is_split_into_shards(tmp_path, indexes):
+    dense, _, _ = indexes
+    chunks = _corpus()
+    source_store = MetadataStore(db_path=str(tmp_path / "metadata.sqlite"))
+    source_store.add_documents([_document(c) for c in chunks])
+
+    shards = ShardedRetriever(num_shards=NUM_SHARDS, shards_dir=str(tmp_path / "shards"), source_store=source_store)
+    try:
+        sharded_dense, _ = shards.retrieve("alpha bravo charlie", dense_k=TOP_K, sparse_k=TOP_K)
+        assert _ids(sharded_dense) == _ids(dense.retrieve("alpha bravo charlie", top_k=TOP_K))
+    finally:
+        shards.close()
+
+    # Restarting does not split again (nothing is duplicated), another shard count is refused
+    shards = ShardedRetriever(num_shards=NUM_SHARDS, shards_dir=str(tmp_path / "shards"), source_store=source_store)
+    try:
+        sharded_dense, _ = shards.retrieve("alpha bravo charlie", dense_k=len(chunks), sparse_k=1)
+        assert len(_ids(sharded_dense)) == len(set(_ids(sharded_dense))) == len(chunks)
+    finally:
+        shards.close()
+    with pytest.raises(RuntimeError, match="partitioned into 2 shards"):
+        ShardedRetriever(num_shards=NUM_SHARDS + 1, shards_dir=str(tmp_path / "shards"), source_store=source_store)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+pytest.importorskip("youtube_transcript_api")
+
+from langchain_core.documents import Document
+
+from app.api import routes
+from app.api.schemas import ChatRequest
+
+RAW_DOCS = [Document(page_content="alpha bravo", metadata={"chunk_id": "c0", "video_id": "vid", "start": 75.0,
+                                                           "relevance_score": 3.2})]
+COMPRESSED_DOCS = [Document(page_content="alpha", metadata={**RAW_DOCS[0].metadata, "compressed": True})]
+
+
+def _events(stream) -> list:
+    async def collect():
+        return [chunk async for chunk in stream]
+
+    events = []
+    for chunk in asyncio.run(collect()):
+        lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _pipeline(rewrite=None, answer=None):
+    async def arewrite(message, chat_history=None):
+        if rewrite is not None:
+            raise rewrite
+        return message
+
+    async def astream_answer(query, documents, model_name=None):
+        yield "token", "Partial"
+        raise answer
+
+    return types.SimpleNamespace(query_rewriter=types.SimpleNamespace(arewrite=arewrite),
+                                 answer_generator=types.SimpleNamespace(astream_answer=astream_answer))
+
+
+async def _no_finish(*args, **kwargs):
+    raise AssertionError("a failed answer must not be stored")
+
+
+def test_unexpected_error_before_generation_becomes_error_event():
+    request = ChatRequest(message="hi", session_id="-", stream_format="sse")
+    pipeline = _pipeline(rewrite=RuntimeError("boom"))
+    events = _events(routes._sse_chat(request, pipeline, [], None, "u", "fake:fake", _no_finish))
+    assert events == [("error", {"status": 500, "message": routes.AnswerGenerator.ERROR_MESSAGE})]
+
+
+def test_unexpected_error_during_generation_becomes_error_event(monkeypatch):
+    async def retrieve(pipeline, rewritten_query, user_id, model):
+        return [], [], None, [], None
+
+    monkeypatch.setattr(routes, "_retrieve", retrieve)
+    request = ChatRequest(message="hi", session_id="-", stream_format="sse")
+    pipeline = _pipeline(answer=RuntimeError("boom"))
+    events = _events(routes._sse_chat(request, pipeline, [], None, "u", "fake:fake", _no_finish))
+    assert [name for name, _ in events] == ["rewrite", "sources", "token", "error"]
+    assert events[-1][1]["status"] == 500
+
+
+class Recorder:
+    """Stands in for chat()'s `finish` callback (answer cache store + assistant message)."""
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, rewritten_query, query_embedding, chunk_ids, full_answer, user_message_id, cached,
+                       llm_calls=0):
+        self.calls.append({"rewritten": rewritten_query, "answer": full_answer, "cached": cached})
+
+
+def _answering_pipeline(streamed):
+    async def arewrite(message, chat_history=None):
+        return f"{message} rewritten"
+
+    async def astream_answer(query, documents, model_name=None):
+        streamed.append(documents)
+        yield "token", "Alpha "
+        yield "token", "[01:15]."
+        yield "validation", True
+
+    return types.SimpleNamespace(query_rewriter=types.SimpleNamespace(arewrite=arewrite),
+                                 answer_generator=types.SimpleNamespace(astream_answer=astream_answer))
+
+
+def _retrieve_returning(cached_answer):
+    async def retrieve(pipeline, rewritten_query, user_id, model):
+        assert (rewritten_query, model) == ("hi rewritten", "fake:fake")
+        return RAW_DOCS, COMPRESSED_DOCS, [1.0, 0.0], ["c0"], cached_answer
+    return retrieve
+
+
+def test_events_arrive_in_stage_order(monkeypatch):
+    monkeypatch.setattr(routes, "_retrieve", _retrieve_returning(None))
+    streamed, finish = [], Recorder()
+    request = ChatRequest(message="hi", session_id="-", stream_format="sse")
+    events = _events(routes._sse_chat(request, _answering_pipeline(streamed), [], None, "u", "fake:fake", finish))
+
+    assert [name for name, _ in events] == ["rewrite", "sources", "token", "token", "validation", "done"]
+    assert events[0][1] == {"query": "hi", "rewritten": "hi rewritten"}
+    sources = events[1][1]
+    assert sources["confidence"] == "HIGH"
+    [source] = sources["sources"]
+    assert (source["chunk_id"], source["start"], source["timestamp"]) == ("c0", 75.0, "01:15")
+    assert source["url"] == "https://www.youtube.com/watch?v=vid&t=75s"
+    assert [data["text"] for name, data in events if name == "token"] == ["Alpha ", "[01:15]."]
+    assert events[4][1] == {"passed": True, "cached": False}
+    assert streamed == [COMPRESSED_DOCS]
+    assert finish.calls == [{"rewritten": "hi rewritten", "answer": "Alpha [01:15].", "cached": False}]
+
+
+def test_cached_answer_skips_generation(monkeypatch):
+    monkeypatch.setattr(routes, "_retrieve", _retrieve_returning("Cached alpha [01:15]."))
+    streamed, finish = [], Recorder()
+    request = ChatRequest(message="hi", session_id="-", stream_format="sse")
+    events = _events(routes._sse_chat(request, _answering_pipeline(streamed), [], None, "u", "fake:fake", finish))
+
+    assert events[2:] == [("token", {"text": "Cached alpha [01:15]."}),
+                          ("validation", {"passed": True, "cached": True}),
+                          ("done", {"user_message_id": None})]
+    assert [name for name, _ in events[:2]] == ["rewrite", "sources"]
+    assert streamed == []
+    assert finish.calls == [{"rewritten": "hi rewritten", "answer": "Cached alpha [01:15].", "cached": True}]
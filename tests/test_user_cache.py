@@ -0,0 +1,113 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.api.user_cache import UserCache, user_cache
+from app.db.redis_client import RedisClient
+from app.models.user import User
+
+
+@pytest.fixture
+def session(monkeypatch):
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    invalidated = []
+    monkeypatch.setattr(user_cache, "invalidate", invalidated.append)
+    with Session(engine) as session:
+        user = User(id=uuid.uuid4(), email="a@example.com", password_hash="-", full_name="A")
+        session.add(user)
+        session.commit()
+        session.invalidated = invalidated
+        session.user = user
+        yield session
+
+
+def test_update_invalidates_after_commit_only(session):
+    session.user.full_name = "B"
+    session.flush()
+    assert session.invalidated == []  # flushed, not committed
+    session.commit()
+    assert session.invalidated == [session.user.id]
+
+
+def test_rolled_back_update_does_not_invalidate(session):
+    session.user.is_active = False
+    session.flush()
+    session.rollback()
+    session.commit()
+    assert session.invalidated == []
+
+
+def test_delete_invalidates_after_commit(session):
+    user_id = session.user.id
+    session.delete(session.user)
+    session.flush()
+    assert session.invalidated == []
+    session.commit()
+    assert session.invalidated == [user_id]
+
+
+def _redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = RedisClient.__new__(RedisClient)
+    client.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return client
+
+
+class SlowLoader:
+    """The users table: each load reads the row as it is when the load starts, then waits for `release`."""
+    def __init__(self, user_id):
+        self.row = User(id=user_id, email="a@example.com", full_name="A", is_active=True)
+        self.loading, self.release = asyncio.Event(), asyncio.Event()
+        self.queries = 0
+
+    async def __call__(self, user_id):
+        self.queries += 1
+        row = User(id=self.row.id, email=self.row.email, full_name=self.row.full_name, is_active=self.row.is_active)
+        self.loading.set()
+        await self.release.wait()
+        return row
+
+
+@pytest.mark.parametrize("tombstone_first", [True, False])
+def test_a_load_racing_an_invalidation_does_not_cache_the_old_row(tombstone_first):
+    async def run():
+        user_id = uuid.uuid4()
+        cache, db = UserCache(_redis()), SlowLoader(user_id)
+        request = asyncio.create_task(cache.get(user_id, db))
+        await db.loading.wait()  # the miss has read the active row
+
+        db.row.is_active = False  # deactivation commits, after_commit invalidates
+        cache.invalidate(user_id)
+        if tombstone_first:
+            await asyncio.gather(*cache._tasks)
+        db.release.set()
+        assert (await request).is_active  # the in-flight request still sees what it read
+        await asyncio.gather(*cache._tasks)
+
+        user = await cache.get(user_id, db)
+        return user.is_active, db.queries, (await cache.get(user_id, db)).is_active, db.queries
+
+    assert asyncio.run(run()) == (False, 2, False, 2)
+
+
+def test_another_worker_cannot_write_the_old_row_over_a_tombstone():
+    async def run():
+        user_id, redis = uuid.uuid4(), _redis()
+        worker_a, worker_b, db = UserCache(redis), UserCache(redis), SlowLoader(user_id)
+        request = asyncio.create_task(worker_a.get(user_id, db))
+        await db.loading.wait()
+
+        db.row.is_active = False
+        worker_b.invalidate(user_id)
+        await asyncio.gather(*worker_b._tasks)
+        db.release.set()
+        await request
+
+        stored = await redis.get_value(UserCache.PREFIX + str(user_id))
+        return stored, (await UserCache(redis).get(user_id, db)).is_active
+
+    assert asyncio.run(run()) == (UserCache.TOMBSTONE, False)
@@ -1,13 +1,20 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Send, Bot, User } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
-import { getChatStreamUrl } from '../services/api';
+import { getChatStreamUrl, readChatEvents } from '../services/api';
+import type { ChatSource } from '../services/api';
 
 interface Message {
     role: 'user' | 'assistant';
     content: string;
+    sources?: ChatSource[];
+    confidence?: string;
 }
 
+// Same text the server appends to the stored answer when strict validation fails
+const VALIDATION_WARNING = '\n\n**Warning:** parts of this answer could not be verified against the video ' +
+    '(strict validation failed). Please double-check the cited timestamps.';
+
 interface ChatAreaProps {
     threadId: string | null;
 }
@@ -29,6 +36,15 @@ export const ChatArea: React.FC<ChatAreaProps> = ({ threadId }) => {
         setMessages([]);
     }, [threadId]);
 
+    // Applies an update to the assistant message being streamed
+    const updateAnswer = (update: (msg: Message) => Message) => {
+        setMessages(prev => {
+            const last = prev[prev.length - 1];
+            if (!last || last.role !== 'assistant') return prev;
+            return [...prev.slice(0, -1), update(last)];
+        });
+    };
+
     const handleSubmit = async (e: React.FormEvent) => {
         e.preventDefault();
         if (!input.trim() || isStreaming) return;
@@ -55,7 +71,8 @@ export const ChatArea: React.FC<ChatAreaProps> = ({ threadId }) => {
                 headers: headers,
                 body: JSON.stringify({
                     message: userMsg,
-                    session_id: threadId || 'default'
+                    session_id: threadId || 'default',
+                    stream_format: 'sse'
                 }),
             });
 
@@ -73,23 +90,29 @@ export const ChatArea: React.FC<ChatAreaProps> = ({ threadId }) => {
 
             if (!response.body) throw new Error('No response body');
 
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let done = false;
-
-            while (!done) {
-                const { value, done: doneReading } = await reader.read();
-                done = doneReading;
-                if (value) {
-                    const chunkValue = decoder.decode(value, { stream: true });
-                    setMessages(prev => {
-                        const newMsgs = [...prev];
-                        const lastMsg = newMsgs[newMsgs.length - 1];
-                        if (lastMsg.role === 'assistant') {
-                            lastMsg.content += chunkValue;
+            // Sources arrive before the first token; the answer then streams into the same message
+            for await (const chatEvent of readChatEvents(response.body)) {
+                switch (chatEvent.event) {
+                    case 'sources': {
+                        const { sources, confidence } = chatEvent.data;
+                        updateAnswer(msg => ({ ...msg, sources, confidence }));
+                        break;
+                    }
+                    case 'token': {
+                        const { text } = chatEvent.data;
+                        updateAnswer(msg => ({ ...msg, content: msg.content + text }));
+                        break;
+                    }
+                    case 'validation':
+                        if (!chatEvent.data.passed) {
+                            updateAnswer(msg => ({ ...msg, content: msg.content + VALIDATION_WARNING }));
                         }
-                        return newMsgs;
-                    });
+                        break;
+                    case 'error': {
+                        const { message } = chatEvent.data;
+                        updateAnswer(msg => ({ ...msg, content: `${msg.content}\n\n**Error:** ${message}` }));
+                        break;
+                    }
                 }
             }
         } catch (err) {
@@ -130,6 +153,23 @@ export const ChatArea: React.FC<ChatAreaProps> = ({ threadId }) => {
                                     {msg.content}
                                 </ReactMarkdown>
                             </div>
+                            {msg.sources && msg.sources.length > 0 && (
+                                <div className="mt-3 pt-3 border-t border-slate-700/50 flex flex-wrap gap-2 text-xs text-muted">
+                                    {msg.confidence && <span>Confidence: {msg.confidence}</span>}
+                                    {msg.sources.map((source, i) => (
+                                        source.url ? (
+                                            <a key={source.chunk_id ?? i} href={source.url} target="_blank" rel="noreferrer"
+                                                title={source.snippet} className="text-primary hover:underline">
+                                                [{source.timestamp}]
+                                            </a>
+                                        ) : (
+                                            <span key={source.chunk_id ?? i} title={source.snippet}>
+                                                {source.source ?? source.video_id}{source.page != null ? ` p.${source.page}` : ''}
+                                            </span>
+                                        )
+                                    ))}
+                                </div>
+                            )}
                         </div>
                         {msg.role === 'user' && (
                             <div className="w-10 h-10 rounded-full bg-slate-700 flex items-center justify-center flex-shrink-0 mt-1 shadow-lg">
@@ -16,17 +16,24 @@ export const Sidebar: React.FC<SidebarProps> = ({ onIngestSuccess, onIngestError
     const [isProcessed, setIsProcessed] = useState(false);
     const [isBackendLive, setIsBackendLive] = useState(false);
     const [threads, setThreads] = useState<Array<{ id: string; title: string }>>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [isLoadingThreads, setIsLoadingThreads] = useState(false);
+
+    const loadThreads = async (cursor: string | null = null) => {
+        setIsLoadingThreads(true);
+        try {
+            const page = await getThreads(cursor);
+            setThreads(prev => (cursor ? [...prev, ...page.threads] : page.threads));
+            setNextCursor(page.nextCursor);
+        } catch (e) {
+            console.error("Failed to load threads", e);
+        } finally {
+            setIsLoadingThreads(false);
+        }
+    };
 
     React.useEffect(() => {
-        const fetchHistory = async () => {
-            try {
-                const list = await getThreads();
-                setThreads(list);
-            } catch (e) {
-                console.error("Failed to load threads", e);
-            }
-        };
-        fetchHistory();
+        loadThreads();
 
         const checkHealth = async () => {
             try {
@@ -185,6 +192,15 @@ export const Sidebar: React.FC<SidebarProps> = ({ onIngestSuccess, onIngestError
                             </div>
                         ))
                     )}
+                    {nextCursor && (
+                        <button
+                            onClick={() => loadThreads(nextCursor)}
+                            disabled={isLoadingThreads}
+                            className="flex items-center justify-center gap-2 w-full text-xs text-muted hover:text-primary p-2 rounded-lg hover:bg-white/5 transition-all disabled:opacity-50"
+                        >
+                            {isLoadingThreads ? <Loader2 className="w-3 h-3 animate-spin" /> : null} Load more
+                        </button>
+                    )}
                 </div>
             </div>
 
@@ -76,12 +76,65 @@ export const createThread = async (): Promise<{ thread_id: string; title: string
     return response.data;
 };
 
-export const getThreads = async (): Promise<Array<{ id: string; title: string }>> => {
-    const response = await api.get('/threads');
-    return response.data;
+export interface ThreadPage {
+    threads: Array<{ id: string; title: string }>;
+    nextCursor: string | null; // X-Next-Cursor: pass back as `cursor` for the next page, null on the last one
+}
+
+export const getThreads = async (cursor?: string | null): Promise<ThreadPage> => {
+    const response = await api.get('/threads', { params: cursor ? { cursor } : undefined });
+    return { threads: response.data, nextCursor: response.headers['x-next-cursor'] ?? null };
 };
 
 // Streaming chat helper
 export const getChatStreamUrl = () => `${API_BASE_URL}/chat`;
 
+export interface ChatSource {
+    chunk_id: string | null;
+    video_id: string | null;
+    source: string | null;
+    page: number | null;
+    score: number | null;
+    snippet: string;
+    start: number | null;
+    timestamp: string | null; // "MM:SS"
+    url: string | null; // YouTube link at `start`
+}
+
+// /chat with stream_format 'sse': rewrite -> sources -> token* -> validation -> done, or error at any point
+export type ChatEvent =
+    | { event: 'rewrite'; data: { query: string; rewritten: string } }
+    | { event: 'sources'; data: { confidence: string; sources: ChatSource[] } }
+    | { event: 'token'; data: { text: string } }
+    | { event: 'validation'; data: { passed: boolean; cached: boolean } }
+    | { event: 'error'; data: { status: number; message: string } }
+    | { event: 'done'; data: { user_message_id: string | null } };
+
+export async function* readChatEvents(body: ReadableStream<Uint8Array>): AsyncGenerator<ChatEvent> {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Events end with a blank line; a network chunk can hold several events or part of one
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = '';
+            const data: string[] = [];
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice('event: '.length);
+                else if (line.startsWith('data: ')) data.push(line.slice('data: '.length));
+            }
+            if (event && data.length) {
+                yield { event, data: JSON.parse(data.join('\n')) } as ChatEvent;
+            }
+            boundary = buffer.indexOf('\n\n');
+        }
+    }
+}
+
 export default api;